@@ -2,123 +2,578 @@
 AutoInsights: The Automated Data Analyst Agent
 Entry point for the Multi-Agent System.
 """
+import asyncio
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 # === IMPORTS FROM YOUR NEW FOLDERS ===
 from src.memory.db_memory import DatabaseMemory
+from src.memory.shard_store import ShardedConnectionPool
+from src.memory.sql_cache import SQLCache
+from src.tools.follow_up import FollowUpResolver
+from src.tools.plan_tool import QueryCostGate
+from src.tools.rollups import RollupManager
+from src.tools.shard_tool import ShardedSQLExecutorTool
+from src.tools.sql_repair import SQLRepairTool
 from src.tools.sql_tool import SQLExecutorTool
 from src.tools.viz_tool import VisualizationTool
 from src.agents.architect import AgentArchitect
+from src.agents.dag import StageDAG
 from src.agents.others import AgentCoder, AgentStoryteller, AgentValidator, setup_demo_database
+from src.llm.gemini import GeminiModel
+from src.llm.scheduler import LLMScheduler, ScheduledModel, PRIORITY_INSIGHT, PRIORITY_SQL
+from src.telemetry.tracing import Tracer
 
-# Load API Key
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("❌ GEMINI_API_KEY not found in .env file")
+# Rows sent in the streamed 'rows' event (the full result stays server-side)
+ROWS_PREVIEW = 20
 
-genai.configure(api_key=api_key)
+def _gemini_api_key() -> str:
+    """Load the API key; only needed when the orchestrator builds Gemini models itself"""
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("❌ GEMINI_API_KEY not found in .env file")
+    return api_key
+
+def preload_modules():
+    """
+    Pre-fork hook (e.g. gunicorn's preload_app / on_starting): import the heavy
+    libraries once in the parent so forked workers share them copy-on-write.
+    Opens no connections, threads or processes, none of which survive a fork.
+    """
+    from src.tools.viz_tool import preload_backend
+    preload_backend()
+    import google.generativeai  # noqa: F401
 
 class AutoInsightsOrchestrator:
-    def __init__(self):
+    def __init__(self, streaming: bool = False, max_concurrency: int = 4,
+                 lazy_charts: bool = False, render_workers: int = 0,
+                 max_plan_cost: float = 5e7, query_timeout_seconds: float = 30.0,
+                 max_result_rows: int = 1_000_000, tracer: Optional[Tracer] = None,
+                 db_path: str = "company_data.db", sql_cache_path: str = "sql_cache.db",
+                 query_history_path: str = "query_history.db",
+                 model_sql: Optional[Any] = None, model_insight: Optional[Any] = None,
+                 llm_requests_per_minute: Optional[float] = None, llm_max_retries: int = 4,
+                 speculative_candidates: int = 0, rollups: bool = False,
+                 shard_dir: Optional[str] = None, shard_workers: Optional[int] = None,
+                 session_cache_bytes: int = 256 * 1024 * 1024,
+                 chart_format: str = "png", chart_dpi: int = 150, sql_repair: bool = True):
         print("🔧 Initializing AutoInsights Agents...")
         
         # 1. Setup Memory & Tools
-        self.memory = DatabaseMemory("company_data.db")
-        self.sql_tool = SQLExecutorTool(self.memory.connection)
-        self.viz_tool = VisualizationTool()
+        if shard_dir is None:
+            self.memory = DatabaseMemory(db_path, pool_size=max_concurrency, history_path=query_history_path,
+                                         session_cache_bytes=session_cache_bytes)
+            self.sql_tool = SQLExecutorTool(self.memory.connection, pool=self.memory.pool,
+                                            timeout_seconds=query_timeout_seconds,
+                                            max_rows=max_result_rows)
+        else:
+            # Sales split across files (see src.memory.shard_store); aggregates fan out over processes
+            if rollups:
+                raise ValueError("Rollups need a single database file; they cannot be combined with shards")
+            pool = ShardedConnectionPool(shard_dir, size=max_concurrency)
+            self.memory = DatabaseMemory(pool.db_path, history_path=query_history_path, pool=pool,
+                                         session_cache_bytes=session_cache_bytes)
+            self.sql_tool = ShardedSQLExecutorTool(self.memory.connection, pool, workers=shard_workers,
+                                                   timeout_seconds=query_timeout_seconds,
+                                                   max_rows=max_result_rows)
+        # Lines are downsampled to the plot's pixel width and bars folded to top-N before rendering
+        self.viz_tool = VisualizationTool(render_workers=render_workers, image_format=chart_format,
+                                          dpi=chart_dpi)
+        self.sql_cache = SQLCache(sql_cache_path)
+        self.cost_gate = QueryCostGate(self.sql_tool, max_cost=max_plan_cost)
+        # Pre-aggregated summary tables that answer eligible aggregate queries (writes rollup_* tables)
+        self.rollups = RollupManager(db_path) if rollups else None
+        # Follow-ups in a session ("now only North", "top 3") answered from its cached frames
+        self.follow_ups = FollowUpResolver()
+        # Misspelled names, stray prose, MySQL functions... fixed locally before asking the Architect again
+        self.sql_repair = SQLRepairTool(self.memory) if sql_repair else None
         
         # 2. Setup Models
+        # Any object with generate_content() can be plugged in (e.g. the offline stubs in src.llm)
+        # Gemini models import the SDK on first use (or in warm_up()), not here
+        if model_sql is None or model_insight is None:
+            api_key = _gemini_api_key()
         #using 'gemini-2.5-flash'
-        model_sql = genai.GenerativeModel('gemini-2.5-flash') 
-        model_insight = genai.GenerativeModel('gemini-2.5-flash')
+        if model_sql is None:
+            model_sql = GeminiModel('gemini-2.5-flash', api_key=api_key)
+        if model_insight is None:
+            model_insight = GeminiModel('gemini-2.5-flash', api_key=api_key)
+        # Every model call goes through one scheduler: per-model rate limit (None = unlimited),
+        # SQL before insights when queued, identical in-flight prompts coalesced, transient errors retried
+        self.llm_scheduler = LLMScheduler(requests_per_minute=llm_requests_per_minute,
+                                          max_retries=llm_max_retries)
+        model_sql = ScheduledModel(model_sql, self.llm_scheduler, priority=PRIORITY_SQL)
+        model_insight = ScheduledModel(model_insight, self.llm_scheduler, priority=PRIORITY_INSIGHT)
         
         # 3. Initialize Agents
         self.architect = AgentArchitect(model_sql, self.memory)
-        self.validator = AgentValidator()
-        self.coder = AgentCoder(self.sql_tool, self.viz_tool)
+        self.validator = AgentValidator(self.memory, self.sql_tool.whitelist_tables)
+        # streaming=True keeps memory flat on huge results (stats + sample + disk spill)
+        # lazy_charts=True returns a LazyChart handle; nothing is rendered unless it is used
+        self.coder = AgentCoder(self.sql_tool, self.viz_tool, streaming=streaming,
+                                lazy_charts=lazy_charts)
         self.storyteller = AgentStoryteller(model_insight)
         
         self.all_logs = []
+        # > 1: ask for that many SQL candidates up front and check them in parallel;
+        # the serial repair loop only runs when all of them fail
+        self.speculative_candidates = speculative_candidates
+        # Spans per stage and retry attempt; disabled (no-op) unless a Tracer is passed in
+        self.tracer = tracer if tracer is not None else Tracer()
+        # Worker pool for analyze_async/analyze_many; its size is the concurrency limit
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix="autoinsights")
+        # Separate pool for post-SQL stages so nested submits never starve the pool above
+        self._stage_executor = ThreadPoolExecutor(max_workers=2 * max_concurrency,
+                                                  thread_name_prefix="autoinsights-stage")
 
-    def analyze(self, user_query: str):
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Pay the one-off costs before the first request instead of during it:
+        schema + index, pooled connections, table stats, chart backend and the
+        model SDK. Call once per worker process, after any fork.
+        Returns seconds spent per step.
+        """
+        timings = {}
+        steps = [
+            ("schema", lambda: self.memory.get_schema_context("warm up")),
+            ("connections", self.memory.pool.prewarm),
+            ("table_stats", self.sql_tool.table_row_estimates),
+            ("charts", self.viz_tool.warm_up),
+            ("models", self._load_models),
+        ]
+        if self.rollups is not None:
+            steps.append(("rollups", self.rollups.refresh))
+        if isinstance(self.sql_tool, ShardedSQLExecutorTool):
+            steps.append(("shards", self.sql_tool.prewarm))
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            timings[name] = round(time.perf_counter() - start, 4)
+        return timings
+
+    def _load_models(self):
+        for model in (self.architect.model, self.storyteller.model):
+            load = getattr(model, "load", None)
+            if load is not None:
+                load()
+
+    def shutdown(self):
+        """Stop every worker pool the orchestrator owns: request, stage, chart and shard pools"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._stage_executor.shutdown(wait=False, cancel_futures=True)
+        self.viz_tool.shutdown()
+        if isinstance(self.sql_tool, ShardedSQLExecutorTool):
+            self.sql_tool.shutdown()
+
+    def analyze(self, user_query: str, session_id: Optional[str] = None):
         """
         Main Workflow: Architect -> Validator -> Coder -> Storyteller
         Includes Self-Correction Loop for SQL errors.
+        With a session_id, results are kept for the session and follow-ups
+        that filter, sort, cut or re-aggregate them skip SQL altogether.
         """
-        self.all_logs = []
+        logs = []
+        result = self._run_analysis(user_query, logs, session_id=session_id)
+        self.all_logs = logs  # Last synchronous run, kept for existing callers
+        return result
+
+    async def analyze_async(self, user_query: str, session_id: Optional[str] = None):
+        """
+        Non-blocking analyze(). Each call runs on the orchestrator's worker
+        pool with its own log list, so concurrent calls never share state.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run_analysis, user_query, [],
+                                          None, session_id)
+
+    async def analyze_many(self, user_queries: List[str]) -> List[Dict[str, Any]]:
+        """Analyze a batch of questions concurrently (bounded by max_concurrency)"""
+        return await asyncio.gather(*(self.analyze_async(q) for q in user_queries))
+
+    def analyze_stream(self, user_query: str, emit: Callable[[str, Dict[str, Any]], None],
+                       session_id: Optional[str] = None):
+        """
+        analyze() that also reports each stage as soon as it is ready:
+        emit('sql'), emit('rows'), then emit('chart') and one emit('insight')
+        per streamed model chunk, interleaved. emit is called from worker threads.
+        """
+        return self._run_analysis(user_query, [], emit, session_id)
+
+    def _run_analysis(self, user_query: str, logs: List[str], emit=None, session_id: Optional[str] = None):
+        """One full pipeline run; 'logs' is owned by the caller"""
+        with self.tracer.span("analysis", question_chars=len(user_query)) as root:
+            result = self._run_pipeline(user_query, logs, root, emit, session_id)
+            root.set("success", result["success"])
+            return result
+
+    def _run_pipeline(self, user_query: str, logs: List[str], root, emit=None,
+                      session_id: Optional[str] = None):
+        """Self-correcting SQL loop, then chart + insights; 'root' is the analysis span"""
         max_retries = 3
         current_retry = 0
         error_context = ""
         sql = ""
         final_data = None
+        follow_up_steps: List[str] = []
+        pending_repair = None
+        repaired_from: Set[str] = set()  # SQL already handed to local repair
+        round_trips_saved = 0
+        auto_limited = False  # The cost gate appended a LIMIT: the rows are a prefix, not the answer
+        schema_fingerprint = self.memory.get_schema_fingerprint()
 
         print(f"\n🚀 Starting Analysis: {user_query}")
         print("-" * 50)
 
+        # Follow-up on a cached session result: pandas on the frame, no SQL generation or scan
+        follow_up = self._answer_follow_up(user_query, session_id, root, logs)
+        if follow_up is not None:
+            sql, follow_up_steps = follow_up.base.sql, follow_up.steps
+            final_data = self.coder.use_dataframe(follow_up.frame).data
+
+        cached_sql = self.sql_cache.get(user_query, schema_fingerprint) if final_data is None else None
+        from_cache = False
+        root.set("sql_cache_hit", cached_sql is not None)
+
+        # Speculative mode: several candidates validated/planned in parallel, first good one runs
+        if final_data is None and cached_sql is None and self.speculative_candidates > 1:
+            sql, final_data, error_context = self._speculate(user_query, logs, root)
+            if final_data is not None:
+                self.sql_cache.put(user_query, schema_fingerprint, sql)
+                self.memory.add_query_history(user_query, sql)
+
         # === THE AGENT LOOP (SELF-CORRECTION) ===
-        while current_retry < max_retries:
-            
-            # Step 1: Architect (Generate SQL)
-            architect_res = self.architect.generate_sql(user_query, error_context)
-            self.all_logs.extend(architect_res.logs)
-            print(f"   🤖 Architect: Generated SQL (Attempt {current_retry+1})")
-            
+        while final_data is None and current_retry < max_retries:
+            with root.child("attempt", attempt=current_retry + 1) as attempt:
+                active_repair, pending_repair = pending_repair, None
+
+                # Step 1: Architect (Generate SQL), skipped on a cache hit or a local repair
+                if cached_sql:
+                    sql = cached_sql
+                    cached_sql = None
+                    from_cache = True
+                    logs.append("[SQLCache] ⚡ Cache hit, skipping Architect")
+                    print("   ⚡ SQLCache: Reusing cached SQL")
+                elif active_repair is not None:
+                    sql = active_repair.sql
+                    from_cache = False
+                    attempt.set("repaired", True)
+                else:
+                    with attempt.child("architect") as span:
+                        architect_res = self.architect.generate_sql(user_query, error_context)
+                        if architect_res.success:
+                            span.set("prompt_chars", architect_res.data['prompt_chars'])
+                            span.set("response_chars", architect_res.data['response_chars'])
+                    logs.extend(architect_res.logs)
+                    print(f"   🤖 Architect: Generated SQL (Attempt {current_retry+1})")
+
+                    if not architect_res.success:
+                        attempt.set("failed_stage", "architect")
+                        return self._fail(architect_res, logs)
+
+                    sql = architect_res.data['sql']
+                    from_cache = False
+
+                # Step 2: Validator (Check Safety)
+                with attempt.child("validator") as span:
+                    validator_res = self.validator.validate_query(user_query, sql)
+                    span.set("passed", validator_res.success)
+                logs.extend(validator_res.logs)
+
+                if not validator_res.success:
+                    print("   ⚠️ Validator: Issues found. Looping back...")
+                    if from_cache:
+                        self.sql_cache.invalidate(user_query, schema_fingerprint)
+                    error_context = f"SQL: {sql}\nValidation Issues: {validator_res.data['issues']}"
+                    attempt.set("failed_stage", "validator")
+                    pending_repair = self._repair_sql(sql, "\n".join(validator_res.data['issues']),
+                                                      attempt, logs, repaired_from)
+                    if pending_repair is None:  # A local repair retries without spending an Architect call
+                        current_retry += 1
+                    continue # JUMP BACK TO START OF LOOP
+
+                # Step 2a: Rollup rewrite (the original SQL is what gets cached and reported)
+                exec_sql = self._rewrite_for_rollups(sql, attempt, logs)
+
+                # Step 2b: Cost Gate (EXPLAIN QUERY PLAN pre-flight)
+                try:
+                    with attempt.child("cost_gate") as span:
+                        verdict = self.cost_gate.check(exec_sql)
+                        span.set("estimated_cost", verdict.estimated_cost)
+                        span.set("allowed", verdict.allowed)
+                except Exception as e:
+                    print("   ⚠️ Cost Gate: Could not plan query. Looping back...")
+                    if from_cache:
+                        self.sql_cache.invalidate(user_query, schema_fingerprint)
+                    error_context = f"SQL: {sql}\nDatabase Error: {e}"
+                    attempt.set("failed_stage", "cost_gate")
+                    pending_repair = self._repair_sql(sql, str(e), attempt, logs, repaired_from)
+                    if pending_repair is None:
+                        current_retry += 1
+                    continue # JUMP BACK TO START OF LOOP
+                logs.extend(verdict.logs)
+
+                if not verdict.allowed:
+                    print("   ⚠️ Cost Gate: Plan too expensive. Looping back...")
+                    if from_cache:
+                        self.sql_cache.invalidate(user_query, schema_fingerprint)
+                    error_context = (f"SQL: {sql}\nQuery Plan Rejected: {verdict.reason}\n"
+                                     f"Query Plan:\n{verdict.plan_text()}")
+                    attempt.set("failed_stage", "cost_gate")
+                    current_retry += 1
+                    continue # JUMP BACK TO START OF LOOP
+                auto_limited = verdict.sql != exec_sql
+                exec_sql = verdict.sql
+
+                # Step 3: Coder (Execute SQL; the chart is rendered after the loop)
+                with attempt.child("execute") as span:
+                    coder_res = self.coder.execute(exec_sql)
+                    if coder_res.success:
+                        span.set("rows", coder_res.data['row_count'])
+                        span.set("columns", coder_res.data['column_count'])
+                        span.set("result_cache_hit",
+                                 bool(coder_res.data['dataframe'].attrs.get('result_cache_hit')))
+                logs.extend(coder_res.logs)
+
+                if not coder_res.success:
+                    print("   ⚠️ Coder: Execution failed. Looping back...")
+                    if from_cache:
+                        self.sql_cache.invalidate(user_query, schema_fingerprint)
+                    if coder_res.data and coder_res.data.get('error_type') == 'timeout':
+                        error_context = (f"SQL: {sql}\nQuery Timeout: {coder_res.error}\n"
+                                         f"Write a cheaper query: filter early, aggregate instead of "
+                                         f"returning raw rows, avoid cross joins and correlated subqueries.")
+                    else:
+                        error_context = f"SQL: {sql}\nDatabase Error: {coder_res.error}"
+                        pending_repair = self._repair_sql(sql, coder_res.error or "", attempt, logs,
+                                                          repaired_from)
+                    attempt.set("failed_stage", "execute")
+                    if pending_repair is None:
+                        current_retry += 1
+                    continue # JUMP BACK TO START OF LOOP
+
+                # Success! Only validated, executed SQL goes into the cache
+                final_data = coder_res.data
+                if active_repair is not None:
+                    self.sql_repair.confirm(active_repair)
+                    round_trips_saved += 1
+                if not from_cache:
+                    self.sql_cache.put(user_query, schema_fingerprint, sql)
+                    self.memory.add_query_history(user_query, sql)
+                print("   ✅ Coder: Execution Successful!")
+                break
+
+        root.set("retries", current_retry)
+        root.set("llm_round_trips_saved", round_trips_saved)
+
+        # Check if we failed after max retries
+        if final_data is None:
+            return {"success": False, "error": "Max retries exceeded. Could not generate valid SQL.", "logs": logs}
+
+        streamed = final_data.get('result')
+        # Follow-ups filter and re-aggregate the cached frame, so only complete results are kept
+        complete = not (auto_limited or final_data['dataframe'].attrs.get('truncated')
+                        or (streamed is not None and streamed.spilled))
+        if session_id is not None and complete:
+            self.memory.add_session_result(session_id, user_query, sql, final_data['dataframe'],
+                                           follow_up_steps)
+        # The pipeline owns a streamed result: its spill file goes once chart and insights are done
+        try:
+            if emit is not None:
+                sql_event = {'sql': sql, 'cache_hit': from_cache}
+                if follow_up is not None:
+                    sql_event['follow_up'] = follow_up_steps
+                emit('sql', sql_event)
+                emit('rows', self._rows_event(final_data, streamed))
+
+            # Step 4: Chart (CPU) and Storyteller (network) only need the DataFrame,
+            # so they run as parallel stages and cost max(chart, insights), not the sum
+            print("   📊 Coder + Storyteller: Rendering chart and generating insights...")
+            dag = StageDAG(self._stage_executor)
+            dag.add('chart', lambda: self._traced_chart(root, final_data, emit))
+            dag.add('insights', lambda: self._traced_insights(root, user_query, final_data, streamed, emit))
+            stages = dag.run()
+            chart_res, story_res = stages['chart'], stages['insights']
+            logs.extend(chart_res.logs)
+            logs.extend(story_res.logs)
+
+            if not story_res.success:
+                return self._fail(story_res, logs)
+
+            result = {
+                "success": True,
+                "sql": sql,
+                "cache_hit": from_cache,
+                "chart": chart_res.data['chart'] if chart_res.success else None,
+                "insights": story_res.data['insights'],
+                "logs": logs
+            }
+            if follow_up is not None:
+                result["follow_up"] = follow_up_steps  # pandas steps applied on top of 'sql'
+            return result
+        finally:
+            if streamed is not None:
+                streamed.cleanup()
+
+    def _repair_sql(self, sql: str, error: str, attempt, logs: List[str], repaired_from: Set[str]):
+        """A locally repaired query to retry before asking the Architect again, or None"""
+        if self.sql_repair is None or sql in repaired_from or len(repaired_from) >= self.sql_repair.max_rounds:
+            return None
+        repaired_from.add(sql)
+        with attempt.child("repair") as span:
+            repair = self.sql_repair.repair(sql, error)
+            span.set("repaired", repair is not None)
+        if repair is None or repair.sql in repaired_from:
+            return None
+        logs.append(f"[{self.sql_repair.agent_name}] 🔧 Repaired {repair.kind} error locally: "
+                    f"{'; '.join(repair.fixes)}")
+        print(f"   🔧 SQLRepair: Fixed locally ({'; '.join(repair.fixes)}). Retrying without Architect...")
+        return repair
+
+    def _answer_follow_up(self, user_query: str, session_id: Optional[str], root, logs: List[str]):
+        """A FollowUpAnswer when the question refines one of the session's cached results"""
+        if session_id is None:
+            return None
+        results = self.memory.get_session_results(session_id)
+        if not results:
+            return None
+        with root.child("follow_up", cached_results=len(results)) as span:
+            answer = self.follow_ups.resolve(user_query, results)
+            span.set("answered", answer is not None)
+        root.set("follow_up", answer is not None)
+        if answer is not None:
+            logs.append(f"[{self.follow_ups.agent_name}] ♻️ Answered from the cached result of "
+                        f"'{answer.base.question}': {'; '.join(answer.steps)}")
+            print(f"   ♻️ Follow-up: Reusing session result ({'; '.join(answer.steps)})")
+        return answer
+
+    def _speculate(self, user_query: str, logs: List[str], root):
+        """
+        Returns (sql, coder data, error_context). Candidates are validated and
+        dry-run (EXPLAIN via the cost gate) in parallel, then executed in the
+        Architect's order until one succeeds. If none does, coder data is None
+        and error_context describes every failure for the serial repair loop.
+        """
+        with root.child("speculate", candidates=self.speculative_candidates) as span:
+            with span.child("architect") as arch_span:
+                architect_res = self.architect.generate_candidates(user_query, self.speculative_candidates)
+                if architect_res.success:
+                    arch_span.set("prompt_chars", architect_res.data['prompt_chars'])
+                    arch_span.set("response_chars", architect_res.data['response_chars'])
+            logs.extend(architect_res.logs)
             if not architect_res.success:
-                return self._fail(architect_res)
-            
-            sql = architect_res.data['sql']
+                print("   ⚠️ Architect: Speculative generation failed. Falling back to serial loop...")
+                return "", None, ""
+
+            candidates = architect_res.data['candidates']
+            print(f"   🤖 Architect: Generated {len(candidates)} SQL candidates")
+            checks = [f.result() for f in [self._stage_executor.submit(self._dry_run, user_query, sql, span)
+                                           for sql in candidates]]
+
+            failures = []
+            for i, (candidate, (runnable, problem, check_logs)) in enumerate(zip(candidates, checks), 1):
+                logs.extend(check_logs)
+                if runnable is None:
+                    failures.append(f"Candidate {i} SQL: {candidate}\n{problem}")
+                    continue
+                with span.child("execute", candidate=i) as exec_span:
+                    coder_res = self.coder.execute(runnable)
+                    if coder_res.success:
+                        exec_span.set("rows", coder_res.data['row_count'])
+                logs.extend(coder_res.logs)
+                if coder_res.success:
+                    span.set("winner", i)
+                    print(f"   ✅ Coder: Candidate {i} executed successfully!")
+                    return candidate, coder_res.data, ""
+                failures.append(f"Candidate {i} SQL: {candidate}\nDatabase Error: {coder_res.error}")
 
-            # Step 2: Validator (Check Safety)
+            span.set("winner", 0)
+            print("   ⚠️ Speculation: Every candidate failed. Falling back to serial loop...")
+            return "", None, "\n\n".join(failures)
+
+    def _dry_run(self, user_query: str, sql: str, parent):
+        """Validate + EXPLAIN one candidate: (runnable sql or None, problem, logs)"""
+        with parent.child("dry_run") as span:
             validator_res = self.validator.validate_query(user_query, sql)
-            self.all_logs.extend(validator_res.logs)
-            
             if not validator_res.success:
-                print("   ⚠️ Validator: Issues found. Looping back...")
-                error_context = f"SQL: {sql}\nValidation Issues: {validator_res.data['issues']}"
-                current_retry += 1
-                continue # JUMP BACK TO START OF LOOP
-
-            # Step 3: Coder (Execute SQL)
-            coder_res = self.coder.execute_and_visualize(sql)
-            self.all_logs.extend(coder_res.logs)
-
-            if not coder_res.success:
-                print("   ⚠️ Coder: Execution failed. Looping back...")
-                error_context = f"SQL: {sql}\nDatabase Error: {coder_res.error}"
-                current_retry += 1
-                continue # JUMP BACK TO START OF LOOP
-            
-            # Success!
-            final_data = coder_res.data
-            print("   ✅ Coder: Execution Successful!")
-            break
-        
-        # Check if we failed after max retries
-        if current_retry >= max_retries:
-            return {"success": False, "error": "Max retries exceeded. Could not generate valid SQL."}
-
-        # Step 4: Storyteller (Generate Insights)
-        print("   📊 Storyteller: Generating business insights...")
-        story_res = self.storyteller.generate_insights(
-            user_query, 
-            final_data['dataframe'], 
-            final_data['chart_type']
-        )
-        self.all_logs.extend(story_res.logs)
+                span.set("passed", False)
+                return None, f"Validation Issues: {validator_res.data['issues']}", validator_res.logs
+            logs = list(validator_res.logs)
+            sql = self._rewrite_for_rollups(sql, span, logs)
+            try:
+                verdict = self.cost_gate.check(sql)
+            except Exception as e:
+                span.set("passed", False)
+                return None, f"Database Error: {e}", logs
+            span.set("passed", verdict.allowed)
+            if not verdict.allowed:
+                return None, f"Query Plan Rejected: {verdict.reason}", logs + verdict.logs
+            return verdict.sql, "", logs + verdict.logs
 
+    def _rewrite_for_rollups(self, sql: str, span, logs: List[str]) -> str:
+        """SQL to execute: 'sql' moved onto a pre-aggregated rollup when one answers it"""
+        if self.rollups is None:
+            return sql
+        try:
+            rewrite = self.rollups.rewrite(sql)
+        except Exception as e:
+            logs.append(f"[{self.rollups.agent_name}] ⚠️ Rollup rewrite skipped: {e}")
+            return sql
+        span.set("rollup_hit", rewrite is not None)
+        if rewrite is None:
+            return sql
+        logs.append(f"[{self.rollups.agent_name}] 🧊 Answering from {rewrite.table} ({rewrite.rows:,} rows)")
+        print(f"   🧊 Rollups: Answering from {rewrite.table}")
+        return rewrite.sql
+
+    @staticmethod
+    def _rows_event(final_data, streamed) -> Dict[str, Any]:
+        """Row count, columns, a preview and per-column stats, JSON-ready"""
+        df = final_data['dataframe']
+        stats = streamed.stats() if streamed is not None else df.describe()
         return {
-            "success": True,
-            "sql": sql,
-            "chart": final_data['chart'],
-            "insights": story_res.data['insights'],
-            "logs": self.all_logs
+            'row_count': final_data['row_count'],
+            'columns': [str(c) for c in df.columns],
+            'preview': json.loads(df.head(ROWS_PREVIEW).to_json(orient='records', date_format='iso')),
+            'stats': json.loads(stats.to_json(date_format='iso')) if not df.empty else {},
         }
 
-    def _fail(self, res):
-        return {"success": False, "error": res.error, "logs": self.all_logs}
+    def _traced_chart(self, root, final_data, emit=None):
+        with root.child("chart", chart_type=final_data['chart_type']) as span:
+            chart_res = self.coder.visualize(final_data['dataframe'], final_data['chart_type'],
+                                             final_data.get('result'))
+            chart = chart_res.data['chart'] if chart_res.success else None
+            # A LazyChart has no bytes until someone renders it
+            if isinstance(chart, str):
+                span.set("chart_bytes", len(chart))
+            if emit is not None and chart is not None:
+                emit('chart', {'chart_type': final_data['chart_type'], 'mime_type': self.viz_tool.mime_type,
+                               'chart': str(chart)})
+            return chart_res
+
+    def _traced_insights(self, root, user_query, final_data, streamed, emit=None):
+        with root.child("storyteller") as span:
+            story_res = self.storyteller.generate_insights(
+                user_query, 
+                final_data['dataframe'], 
+                final_data['chart_type'],
+                row_count=final_data['row_count'],
+                column_stats=streamed.stats() if streamed is not None else None,
+                on_token=(lambda text: emit('insight', {'text': text})) if emit is not None else None
+            )
+            if story_res.success:
+                span.set("prompt_chars", story_res.data['prompt_chars'])
+                span.set("response_chars", story_res.data['response_chars'])
+            return story_res
+
+    def _fail(self, res, logs):
+        return {"success": False, "error": res.error, "logs": logs}
 
 # === RUN THE APP ===
 if __name__ == "__main__":
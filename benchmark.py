@@ -0,0 +1,343 @@
+"""
+Offline performance benchmark for AutoInsights.
+Drives AutoInsightsOrchestrator with a deterministic stub model (no network)
+against a generated dataset, reports per-stage p50/p95 latency, throughput,
+peak memory and retries, and compares against a saved baseline.
+
+    python benchmark.py --rows 100000 --repeat 3 --save-baseline baseline.json
+    python benchmark.py --rows 100000 --repeat 3 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from src.llm.stub_model import RecordReplayModel, RuleBasedModel
+from src.memory.shard_store import partition_database
+from src.memory.synthetic_warehouse import generate_warehouse
+from src.telemetry.tracing import Tracer
+
+# Labeled questions: the SQL the stub "generates" plus the columns a correct answer returns.
+# 'broken_sql' is answered first so the self-correction loop (local SQL repair, or an
+# Architect retry with --no-sql-repair) shows up in the numbers.
+CORPUS = [
+    {"question": "Total sales by region",
+     "sql": "SELECT region, SUM(amount) AS total FROM sales GROUP BY region ORDER BY total DESC",
+     "expected_columns": ["region", "total"]},
+    {"question": "Monthly revenue trend",
+     "sql": "SELECT strftime('%Y-%m', sale_date) AS month, SUM(amount) AS revenue "
+            "FROM sales GROUP BY month ORDER BY month",
+     "expected_columns": ["month", "revenue"]},
+    {"question": "Sales by product category",
+     "sql": "SELECT product_category, COUNT(*) AS orders, SUM(amount) AS total "
+            "FROM sales GROUP BY product_category",
+     "broken_sql": "SELECT categroy, COUNT(*) AS orders, SUM(amount) AS total FROM sales GROUP BY categroy",
+     "expected_columns": ["product_category", "orders", "total"]},
+    {"question": "Top 10 customers by spend",
+     "sql": "SELECT c.name, SUM(s.amount) AS spend FROM sales s JOIN customers c "
+            "ON s.customer_id = c.id GROUP BY c.id ORDER BY spend DESC LIMIT 10",
+     "expected_columns": ["name", "spend"]},
+    {"question": "Average order value for Electronics by month",
+     "sql": "SELECT strftime('%Y-%m', sale_date) AS month, AVG(amount) AS avg_order "
+            "FROM sales WHERE product_category = 'Electronics' GROUP BY month ORDER BY month",
+     "expected_columns": ["month", "avg_order"]},
+    {"question": "Customers per region",
+     "sql": "SELECT region, COUNT(*) AS customers FROM customers GROUP BY region",
+     "expected_columns": ["region", "customers"]},
+    {"question": "Low inventory products",
+     "sql": "SELECT name, category, inventory FROM products WHERE inventory < 20 ORDER BY inventory",
+     "expected_columns": ["name", "category", "inventory"]},
+]
+
+# A p95/throughput change beyond this fraction counts as a regression
+DEFAULT_TOLERANCE = 0.10
+# ...unless the p95 moved by less than this (sub-millisecond stages are mostly noise)
+MIN_REGRESSION_MS = 1.0
+
+
+def build_dataset(db_path: str, rows: int, seed: int = 42, create_indexes: bool = False):
+    """Create sales/products/customers with 'rows' sales rows (seeded, reproducible)"""
+    return generate_warehouse(db_path, rows, create_indexes=create_indexes, seed=seed)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (values need not be sorted)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class SpanCollector:
+    """In-memory span exporter the benchmark aggregates from"""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak resident set size of this process (None where resource is unavailable)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(rows: int = 10_000, repeat: int = 3, concurrency: int = 4,
+                  llm_latency_ms: float = 0.0, replay_path: Optional[str] = None,
+                  streaming: bool = False, seed: int = 42,
+                  speculative_candidates: int = 0, create_indexes: bool = False,
+                  rollups: bool = False, shards: int = 0, sql_repair: bool = True) -> Dict[str, Any]:
+    # Imported here so the stub models are in place before anything touches Gemini
+    from autoinsights_adk_python import AutoInsightsOrchestrator
+
+    workdir = tempfile.mkdtemp(prefix="autoinsights-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    build_start = time.perf_counter()
+    build_dataset(db_path, rows, seed, create_indexes)
+    shard_dir = None
+    if shards:
+        shard_dir = os.path.join(workdir, "shards")
+        partition_database(db_path, shard_dir, by="month", shards=shards)
+    build_seconds = time.perf_counter() - build_start
+
+    latency = llm_latency_ms / 1000
+    if replay_path:
+        model = RecordReplayModel(replay_path, latency_seconds=latency)
+    else:
+        model = RuleBasedModel(CORPUS, latency_seconds=latency)
+
+    collector = SpanCollector()
+    tracer = Tracer(enabled=True, exporters=[collector])
+    app = AutoInsightsOrchestrator(streaming=streaming, max_concurrency=concurrency, tracer=tracer,
+                                   db_path=db_path, sql_cache_path=os.path.join(workdir, "sql_cache.db"),
+                                   query_history_path=os.path.join(workdir, "query_history.db"),
+                                   model_sql=model, model_insight=model,
+                                   speculative_candidates=speculative_candidates, rollups=rollups,
+                                   shard_dir=shard_dir, sql_repair=sql_repair)
+
+    questions = [case["question"] for case in CORPUS] * repeat
+    try:
+        start = time.perf_counter()
+        results = asyncio.run(app.analyze_many(questions))
+        elapsed = time.perf_counter() - start
+
+        expected = {case["question"]: case["expected_columns"] for case in CORPUS}
+        correct = sum(
+            1 for question, result in zip(questions, results)
+            if result["success"] and expected[question] == [
+                c.lower() for c in app.sql_tool.execute(result["sql"]).columns]
+        )
+    finally:
+        app.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    durations = defaultdict(list)
+    retries = []
+    saved = []
+    for span in collector.spans:
+        durations[span.name].append(span.duration_seconds * 1000)
+        if span.name == "analysis":
+            retries.append(span.attributes.get("retries", 0))
+            saved.append(span.attributes.get("llm_round_trips_saved", 0))
+
+    return {
+        "config": {"rows": rows, "repeat": repeat, "concurrency": concurrency,
+                   "llm_latency_ms": llm_latency_ms, "streaming": streaming,
+                   "model": "replay" if replay_path else "rule-based", "seed": seed,
+                   "speculative_candidates": speculative_candidates, "indexes": create_indexes,
+                   "rollups": rollups, "shards": shards, "sql_repair": sql_repair},
+        "dataset_build_seconds": round(build_seconds, 3),
+        "questions": len(questions),
+        "succeeded": sum(1 for r in results if r["success"]),
+        "correct": correct,
+        "total_seconds": round(elapsed, 3),
+        "throughput_qps": round(len(questions) / elapsed, 3) if elapsed else 0.0,
+        "retries_total": sum(retries),
+        "retries_max": max(retries, default=0),
+        "llm_round_trips_saved": sum(saved),
+        "peak_memory_mb": peak_memory_mb(),
+        "stages": {
+            name: {"count": len(values),
+                   "p50_ms": round(percentile(values, 50), 3),
+                   "p95_ms": round(percentile(values, 95), 3)}
+            for name, values in sorted(durations.items())
+        },
+    }
+
+
+# Runs in a fresh interpreter per sample so module imports are measured cold
+_STARTUP_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import autoinsights_adk_python as app_module
+from benchmark import CORPUS
+from src.llm.stub_model import RuleBasedModel
+timings = {"import": time.perf_counter() - start}
+model = RuleBasedModel(CORPUS)
+app = app_module.AutoInsightsOrchestrator(db_path=sys.argv[1], sql_cache_path=sys.argv[2],
+                                          query_history_path=sys.argv[4],
+                                          model_sql=model, model_insight=model)
+timings["construct"] = time.perf_counter() - start
+if sys.argv[3] == "warm":
+    app.warm_up()
+    timings["warm_up"] = time.perf_counter() - start
+ready = time.perf_counter()
+app.analyze(CORPUS[0]["question"])
+timings["first_answer"] = time.perf_counter() - ready
+timings["total"] = time.perf_counter() - start
+app.shutdown()
+print("STARTUP " + json.dumps(timings))
+"""
+
+
+def run_startup_benchmark(rows: int = 10_000, runs: int = 5, seed: int = 42) -> Dict[str, Any]:
+    """Median cold-start timings (import, construct, warm-up, first answer) over fresh processes"""
+    import subprocess
+
+    workdir = tempfile.mkdtemp(prefix="autoinsights-startup-")
+    db_path = os.path.join(workdir, "bench.db")
+    build_dataset(db_path, rows, seed)
+    here = os.path.dirname(os.path.abspath(__file__))
+    report = {"config": {"rows": rows, "runs": runs, "seed": seed}}
+    try:
+        for mode in ("cold", "warm"):
+            samples = defaultdict(list)
+            for i in range(runs):
+                cache_path = os.path.join(workdir, f"sql_cache_{mode}_{i}.db")  # No SQL cache hits
+                history_path = os.path.join(workdir, f"query_history_{mode}_{i}.db")
+                out = subprocess.run([sys.executable, "-c", _STARTUP_SNIPPET, db_path, cache_path, mode,
+                                      history_path],
+                                     cwd=here, capture_output=True, text=True, check=True).stdout
+                line = next(l for l in out.splitlines() if l.startswith("STARTUP "))
+                for name, seconds in json.loads(line[len("STARTUP "):]).items():
+                    samples[name].append(seconds * 1000)
+            report[mode] = {name: round(percentile(values, 50), 1) for name, values in samples.items()}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_startup_report(report: Dict[str, Any]):
+    print("\n🚀 STARTUP BENCHMARK (median ms over "
+          f"{report['config']['runs']} fresh processes, {report['config']['rows']:,} rows)")
+    print("-" * 60)
+    for mode in ("cold", "warm"):
+        print(f"{mode:<6}" + "  ".join(f"{name}: {ms}" for name, ms in report[mode].items()))
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Regressions of this run against a baseline report (empty list = none)"""
+    regressions = []
+    for name, stage in report["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if (base and stage["p95_ms"] > base["p95_ms"] * (1 + tolerance)
+                and stage["p95_ms"] - base["p95_ms"] > MIN_REGRESSION_MS):
+            regressions.append(f"{name} p95 {base['p95_ms']:.1f} ms -> {stage['p95_ms']:.1f} ms")
+    base_qps = baseline.get("throughput_qps", 0)
+    if base_qps and report["throughput_qps"] < base_qps * (1 - tolerance):
+        regressions.append(f"throughput {base_qps:.2f} -> {report['throughput_qps']:.2f} q/s")
+    accuracy = report["correct"] / max(report["questions"], 1)
+    base_accuracy = baseline.get("correct", 0) / max(baseline.get("questions", 0), 1)
+    if accuracy < base_accuracy:
+        regressions.append(f"correct answers {base_accuracy:.0%} -> {accuracy:.0%}")
+    return regressions
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print("\n⏱️ AUTOINSIGHTS BENCHMARK")
+    print("-" * 60)
+    config = report["config"]
+    print(f"Dataset: {config['rows']:,} sales rows (built in {report['dataset_build_seconds']}s), "
+          f"model: {config['model']}, concurrency: {config['concurrency']}")
+    print(f"Questions: {report['questions']}  succeeded: {report['succeeded']}  correct: {report['correct']}")
+    print(f"Throughput: {report['throughput_qps']} q/s  total: {report['total_seconds']}s")
+    print(f"Retries: {report['retries_total']} total, {report['retries_max']} max per question, "
+          f"{report.get('llm_round_trips_saved', 0)} LLM round-trips saved by local SQL repair")
+    if report["peak_memory_mb"] is not None:
+        print(f"Peak memory: {report['peak_memory_mb']:.1f} MB")
+    print(f"\n{'stage':<14}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'baseline p95':>15}")
+    for name, stage in report["stages"].items():
+        base = (baseline or {}).get("stages", {}).get(name)
+        base_text = f"{base['p95_ms']:.2f}" if base else "-"
+        print(f"{name:<14}{stage['count']:>7}{stage['p50_ms']:>11.2f}{stage['p95_ms']:>11.2f}{base_text:>15}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="sales rows in the generated dataset")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the question corpus")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="simulated model round-trip per call")
+    parser.add_argument("--replay", help="answer from a RecordReplayModel recording instead of the rule-based stub")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--speculative", type=int, default=0, metavar="N",
+                        help="ask for N SQL candidates at once and check them in parallel")
+    parser.add_argument("--indexes", action="store_true", help="index the generated dataset")
+    parser.add_argument("--rollups", action="store_true", help="answer eligible aggregates from rollup tables")
+    parser.add_argument("--no-sql-repair", action="store_true",
+                        help="send every SQL error back to the Architect instead of repairing it locally")
+    parser.add_argument("--shards", type=int, default=0, metavar="N",
+                        help="partition sales by month into N files and fan aggregates out over them")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--save-baseline", help="write the JSON report as the new baseline")
+    parser.add_argument("--baseline", help="compare against this baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--startup", action="store_true",
+                        help="measure import/construct/warm-up/first-answer time in fresh processes instead")
+    parser.add_argument("--runs", type=int, default=5, help="processes per startup sample (--startup)")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        startup = run_startup_benchmark(args.rows, args.runs, args.seed)
+        print_startup_report(startup)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(startup, f, indent=2)
+        return 0
+
+    report = run_benchmark(args.rows, args.repeat, args.concurrency, args.llm_latency_ms,
+                           args.replay, args.streaming, args.seed, args.speculative, args.indexes,
+                           args.rollups, args.shards, not args.no_sql_repair)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n💾 Report written to {path}")
+
+    if baseline is not None:
+        if baseline.get("config") != report["config"]:
+            print(f"\n⚠️ Baseline was recorded with a different config: {baseline.get('config')}")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
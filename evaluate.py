@@ -1,7 +1,63 @@
+import time
+
 from autoinsights_adk_python import AutoInsightsOrchestrator, setup_demo_database
+from src.agents.others import AgentValidator
+from src.memory.db_memory import DatabaseMemory
+
+# Valid read-only queries the validator must accept (several used to trip substring checks)
+VALID_SQL = [
+    "SELECT SUM(amount) FROM sales",
+    "SELECT product_category, SUM(amount) AS total FROM sales GROUP BY product_category ORDER BY total DESC",
+    "SELECT s.region, COUNT(*) AS orders FROM sales s JOIN customers c ON s.customer_id = c.id GROUP BY s.region",
+    "SELECT name, signup_date FROM customers WHERE signup_date >= '2024-01-01'",
+    "SELECT COUNT(*) AS created_orders FROM sales WHERE product_category = 'Electronics'",
+    "SELECT name AS last_update_by FROM customers",
+    "SELECT name FROM products WHERE name LIKE '%Drop%' OR category = 'Updates & Inserts'",
+    "WITH monthly AS (SELECT strftime('%Y-%m', sale_date) AS month, SUM(amount) AS total FROM sales GROUP BY month) "
+    "SELECT month, total FROM monthly ORDER BY month",
+    "SELECT region, AVG(amount) avg_amount FROM sales GROUP BY region HAVING avg_amount > 30000",
+    "SELECT category, replace(name, ' ', '_') AS slug FROM products",
+]
+
+# Statements the validator must reject
+INVALID_SQL = [
+    "DROP TABLE sales",
+    "DELETE FROM sales WHERE id = 1",
+    "UPDATE sales SET amount = 0",
+    "SELECT * FROM sales; DROP TABLE customers",
+    "INSERT INTO sales VALUES (13, 'Toys', 1, '2024-10-01', 'North', 1)",
+    "SELECT * FROM sqlite_master",
+    "SELECT categroy FROM sales",
+    "PRAGMA table_info(sales)",
+]
+
+
+def run_validator_evaluation():
+    """Measure validator false positives/negatives and latency (no LLM calls)"""
+    memory = DatabaseMemory("company_data.db")
+    validator = AgentValidator(memory, ['sales', 'products', 'customers'])
+
+    start = time.perf_counter()
+    false_positives = [sql for sql in VALID_SQL if not validator.validate_query("", sql).success]
+    false_negatives = [sql for sql in INVALID_SQL if validator.validate_query("", sql).success]
+    elapsed_us = (time.perf_counter() - start) * 1e6 / (len(VALID_SQL) + len(INVALID_SQL))
+
+    print("🛡️ VALIDATOR EVALUATION")
+    print("-" * 30)
+    print(f"False-positive rate: {len(false_positives)}/{len(VALID_SQL)} "
+          f"({len(false_positives) / len(VALID_SQL):.0%})")
+    print(f"False-negative rate: {len(false_negatives)}/{len(INVALID_SQL)} "
+          f"({len(false_negatives) / len(INVALID_SQL):.0%})")
+    print(f"Average validation time: {elapsed_us:.0f} µs")
+    for sql in false_positives:
+        print(f"  ⚠️ Rejected valid SQL: {sql}")
+    for sql in false_negatives:
+        print(f"  ⚠️ Accepted invalid SQL: {sql}")
+    print()
 
 def run_evaluation():
     setup_demo_database()
+    run_validator_evaluation()
     app = AutoInsightsOrchestrator()
     
     test_cases = [
@@ -0,0 +1,181 @@
+"""
+AutoInsights HTTP service: keeps agents, connections and caches warm across
+requests and streams each stage as newline-delimited JSON as soon as it is ready.
+
+    python service.py --port 8080
+
+    curl -N -X POST localhost:8080/analyze -d '{"question": "Total sales by region"}'
+
+Events, in order: started, sql, rows, then chart and insight (one per model
+chunk) interleaved, and finally done (or error).
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional
+
+from autoinsights_adk_python import AutoInsightsOrchestrator, preload_modules
+from src.telemetry.tracing import Tracer
+from src.tools.viz_tool import IMAGE_FORMATS
+
+# Largest accepted request body
+MAX_BODY_BYTES = 64 * 1024
+
+_END = object()
+
+
+class AnalysisService:
+    """One warm orchestrator shared by all requests; a bounded pool runs the pipelines"""
+
+    def __init__(self, app: AutoInsightsOrchestrator, workers: int = 4, queue_timeout: float = 30.0):
+        self.app = app
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="autoinsights-request")
+        self._slots = threading.BoundedSemaphore(workers * 4)  # Running + queued requests
+
+    def stream(self, question: str, session_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield pipeline events for one question as they are produced"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            yield {"event": "error", "error": "Server busy, try again later"}
+            return
+
+        events: "queue.Queue" = queue.Queue()
+        start = time.perf_counter()
+
+        def emit(event: str, payload: Dict[str, Any]):
+            events.put({"event": event, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+                        **payload})
+
+        def run():
+            try:
+                result = self.app.analyze_stream(question, emit, session_id)
+                if result["success"]:
+                    emit("done", {"sql": result["sql"], "cache_hit": result["cache_hit"]})
+                else:
+                    emit("error", {"error": result["error"], "logs": result["logs"]})
+            except Exception as e:
+                emit("error", {"error": str(e)})
+            finally:
+                events.put(_END)
+                self._slots.release()
+
+        emit("started", {"question": question})
+        self._pool.submit(run)
+        while True:
+            event = events.get()
+            if event is _END:
+                return
+            yield event
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+        self.app.shutdown()
+
+
+def make_handler(service: AnalysisService, tracer: Optional[Tracer]):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Needed for chunked streaming
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/metrics" and tracer is not None:
+                body = tracer.metrics.to_prometheus().encode()
+                self._send(200, body, "text/plain; version=0.0.4")
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if self.path != "/analyze":
+                self._send_json(404, {"error": "Not found"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self._send_json(413, {"error": "Request body too large"})
+                return
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+                question = body.get("question", "").strip()
+                session_id = body.get("session_id")
+            except (ValueError, AttributeError):
+                question, session_id = "", None
+            if not question:
+                self._send_json(400, {"error": 'Expected a JSON body like {"question": "..."}'})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            try:
+                for event in service.stream(question, str(session_id) if session_id is not None else None):
+                    self._write_chunk((json.dumps(event, default=str) + "\n").encode())
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # Client went away; the pipeline finishes in the background
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status: int, payload: Dict[str, Any]):
+            self._send(status, json.dumps(payload).encode(), "application/json")
+
+        def _send(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run AutoInsights as a streaming HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4, help="pipelines running at once")
+    parser.add_argument("--db", default="company_data.db")
+    parser.add_argument("--trace", action="store_true", help="enable tracing and GET /metrics")
+    parser.add_argument("--rollups", action="store_true", help="answer eligible aggregates from rollup tables")
+    parser.add_argument("--shards", metavar="DIR", help="serve a shard directory (src.memory.shard_store) instead of --db")
+    parser.add_argument("--chart-format", choices=sorted(IMAGE_FORMATS), default="png",
+                        help="image format of streamed charts (webp/svg are smaller for dense plots)")
+    parser.add_argument("--chart-dpi", type=int, default=150)
+    args = parser.parse_args()
+    # sqlite3 would silently create an empty file and every question would fail validation
+    if args.shards is None and not os.path.exists(args.db):
+        parser.error(f"database {args.db} not found: mount one and pass --db, or generate one with "
+                     f"'python -m src.memory.synthetic_warehouse --db {args.db}'")
+
+    preload_modules()
+    tracer = Tracer(enabled=True) if args.trace else None
+    app = AutoInsightsOrchestrator(max_concurrency=args.workers, db_path=args.db, tracer=tracer,
+                                   rollups=args.rollups, shard_dir=args.shards,
+                                   chart_format=args.chart_format, chart_dpi=args.chart_dpi)
+    print(f"🔥 Warm-up: {app.warm_up()}")
+
+    service = AnalysisService(app, workers=args.workers)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service, tracer))
+    print(f"🌐 AutoInsights service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
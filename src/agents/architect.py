@@ -1,4 +1,4 @@
-import google.generativeai as genai
+import re
 from typing import List, Any, Optional
 from dataclasses import dataclass
 
@@ -12,10 +12,23 @@ class AgentResponse:
     logs: List[str] = None
     agent_name: str = ""
 
+# Line between queries when several SQL candidates are requested at once
+CANDIDATE_SEPARATOR = "---"
+_SEPARATOR_RE = re.compile(r"^\s*-{3,}\s*$", re.MULTILINE)
+
+# Few-shot examples used before the query history has anything similar
+DEFAULT_EXAMPLES = [
+    ("Total sales for Electronics",
+     "SELECT sum(amount) FROM sales WHERE product_category = 'Electronics'"),
+    ("Top 3 customers by region",
+     "SELECT region, count(*) as count FROM customers GROUP BY region ORDER BY count DESC LIMIT 3"),
+]
+
 class AgentArchitect:
-    def __init__(self, model: genai.GenerativeModel, memory):
+    def __init__(self, model: Any, memory, few_shot_k: int = 3):
         self.model = model
         self.memory = memory
+        self.few_shot_k = few_shot_k
         self.agent_name = "AgentArchitect"
 
     def generate_sql(self, user_query: str, error_context: str = "") -> AgentResponse:
@@ -24,35 +37,7 @@ class AgentArchitect:
         If 'error_context' is provided, it attempts to FIX the previous SQL.
         """
         logs = [f"[{self.agent_name}] 🤖 Analyzing query..."]
-        
-        # 1. Get Schema
-        schema_context = self.memory.get_schema_context()
-        
-        # 2. Add Few-Shot Examples (CRITICAL FOR ACCURACY)
-        few_shot_examples = """
-        Examples:
-        Q: "Total sales for Electronics"
-        SQL: SELECT sum(amount) FROM sales WHERE product_category = 'Electronics'
-
-        Q: "Top 3 customers by region"
-        SQL: SELECT region, count(*) as count FROM customers GROUP BY region ORDER BY count DESC LIMIT 3
-        """
-
-        # 3. Base Prompt
-        base_prompt = f"""
-        You are an expert SQLite analyst.
-        
-        {schema_context}
-        
-        {few_shot_examples}
-        
-        User Query: "{user_query}"
-        
-        Rules: 
-        - Return ONLY the raw SQL query. 
-        - No markdown (no ```sql).
-        - Use valid SQLite syntax.
-        """
+        base_prompt = self._base_prompt(user_query)
 
         # 4. Dynamic Prompting (The Self-Correction Loop)
         if error_context:
@@ -73,10 +58,94 @@ class AgentArchitect:
         try:
             response = self.model.generate_content(prompt)
             # Clean up response in case Gemini adds markdown
-            sql_query = response.text.strip().replace("```sql", "").replace("```", "").strip()
+            sql_query = self._clean(response.text)
             
             logs.append(f"[{self.agent_name}] ✅ SQL Generated")
-            return AgentResponse(success=True, data={'sql': sql_query}, logs=logs, agent_name=self.agent_name)
+            return AgentResponse(success=True,
+                                 data={'sql': sql_query, 'prompt_chars': len(prompt),
+                                       'response_chars': len(response.text)},
+                                 logs=logs, agent_name=self.agent_name)
+
+        except Exception as e:
+            return AgentResponse(success=False, data=None, error=str(e), logs=logs, agent_name=self.agent_name)
+
+    def generate_candidates(self, user_query: str, n: int = 3) -> AgentResponse:
+        """
+        Speculative mode: ask for n alternative SQL queries in a single call,
+        best first, so they can be checked in parallel instead of one per retry.
+        """
+        logs = [f"[{self.agent_name}] 🤖 Analyzing query ({n} candidates)..."]
+        prompt = f"""{self._base_prompt(user_query, candidates=n)}
+        - Write {n} DIFFERENT SQL queries that answer the question (e.g. different
+          joins, filters or aggregations), most likely to be correct first.
+
+        SQL Queries:"""
+
+        try:
+            response = self.model.generate_content(prompt)
+            candidates = self.parse_candidates(response.text, n)
+            if not candidates:
+                raise ValueError("Model returned no SQL candidates")
+
+            logs.append(f"[{self.agent_name}] ✅ {len(candidates)} SQL candidates generated")
+            return AgentResponse(success=True,
+                                 data={'candidates': candidates, 'prompt_chars': len(prompt),
+                                       'response_chars': len(response.text)},
+                                 logs=logs, agent_name=self.agent_name)
 
         except Exception as e:
-            return AgentResponse(success=False, data=None, error=str(e), logs=logs, agent_name=self.agent_name)
\ No newline at end of file
+            return AgentResponse(success=False, data=None, error=str(e), logs=logs, agent_name=self.agent_name)
+
+    @classmethod
+    def parse_candidates(cls, text: str, n: int) -> List[str]:
+        """Split a multi-query answer on separator lines (or on ';' if the model ignored them)"""
+        text = cls._clean(text)
+        parts = _SEPARATOR_RE.split(text)
+        if len(parts) == 1:
+            parts = re.split(r";\s*\n", text)
+        candidates = []
+        for part in parts:
+            sql = part.strip().rstrip(";").strip()
+            if sql and sql not in candidates:
+                candidates.append(sql)
+        return candidates[:n]
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        return text.strip().replace("```sql", "").replace("```", "").strip()
+
+    def _base_prompt(self, user_query: str, candidates: int = 1) -> str:
+        # 1. Get Schema (only the tables relevant to this question)
+        schema_context = self.memory.get_schema_context(user_query)
+        
+        # 2. Add Few-Shot Examples (CRITICAL FOR ACCURACY)
+        # Past questions most like this one that ran successfully; generic examples until there are any
+        examples = self.memory.get_similar_queries(user_query, k=self.few_shot_k)
+        if not examples:
+            examples = DEFAULT_EXAMPLES
+        few_shot_examples = "Examples:\n" + "\n".join(
+            f'        Q: "{question}"\n        SQL: {" ".join(sql.split())}\n' for question, sql in examples
+        )
+
+        # 3. Base Prompt (speculative mode asks for several queries, so the output rule changes)
+        if candidates > 1:
+            output_rule = (f"Return ONLY {candidates} raw SQL queries, with a line containing "
+                           f"only {CANDIDATE_SEPARATOR} between them.")
+        else:
+            output_rule = "Return ONLY the raw SQL query."
+        base_prompt = f"""
+        You are an expert SQLite analyst.
+        
+        {schema_context}
+        
+        {few_shot_examples}
+        
+        User Query: "{user_query}"
+        
+        Rules: 
+        - {output_rule}
+        - No markdown (no ```sql).
+        - Use valid SQLite syntax.
+        """
+
+        return base_prompt
@@ -0,0 +1,39 @@
+from concurrent.futures import Executor, Future, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+
+class StageDAG:
+    """
+    Minimal stage graph: every stage is submitted to the executor as soon as
+    the stages it depends on have finished, so independent stages overlap.
+    A stage function receives the results of its dependencies, in order.
+    """
+
+    def __init__(self, executor: Executor):
+        self.executor = executor
+        self._stages: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()) -> "StageDAG":
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = (fn, tuple(deps))
+        return self
+
+    def run(self) -> Dict[str, Any]:
+        """Run every stage; returns {stage name: result}. Exceptions propagate."""
+        results: Dict[str, Any] = {}
+        running: Dict[Future, str] = {}
+        pending: List[str] = list(self._stages)
+
+        while pending or running:
+            for name in [n for n in pending if all(d in results for d in self._stages[n][1])]:
+                fn, deps = self._stages[name]
+                running[self.executor.submit(fn, *[results[d] for d in deps])] = name
+                pending.remove(name)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+        return results
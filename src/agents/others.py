@@ -1,13 +1,13 @@
-import google.generativeai as genai
-from google.generativeai import types
 import pandas as pd
 import sqlite3
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from dataclasses import dataclass
 
 # Import the tools these agents need to use
-from src.tools.sql_tool import SQLExecutorTool
-from src.tools.viz_tool import VisualizationTool
+from src.tools.data_summary import DataSummarizer
+from src.tools.sql_parser import SQLValidator
+from src.tools.sql_tool import SQLExecutorTool, QueryTimeoutError
+from src.tools.viz_tool import VisualizationTool, suggest_chart_type
 
 # Re-defining the response format here so these agents can use it
 @dataclass
@@ -26,41 +26,80 @@ class AgentCoder:
     Agent B: The Execution and Visualization Agent
     """
     
-    def __init__(self, sql_tool: SQLExecutorTool, viz_tool: VisualizationTool):
+    def __init__(self, sql_tool: SQLExecutorTool, viz_tool: VisualizationTool,
+                 streaming: bool = False, spill_threshold_rows: int = 200_000,
+                 lazy_charts: bool = False):
         self.sql_tool = sql_tool
         self.viz_tool = viz_tool
+        self.streaming = streaming
+        self.lazy_charts = lazy_charts
+        self.spill_threshold_rows = spill_threshold_rows
         self.agent_name = "AgentCoder"
         
     def execute_and_visualize(self, sql: str, chart_type: str = 'bar') -> AgentResponse:
-        """Execute SQL and create visualization"""
+        """Execute SQL and create visualization (a spilled data['result'] is the caller's to cleanup())"""
+        exec_res = self.execute(sql, chart_type)
+        if not exec_res.success:
+            return exec_res
+
+        viz_res = self.visualize(exec_res.data['dataframe'], exec_res.data['chart_type'],
+                                 exec_res.data['result'])
+        exec_res.logs.extend(viz_res.logs)
+        if not viz_res.success:
+            return AgentResponse(success=False, data=None, error=viz_res.error,
+                                 logs=exec_res.logs, agent_name=self.agent_name)
+
+        exec_res.data['chart'] = viz_res.data['chart']
+        return exec_res
+
+    def execute(self, sql: str, chart_type: str = 'bar') -> AgentResponse:
+        """Execute SQL and pick a chart type, without rendering anything"""
         logs = [f"[{self.agent_name}] 💻 Executing SQL query"]
         
         try:
-            # Execute SQL
-            df = self.sql_tool.execute(sql)
-            logs.append(f"[{self.agent_name}] ✅ Query returned {len(df)} rows, {len(df.columns)} columns")
-            
-            # Auto-detect chart type
-            if len(df) > 10:
-                chart_type = 'line'
+            # Execute SQL (streaming mode keeps only stats + a sample in memory)
+            result = None
+            if self.streaming:
+                result = self.sql_tool.execute_streaming(
+                    sql, spill_threshold_rows=self.spill_threshold_rows
+                )
+                df = result.dataframe
+                row_count = result.row_count
+                if result.spilled:
+                    logs.append(f"[{self.agent_name}] 💾 Large result spilled to {result.spill_path}")
+            else:
+                df = self.sql_tool.execute(sql)
+                row_count = len(df)
+            logs.append(f"[{self.agent_name}] ✅ Query returned {row_count} rows, {len(df.columns)} columns")
+            if df.attrs.get('truncated'):
+                logs.append(f"[{self.agent_name}] ✂️ Result truncated at the {self.sql_tool.max_rows:,}-row cap")
             
-            # Generate chart
-            chart_base64 = self.viz_tool.create_chart(df, chart_type)
-            logs.append(f"[{self.agent_name}] 📊 Generated {chart_type} chart")
+            # Auto-detect chart type: ordered x -> line, many categories -> top-N bars
+            chart_type = suggest_chart_type(df, chart_type, row_count)
             
             return AgentResponse(
                 success=True,
                 data={
                     'dataframe': df,
-                    'chart': chart_base64,
                     'chart_type': chart_type,
-                    'row_count': len(df),
-                    'column_count': len(df.columns)
+                    'row_count': row_count,
+                    'column_count': len(df.columns),
+                    'result': result
                 },
                 logs=logs,
                 agent_name=self.agent_name
             )
             
+        except QueryTimeoutError as e:
+            logs.append(f"[{self.agent_name}] ⏱️ Timeout: {str(e)}")
+            return AgentResponse(
+                success=False,
+                data={'error_type': 'timeout'},
+                error=str(e),
+                logs=logs,
+                agent_name=self.agent_name
+            )
+
         except Exception as e:
             logs.append(f"[{self.agent_name}] ❌ Error: {str(e)}")
             return AgentResponse(
@@ -71,6 +110,47 @@ class AgentCoder:
                 agent_name=self.agent_name
             )
 
+    def use_dataframe(self, df: pd.DataFrame, chart_type: str = 'bar') -> AgentResponse:
+        """Same response as execute() for a frame computed without SQL (e.g. a follow-up)"""
+        logs = [f"[{self.agent_name}] ♻️ Using {len(df)} rows derived from a cached session result"]
+        chart_type = suggest_chart_type(df, chart_type)
+        return AgentResponse(
+            success=True,
+            data={
+                'dataframe': df,
+                'chart_type': chart_type,
+                'row_count': len(df),
+                'column_count': len(df.columns),
+                'result': None
+            },
+            logs=logs,
+            agent_name=self.agent_name
+        )
+
+    def visualize(self, df: pd.DataFrame, chart_type: str, result=None) -> AgentResponse:
+        """
+        Render the chart for an executed query (lazy mode defers rendering).
+        A line chart of a spilled streaming result is drawn from all its rows,
+        downsampled batch by batch, rather than from the in-memory sample.
+        """
+        logs = []
+        try:
+            if result is not None and result.spilled and chart_type == 'line':
+                df = self.viz_tool.line_frame(result.iter_batches())
+                logs.append(f"[{self.agent_name}] 💾 Charting all {result.row_count:,} spilled rows "
+                            f"({len(df):,} points kept)")
+            chart_base64 = self.viz_tool.create_chart(df, chart_type, lazy=self.lazy_charts)
+            if self.lazy_charts:
+                logs.append(f"[{self.agent_name}] 📊 Deferred {chart_type} chart rendering")
+            else:
+                logs.append(f"[{self.agent_name}] 📊 Generated {chart_type} chart")
+            return AgentResponse(success=True, data={'chart': chart_base64}, logs=logs,
+                                 agent_name=self.agent_name)
+        except Exception as e:
+            logs.append(f"[{self.agent_name}] ❌ Chart error: {str(e)}")
+            return AgentResponse(success=False, data=None, error=str(e), logs=logs,
+                                 agent_name=self.agent_name)
+
 # ==========================================
 # AGENT C: THE STORYTELLER
 # ==========================================
@@ -79,29 +159,25 @@ class AgentStoryteller:
     Agent C: The Insight Generator Agent
     """
     
-    def __init__(self, model: genai.GenerativeModel):
+    def __init__(self, model: Any, summarizer: Optional[DataSummarizer] = None):
         self.model = model
+        self.summarizer = summarizer if summarizer is not None else DataSummarizer()
         self.agent_name = "AgentStoryteller"
         
     def generate_insights(self, user_query: str, df: pd.DataFrame, 
-                          chart_context: str) -> AgentResponse:
-        """Generate business insights from data"""
+                          chart_context: str, row_count: Optional[int] = None,
+                          column_stats: Optional[pd.DataFrame] = None,
+                          on_token: Optional[Callable[[str], None]] = None) -> AgentResponse:
+        """
+        Generate business insights from data.
+        For streamed results 'df' is a sample; pass the true 'row_count' and
+        the incrementally computed 'column_stats' so the summary covers all rows.
+        With 'on_token' the response is streamed and each chunk forwarded as it arrives.
+        """
         logs = [f"[{self.agent_name}] 📊 Analyzing data for insights"]
         
-        # Prepare data summary
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        data_summary = f"""
-Data Overview:
-- Total Records: {len(df)}
-- Columns: {', '.join(df.columns)}
-- Chart Type: {chart_context}
-
-Sample Data (First 5 rows):
-{df.head(5).to_string()}
-
-Statistical Analysis:
-{df.describe().to_string() if len(numeric_cols) > 0 else 'No numeric data available'}
-"""
+        # Prepare data summary (vectorized stats, top-k values, trends; token-budgeted)
+        data_summary = self.summarizer.summarize(df, chart_context, row_count, column_stats)
         
         prompt = f"""You are a Senior Business Intelligence Analyst.
 
@@ -120,20 +196,27 @@ Be specific and professional.
 """
         
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=types.GenerationConfig(
-                    temperature=0.7,
-                    max_output_tokens=2000
-                )
+            # Plain dict: genai accepts it, and it keeps the SDK import out of this module
+            generation_config = dict(
+                temperature=0.7,
+                max_output_tokens=2000
             )
-            
-            insights = response.text
+            if on_token is None:
+                response = self.model.generate_content(prompt, generation_config=generation_config)
+                insights = response.text
+            else:
+                parts = []
+                for chunk in self.model.generate_content(prompt, generation_config=generation_config,
+                                                         stream=True):
+                    parts.append(chunk.text)
+                    on_token(chunk.text)
+                insights = "".join(parts)
             logs.append(f"[{self.agent_name}] ✅ Generated insights")
             
             return AgentResponse(
                 success=True,
-                data={'insights': insights},
+                data={'insights': insights, 'prompt_chars': len(prompt),
+                      'response_chars': len(insights)},
                 logs=logs,
                 agent_name=self.agent_name
             )
@@ -149,21 +232,18 @@ class AgentValidator:
     Agent D: Safety and Validation Agent
     """
     
-    def __init__(self):
+    def __init__(self, memory=None, whitelist_tables: Optional[List[str]] = None):
+        self.memory = memory
+        self.sql_validator = SQLValidator(whitelist_tables)
         self.agent_name = "AgentValidator"
         
     def validate_query(self, user_query: str, sql: str) -> AgentResponse:
         """Validate for safety and correctness"""
         logs = [f"[{self.agent_name}] 🔒 Running safety validation"]
-        issues = []
-        
-        sql_lower = sql.lower()
         
-        # Security checks
-        dangerous_operations = ['drop', 'delete', 'update', 'insert', 'alter', 'create']
-        for operation in dangerous_operations:
-            if operation in sql_lower:
-                issues.append(f"🚫 Dangerous operation detected: {operation.upper()}")
+        # Token-level checks: single read-only statement, allowed tables, known columns
+        schema = self.memory.schema if self.memory is not None else None
+        issues = self.sql_validator.validate(sql, schema)
         
         if issues:
             logs.append(f"[{self.agent_name}] ❌ Validation FAILED")
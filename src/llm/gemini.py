@@ -0,0 +1,32 @@
+import threading
+from typing import Any, Optional
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+
+class GeminiModel:
+    """
+    genai.GenerativeModel that imports and configures google.generativeai on
+    first use, so importing or constructing the orchestrator does not pay for
+    the SDK (~0.6s) until a prompt is actually sent (or load() is called).
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, api_key: Optional[str] = None):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import the SDK and build the underlying model (idempotent, thread-safe)"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    if self._api_key:
+                        genai.configure(api_key=self._api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate_content(self, prompt: str, **kwargs) -> Any:
+        return self.load().generate_content(prompt, **kwargs)
@@ -0,0 +1,196 @@
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Lower number = served first when callers queue on the same rate limit
+PRIORITY_SQL = 0
+PRIORITY_INSIGHT = 1
+
+# Errors worth retrying (google.api_core / requests / builtins, matched by class name)
+TRANSIENT_ERROR_NAMES = frozenset([
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway", "Aborted",
+    "ConnectionError", "ConnectionResetError", "TimeoutError",
+])
+_TRANSIENT_MESSAGE_RE = re.compile(
+    r"\b(429|500|502|503|504)\b|quota|rate.?limit|temporarily|unavailable|timed? ?out", re.IGNORECASE
+)
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Quota, overload and network errors are retried; everything else fails fast"""
+    if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(exc).__mro__):
+        return True
+    return bool(_TRANSIENT_MESSAGE_RE.search(str(exc)))
+
+
+class TokenBucket:
+    """
+    Blocking token bucket. Waiters are served in priority order (then FIFO),
+    so queued SQL generation overtakes queued insight generation.
+    """
+
+    def __init__(self, rate_per_second: float, burst: float):
+        self.rate = rate_per_second
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+
+    def acquire(self, priority: int = PRIORITY_SQL) -> float:
+        """Take one token, blocking as needed; returns the seconds spent waiting"""
+        start = time.monotonic()
+        ticket = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    self._refill()
+                    at_head = self._waiters[0] == ticket
+                    if at_head and self.tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self.tokens -= 1
+                        self._cond.notify_all()  # The next waiter becomes head
+                        return time.monotonic() - start
+                    # Only the head needs a timer; the rest wait to be notified
+                    self._cond.wait((1 - self.tokens) / self.rate if at_head else None)
+            finally:
+                if ticket in self._waiters:  # Interrupted while waiting
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class LLMScheduler:
+    """
+    Single path for every model call: per-model token-bucket rate limits,
+    priority between agents, singleflight coalescing of identical in-flight
+    prompts and jittered exponential backoff on transient errors. These
+    retries are separate from the orchestrator's SQL self-correction loop.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, burst: Optional[float] = None,
+                 max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 16.0,
+                 seed: Optional[int] = None):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._inflight: Dict[Tuple, Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def set_rate(self, model_name: str, requests_per_minute: Optional[float], burst: Optional[float] = None):
+        """Override the default limit for one model (None = unlimited)"""
+        with self._lock:
+            self._buckets[model_name] = self._make_bucket(requests_per_minute, burst)
+
+    def _make_bucket(self, requests_per_minute: Optional[float], burst: Optional[float]) -> Optional[TokenBucket]:
+        if not requests_per_minute:
+            return None
+        rate = requests_per_minute / 60.0
+        return TokenBucket(rate, burst if burst is not None else max(1.0, rate))
+
+    def _bucket(self, model_name: str) -> Optional[TokenBucket]:
+        with self._lock:
+            if model_name not in self._buckets:
+                self._buckets[model_name] = self._make_bucket(self.requests_per_minute, self.burst)
+            return self._buckets[model_name]
+
+    def call(self, model_name: str, fn: Callable[..., Any], prompt: str,
+             kwargs: Optional[Dict[str, Any]] = None, priority: int = PRIORITY_SQL) -> Any:
+        """Run fn(prompt, **kwargs) under the model's limits; identical concurrent calls share one result"""
+        kwargs = kwargs or {}
+        if kwargs.get("stream"):
+            # A streamed response is a one-shot iterator and cannot be shared
+            return self._call_with_retries(model_name, fn, prompt, kwargs, priority)
+
+        key = (model_name, prompt, repr(sorted(kwargs.items())))
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._call_with_retries(model_name, fn, prompt, kwargs, priority)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _call_with_retries(self, model_name: str, fn: Callable[..., Any], prompt: str,
+                           kwargs: Dict[str, Any], priority: int) -> Any:
+        bucket = self._bucket(model_name)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                waited = bucket.acquire(priority)
+                with self._lock:
+                    self.throttled_seconds += waited
+            with self._lock:
+                self.calls += 1
+            try:
+                return fn(prompt, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient(e):
+                    raise
+                with self._lock:
+                    self.retries += 1
+                    # Full jitter: spreads out callers that failed together
+                    delay = self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'retries': self.retries,
+                'throttled_seconds': round(self.throttled_seconds, 3),
+                'in_flight': len(self._inflight),
+            }
+
+
+class ScheduledModel:
+    """Drop-in wrapper: generate_content() goes through the shared LLMScheduler"""
+
+    def __init__(self, model: Any, scheduler: LLMScheduler, priority: int = PRIORITY_SQL,
+                 name: Optional[str] = None):
+        self.model = model
+        self.scheduler = scheduler
+        self.priority = priority
+        self.name = name or getattr(model, "model_name", None) or type(model).__name__
+
+    def generate_content(self, prompt: str, **kwargs) -> Any:
+        return self.scheduler.call(self.name, self.model.generate_content, prompt, kwargs, self.priority)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
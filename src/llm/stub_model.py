@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+_SQL_QUESTION_RE = re.compile(r'User Query: "(.*?)"', re.DOTALL)
+_INSIGHT_QUESTION_RE = re.compile(r'ORIGINAL BUSINESS QUESTION: "(.*?)"', re.DOTALL)
+_TOTAL_RECORDS_RE = re.compile(r"Total Records: ([\d,]+)")
+
+
+class StubResponse:
+    """Mimics the part of a Gemini response the agents read"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def stream_chunks(text: str, words_per_chunk: int = 8) -> Iterator[StubResponse]:
+    """Split a response the way stream=True delivers it: a few words per chunk"""
+    words = re.findall(r"\S+\s*", text)
+    for i in range(0, len(words), words_per_chunk):
+        yield StubResponse("".join(words[i:i + words_per_chunk]))
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower())
+
+
+class RuleBasedModel:
+    """
+    Deterministic stand-in for genai.GenerativeModel (no network).
+    SQL prompts are answered from a labeled corpus of
+    {'question', 'sql', 'broken_sql'?} entries: 'broken_sql' is returned on the
+    first attempt and 'sql' once the prompt carries error feedback, so the
+    self-correction loop is exercised. Insight prompts get a fixed-shape report.
+    """
+
+    def __init__(self, corpus: List[Dict[str, Any]], latency_seconds: float = 0.0,
+                 fallback_sql: str = "SELECT COUNT(*) AS row_count FROM sales"):
+        self.entries = {normalize_question(case['question']): case for case in corpus}
+        self.latency_seconds = latency_seconds
+        self.fallback_sql = fallback_sql
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: str, **kwargs) -> StubResponse:
+        with self._lock:
+            self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)  # Simulated network round-trip
+
+        insight_match = _INSIGHT_QUESTION_RE.search(prompt)
+        if insight_match:
+            text = self._insights(insight_match.group(1), prompt)
+            return stream_chunks(text) if kwargs.get("stream") else StubResponse(text)
+
+        sql_match = _SQL_QUESTION_RE.search(prompt)
+        case = self.entries.get(normalize_question(sql_match.group(1))) if sql_match else None
+        if case is None:
+            return StubResponse(self.fallback_sql)
+        if case.get('broken_sql') and "SQL Queries:" in prompt:
+            # Speculative mode: the broken candidate ranks first, the good one second
+            return StubResponse(f"{case['broken_sql']}\n---\n{case['sql']}")
+        if case.get('broken_sql') and "PREVIOUS ATTEMPT FAILED" not in prompt:
+            return StubResponse(case['broken_sql'])
+        return StubResponse(case['sql'])
+
+    @staticmethod
+    def _insights(question: str, prompt: str) -> str:
+        records = _TOTAL_RECORDS_RE.search(prompt)
+        return (f"1. EXECUTIVE SUMMARY\nAnalysis of \"{question}\" over "
+                f"{records.group(1) if records else 'the'} records.\n"
+                "2. KEY FINDINGS\n- Findings are generated offline by the stub model.\n"
+                "3. TREND ANALYSIS\n- n/a\n"
+                "4. BUSINESS RECOMMENDATIONS\n- n/a\n"
+                "5. RISK ASSESSMENT\n- n/a\n")
+
+
+class RecordReplayModel:
+    """
+    Record mode (model given): forwards prompts to the real model and stores
+    each response keyed by a hash of the prompt. Replay mode (no model):
+    answers from the recording and raises LookupError on unseen prompts.
+    Prompts include the schema and data summary, so replay needs the same dataset.
+    """
+
+    def __init__(self, path: str, model: Optional[Any] = None, latency_seconds: float = 0.0):
+        self.path = path
+        self.model = model
+        self.latency_seconds = latency_seconds
+        self._lock = threading.Lock()
+        self.recordings: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.recordings = json.load(f)
+
+    @staticmethod
+    def prompt_key(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode()).hexdigest()[:24]
+
+    def generate_content(self, prompt: str, **kwargs) -> StubResponse:
+        key = self.prompt_key(prompt)
+        if self.model is None:
+            with self._lock:
+                text = self.recordings.get(key)
+            if text is None:
+                raise LookupError(f"No recorded response for prompt {key} in {self.path}")
+            if self.latency_seconds:
+                time.sleep(self.latency_seconds)
+            return stream_chunks(text) if kwargs.get("stream") else StubResponse(text)
+
+        response = self.model.generate_content(prompt, **kwargs)
+        if kwargs.get("stream"):
+            text = "".join(chunk.text for chunk in response)
+        else:
+            text = response.text
+        with self._lock:
+            self.recordings[key] = text
+        return stream_chunks(text) if kwargs.get("stream") else StubResponse(text)
+
+    def save(self):
+        """Write the recordings (record mode)"""
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.recordings, f, indent=1, sort_keys=True)
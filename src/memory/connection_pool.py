@@ -0,0 +1,122 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+from urllib.parse import quote
+
+
+class SQLiteConnectionPool:
+    """
+    Pool of read-only SQLite connections with tuned pragmas, checked out per query.
+    wal=True opts in to switching the database to WAL journaling so readers never
+    block on a writer; it is off by default because it persistently rewrites the
+    file's journal mode, leaves -wal/-shm files beside it and needs write access.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, mmap_size: int = 256 * 1024 * 1024,
+                 cache_size: int = -64000, temp_store: str = "MEMORY", wal: bool = False,
+                 timeout: float = 30.0):
+        self.db_path = db_path
+        self.size = size
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size  # Negative values are KiB, positive values are pages
+        self.temp_store = temp_store
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        if wal:
+            self._enable_wal()
+
+    def _enable_wal(self):
+        """WAL lets readers scan while a writer commits; it needs a writable handle once"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open one read-only connection and apply the pragmas"""
+        uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        conn.execute(f"PRAGMA temp_store={self.temp_store}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Check out a connection for the duration of one query"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No SQLite connection available after {self.timeout}s")
+
+    def open_connection(self) -> sqlite3.Connection:
+        """A connection configured like the pooled ones, owned by the caller"""
+        return self._connect()
+
+    def prewarm(self):
+        """Open every connection now rather than on the first concurrent queries"""
+        with self._lock:
+            while len(self._all) < self.size:
+                conn = self._connect()
+                self._all.append(conn)
+                self._idle.put(conn)
+
+    def data_version(self) -> Tuple[int, ...]:
+        """
+        Database-wide change token: the file change counter in the header plus
+        the size/mtime of the main and -wal files (WAL commits skip the counter).
+        Unlike PRAGMA data_version it is comparable across pooled connections.
+        """
+        return self._file_version(self.db_path)
+
+    @staticmethod
+    def _file_version(db_path: str) -> Tuple[int, ...]:
+        with open(db_path, 'rb') as f:
+            f.seek(24)
+            change_counter = int.from_bytes(f.read(4), 'big')
+        db_stat = os.stat(db_path)
+        token = (change_counter, db_stat.st_mtime_ns, db_stat.st_size)
+
+        wal_path = db_path + "-wal"
+        if os.path.exists(wal_path):
+            wal_stat = os.stat(wal_path)
+            token += (wal_stat.st_mtime_ns, wal_stat.st_size)
+        return token
+
+    def close_all(self):
+        """Close every connection the pool has opened"""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._idle = queue.LifoQueue()
+
+    def stats(self) -> dict:
+        return {'size': self.size, 'open': len(self._all), 'idle': self._idle.qsize()}
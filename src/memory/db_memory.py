@@ -1,52 +1,155 @@
+import hashlib
 import sqlite3
-from typing import Dict, List, Any
-from datetime import datetime
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+from src.memory.connection_pool import SQLiteConnectionPool
+from src.memory.query_history import QueryHistory
+from src.memory.schema_index import SchemaIndex
+from src.memory.session_cache import SessionCache, SessionResult
 
 class DatabaseMemory:
     """Memory system for storing schema and query history"""
     
-    def __init__(self, db_path: str = "company_data.db"):
+    # Sample values per text column fed to the schema index (read from a bounded prefix)
+    SAMPLE_VALUES = 10
+    SAMPLE_SCAN_ROWS = 500
+
+    def __init__(self, db_path: str = "company_data.db", pool_size: int = 4,
+                 schema_top_k: int = 5, schema_token_budget: int = 1500,
+                 history_path: str = "query_history.db",
+                 pool: Optional[SQLiteConnectionPool] = None,
+                 session_cache_bytes: int = 256 * 1024 * 1024, **pool_options):
         self.db_path = db_path
-        self.connection = sqlite3.connect(db_path)
-        self.schema = self._load_schema()
-        self.query_history = []
-        self.session_memory = {}
+        if pool is None:
+            # Shared with SQLExecutorTool, which serialises access across worker threads
+            self.connection = sqlite3.connect(db_path, check_same_thread=False)
+            # Read-only connections for concurrent queries (see SQLiteConnectionPool for options)
+            self.pool = SQLiteConnectionPool(db_path, size=pool_size, **pool_options)
+        else:
+            # A caller-built pool (e.g. ShardedConnectionPool) also supplies the schema connection
+            self.pool = pool
+            self.connection = pool.open_connection()
+        self.schema_top_k = schema_top_k
+        self.schema_token_budget = schema_token_budget
+        self.schema_index = SchemaIndex()
+        self._schema: Dict[str, List[str]] = {}
+        self._schema_version: Optional[int] = None
+        self._schema_lock = threading.RLock()
+        self._refresh_schema_if_changed()
+        # Successful question/SQL pairs, retrieved as few-shot examples
+        self.query_history = QueryHistory(history_path)
+        # Per-session values and recent result frames (for follow-ups), under one byte budget
+        self.session_memory = SessionCache(max_bytes=session_cache_bytes)
         
-    def _load_schema(self) -> Dict[str, List[str]]:
-        """Load database schema"""
+    @property
+    def schema(self) -> Dict[str, List[str]]:
+        """Table -> columns, reloaded lazily when PRAGMA schema_version changes"""
+        self._refresh_schema_if_changed()
+        return self._schema
+
+    def _refresh_schema_if_changed(self):
+        with self._schema_lock:
+            version = self.connection.execute("PRAGMA schema_version").fetchone()[0]
+            if version != self._schema_version:
+                self._schema, samples = self._load_schema()
+                self.schema_index.build(self._schema, samples)
+                self._schema_version = version
+
+    def _load_schema(self):
+        """
+        Load database schema (one pragma_table_info join) plus sample text values.
+        RollupManager's summary tables are internal and left out.
+        """
         cursor = self.connection.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        
+        cursor.execute("""
+            SELECT m.name, p.name, p.type
+            FROM sqlite_master AS m
+            JOIN pragma_table_info(m.name) AS p
+            WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+              AND m.name NOT LIKE 'rollup\\_%' ESCAPE '\\'
+            ORDER BY m.rowid, p.cid
+        """)
+
         schema = {}
-        for table in tables:
-            table_name = table[0]
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = [col[1] for col in cursor.fetchall()]
-            schema[table_name] = columns
-        
-        return schema
+        text_columns = {}
+        for table_name, column, column_type in cursor.fetchall():
+            schema.setdefault(table_name, []).append(column)
+            column_type = (column_type or "").upper()
+            if not column_type or any(t in column_type for t in ("CHAR", "TEXT", "CLOB")):
+                text_columns.setdefault(table_name, []).append(column)
+
+        samples = {}
+        for table_name, columns in text_columns.items():
+            samples[table_name] = {}
+            for column in columns:
+                cursor.execute(
+                    f'SELECT DISTINCT "{column}" FROM '
+                    f'(SELECT "{column}" FROM "{table_name}" LIMIT {self.SAMPLE_SCAN_ROWS}) '
+                    f'WHERE "{column}" IS NOT NULL LIMIT {self.SAMPLE_VALUES}'
+                )
+                samples[table_name][column] = [row[0] for row in cursor.fetchall()]
+
+        return schema, samples
     
-    def get_schema_context(self) -> str:
-        """Format schema for agent context"""
+    def get_schema_context(self, user_query: Optional[str] = None) -> str:
+        """
+        Format schema for agent context.
+        With a user_query, only the top-k most relevant tables (BM25 over names
+        and sample values) are included, within schema_token_budget.
+        """
+        schema = self.schema
+        if user_query is None:
+            tables = list(schema)
+            budget = None
+        else:
+            with self._schema_lock:
+                ranked = self.schema_index.search(user_query)
+            tables = [table for table, _ in ranked]
+            if len(tables) > self.schema_top_k:
+                # Prune to lexical matches; if nothing matched keep the first tables
+                matched = [table for table, score in ranked if score > 0]
+                tables = (matched or tables)[:self.schema_top_k]
+            budget = self.schema_token_budget * 4  # ~4 characters per token
+
         context = "Database Schema:\n\n"
-        for table, columns in self.schema.items():
-            context += f"Table: {table}\n"
-            context += f"Columns: {', '.join(columns)}\n\n"
+        for table in tables:
+            block = f"Table: {table}\n"
+            block += f"Columns: {', '.join(schema[table])}\n\n"
+            if budget is not None and len(context) + len(block) > budget and table != tables[0]:
+                break
+            context += block
         return context
+
+    def get_schema_fingerprint(self) -> str:
+        """Stable hash of the schema, used to key caches that depend on it"""
+        canonical = "|".join(
+            f"{table}:{','.join(columns)}" for table, columns in sorted(self.schema.items())
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()[:16]
     
     def add_query_history(self, query: str, result: str):
-        """Store successful query patterns"""
-        self.query_history.append({
-            'query': query,
-            'result': result,
-            'timestamp': datetime.now()
-        })
+        """Store a successful question/SQL pair for the current schema"""
+        self.query_history.add(query, result, self.get_schema_fingerprint())
+
+    def get_similar_queries(self, query: str, k: int = 3) -> List[Tuple[str, str]]:
+        """(question, sql) pairs from past questions most similar to this one"""
+        similar = self.query_history.similar(query, self.get_schema_fingerprint(), k=k)
+        return [(question, sql) for question, sql, _ in similar]
     
-    def store_session_data(self, key: str, value: Any):
+    def store_session_data(self, key: str, value: Any, session_id: str = "default"):
         """Store session-specific data"""
-        self.session_memory[key] = value
+        self.session_memory.put(session_id, key, value)
     
-    def get_session_data(self, key: str) -> Any:
+    def get_session_data(self, key: str, session_id: str = "default") -> Any:
         """Retrieve session-specific data"""
-        return self.session_memory.get(key)
\ No newline at end of file
+        return self.session_memory.get(session_id, key)
+
+    def add_session_result(self, session_id: str, question: str, sql: str, frame,
+                           steps: Optional[List[str]] = None) -> bool:
+        """Keep an answered question's result frame for follow-ups in the same session"""
+        return self.session_memory.add_result(session_id, SessionResult(question, sql, frame, steps or []))
+
+    def get_session_results(self, session_id: str) -> List[SessionResult]:
+        """The session's cached results, newest first"""
+        return self.session_memory.results(session_id)
\ No newline at end of file
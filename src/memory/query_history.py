@@ -0,0 +1,193 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+from src.memory.schema_index import tokenize
+from src.memory.sql_cache import SQLCache
+
+# Character n-gram size; catches typos and word forms that word tokens miss
+NGRAM = 3
+# Features in more than this share of entries barely discriminate; they count
+# towards norms but are not walked when collecting candidates
+COMMON_FEATURE_SHARE = 0.5
+
+
+def question_features(question: str) -> Set[str]:
+    """Word terms plus padded character trigrams of the normalized question"""
+    normalized = SQLCache.normalize_question(question)
+    features = {f"w:{term}" for term in tokenize(normalized)}
+    for word in normalized.split():
+        padded = f" {word} "
+        features.update(padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1))
+    return features
+
+
+class QueryHistory:
+    """
+    Persistent store of question/SQL pairs that executed successfully, used as
+    few-shot examples. Entries are kept in SQLite (LRU-trimmed to max_entries)
+    and mirrored in an in-memory inverted index for similarity search.
+    """
+
+    def __init__(self, db_path: str = "query_history.db", max_entries: int = 2000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        # (question_key, schema_fingerprint) -> (question, sql, features)
+        self._entries: Dict[Tuple[str, str], Tuple[str, str, Set[str]]] = {}
+        self._postings: Dict[str, Set[Tuple[str, str]]] = {}
+        # Entry vector norms, recomputed when the entry count drifts far enough to shift the idfs
+        self._norms: Dict[Tuple[str, str], float] = {}
+        self._norms_total = 0
+        self._create_table()
+        self._load()
+
+    def _create_table(self):
+        with self._lock:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS query_history (
+                    question_key TEXT NOT NULL,
+                    schema_fingerprint TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    use_count INTEGER DEFAULT 0,
+                    PRIMARY KEY (question_key, schema_fingerprint)
+                )
+            """)
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_query_history_last_used ON query_history(last_used)"
+            )
+            self.connection.commit()
+
+    def _load(self):
+        """Build the in-memory index from the most recently used entries"""
+        rows = self.connection.execute(
+            "SELECT question_key, schema_fingerprint, question, sql FROM query_history "
+            "ORDER BY last_used DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        with self._lock:
+            for key, fingerprint, question, sql in rows:
+                self._index((key, fingerprint), question, sql)
+
+    def _index(self, entry_key: Tuple[str, str], question: str, sql: str):
+        self._unindex(entry_key)
+        features = question_features(question)
+        self._entries[entry_key] = (question, sql, features)
+        for feature in features:
+            self._postings.setdefault(feature, set()).add(entry_key)
+        self._norms[entry_key] = self._norm(features)
+
+    def _unindex(self, entry_key: Tuple[str, str]):
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        del self._norms[entry_key]
+        for feature in entry[2]:
+            keys = self._postings.get(feature)
+            if keys is not None:
+                keys.discard(entry_key)
+                if not keys:
+                    del self._postings[feature]
+
+    def _idf(self, feature: str) -> float:
+        doc_freq = len(self._postings.get(feature, ())) or 1
+        return math.log(1 + len(self._entries) / doc_freq)
+
+    def _norm(self, features: Set[str]) -> float:
+        return math.sqrt(sum(self._idf(f) ** 2 for f in features)) or 1.0
+
+    def _refresh_norms(self):
+        total = len(self._entries)
+        if total and not 0.8 <= total / (self._norms_total or 1) <= 1.25:
+            self._norms = {key: self._norm(entry[2]) for key, entry in self._entries.items()}
+            self._norms_total = total
+
+    def add(self, question: str, sql: str, schema_fingerprint: str):
+        """Record SQL that passed validation and executed successfully"""
+        entry_key = (SQLCache.normalize_question(question), schema_fingerprint)
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO query_history "
+                "(question_key, schema_fingerprint, question, sql, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (question_key, schema_fingerprint) "
+                "DO UPDATE SET sql = excluded.sql, last_used = excluded.last_used",
+                (*entry_key, question, sql, now, now)
+            )
+            self._index(entry_key, question, sql)
+            self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        """Trim least-recently-used entries beyond max_entries"""
+        size = self.connection.execute("SELECT COUNT(*) FROM query_history").fetchone()[0]
+        overflow = size - self.max_entries
+        if overflow <= 0:
+            return
+        stale = self.connection.execute(
+            "SELECT question_key, schema_fingerprint FROM query_history ORDER BY last_used ASC LIMIT ?",
+            (overflow,)
+        ).fetchall()
+        self.connection.executemany(
+            "DELETE FROM query_history WHERE question_key = ? AND schema_fingerprint = ?", stale
+        )
+        for entry_key in stale:
+            self._unindex(tuple(entry_key))
+
+    def similar(self, question: str, schema_fingerprint: str, k: int = 3,
+                min_score: float = 0.2) -> List[Tuple[str, str, float]]:
+        """
+        Up to k (question, sql, score) pairs for the same schema, most similar
+        first (idf-weighted cosine over word terms and trigrams). The question
+        itself is excluded: an exact repeat is the SQL cache's job.
+        """
+        own_key = SQLCache.normalize_question(question)
+        query = question_features(question)
+        with self._lock:
+            total = len(self._entries)
+            if not total or not query:
+                return []
+            self._refresh_norms()
+            idf = {f: self._idf(f) for f in query if f in self._postings}
+            common = max(50, COMMON_FEATURE_SHARE * total)
+
+            overlap: Counter = Counter()
+            for feature, weight in idf.items():
+                postings = self._postings[feature]
+                if len(postings) > common:
+                    continue
+                for entry_key in postings:
+                    if entry_key[1] == schema_fingerprint and entry_key[0] != own_key:
+                        overlap[entry_key] += weight * weight
+
+            # Features no entry has still count towards the question's norm (at the maximum idf)
+            unseen = len(query) - len(idf)
+            query_norm = math.sqrt(sum(w * w for w in idf.values()) + unseen * math.log(1 + total) ** 2)
+            scored = []
+            for entry_key, dot in overlap.items():
+                score = dot / (query_norm * self._norms[entry_key])
+                if score >= min_score:
+                    entry_question, sql, _ = self._entries[entry_key]
+                    scored.append((entry_question, sql, score))
+
+            scored.sort(key=lambda item: -item[2])
+            top = scored[:k]
+            if top:
+                now = time.time()
+                self.connection.executemany(
+                    "UPDATE query_history SET last_used = ?, use_count = use_count + 1 "
+                    "WHERE question_key = ? AND schema_fingerprint = ?",
+                    [(now, SQLCache.normalize_question(q), schema_fingerprint) for q, _, _ in top]
+                )
+                self.connection.commit()
+        return top
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,69 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+_SPLIT = re.compile(r"[A-Za-z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split identifiers and prose into lower-case terms (snake_case/camelCase aware)"""
+    terms = []
+    for word in _SPLIT.findall(re.sub(r"([a-z])([A-Z])", r"\1 \2", text)):
+        word = word.lower()
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]  # crude plural folding: sales -> sale, customers -> customer
+        terms.append(word)
+    return terms
+
+
+class SchemaIndex:
+    """BM25 index over table names, column names and sample values"""
+
+    # Name matches matter more than sample-value matches
+    TABLE_WEIGHT = 3
+    COLUMN_WEIGHT = 2
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._docs: Dict[str, Counter] = {}
+        self._lengths: Dict[str, int] = {}
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+
+    def build(self, schema: Dict[str, List[str]], samples: Dict[str, Dict[str, List[str]]]):
+        """(Re)build the index; samples maps table -> column -> example values"""
+        self._docs = {}
+        for table, columns in schema.items():
+            terms = tokenize(table) * self.TABLE_WEIGHT
+            for column in columns:
+                terms += tokenize(column) * self.COLUMN_WEIGHT
+            for values in samples.get(table, {}).values():
+                for value in values:
+                    terms += tokenize(str(value))
+            self._docs[table] = Counter(terms)
+
+        self._lengths = {t: sum(c.values()) for t, c in self._docs.items()}
+        self._avg_length = (sum(self._lengths.values()) / len(self._lengths)) if self._lengths else 0.0
+
+        doc_freq = Counter(term for counts in self._docs.values() for term in counts)
+        n_docs = len(self._docs)
+        self._idf = {
+            term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()
+        }
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        """All tables ranked by BM25 score against the query (ties keep schema order)"""
+        query_terms = set(tokenize(query))
+        scored = []
+        for order, (table, counts) in enumerate(self._docs.items()):
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[table] / (self._avg_length or 1))
+            score = 0.0
+            for term in query_terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scored.append((table, score, order))
+        scored.sort(key=lambda item: (-item[1], item[2]))
+        return [(table, score) for table, score, _ in scored]
@@ -0,0 +1,121 @@
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Tuple
+
+import pandas as pd
+
+
+@dataclass
+class SessionResult:
+    """One answered question: the SQL behind it and the resulting frame"""
+    question: str
+    sql: str
+    frame: pd.DataFrame
+    steps: List[str] = field(default_factory=list)  # Follow-up operations applied on top of sql
+
+
+def value_bytes(value: Any) -> int:
+    """Approximate in-memory size, counting DataFrames (and results holding one) deeply"""
+    if isinstance(value, SessionResult):
+        return int(value.frame.memory_usage(index=True, deep=True).sum()) + len(value.question) + len(value.sql)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return sys.getsizeof(value)
+
+
+class SessionCache:
+    """
+    Per-session values plus each session's most recent results, within one
+    byte budget shared by all sessions. Least recently used entries are
+    evicted first; a value larger than the whole budget is not kept.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, results_per_session: int = 5):
+        self.max_bytes = max_bytes
+        self.results_per_session = results_per_session
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, int]]" = OrderedDict()
+        self._results: Dict[str, List[int]] = {}  # session -> result sequence numbers, oldest first
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def put(self, session_id: str, key: Hashable, value: Any) -> bool:
+        """Store a value; False when it does not fit the budget at all"""
+        size = value_bytes(value)
+        with self._lock:
+            self._remove((session_id, key))
+            if size > self.max_bytes:
+                return False
+            self._entries[(session_id, key)] = (value, size)
+            self.current_bytes += size
+            self._evict()
+            return True
+
+    def get(self, session_id: str, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get((session_id, key))
+            if entry is None:
+                return default
+            self._entries.move_to_end((session_id, key))
+            return entry[0]
+
+    def add_result(self, session_id: str, result: SessionResult) -> bool:
+        """Keep a result as the session's newest, dropping its oldest beyond results_per_session"""
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        if not self.put(session_id, ('result', sequence), result):
+            return False
+        with self._lock:
+            numbers = self._results.setdefault(session_id, [])
+            numbers.append(sequence)
+            while len(numbers) > self.results_per_session:
+                self._remove((session_id, ('result', numbers.pop(0))))
+            return True
+
+    def results(self, session_id: str) -> List[SessionResult]:
+        """The session's cached results, newest first"""
+        with self._lock:
+            numbers = self._results.get(session_id, [])
+            found = []
+            for sequence in reversed(numbers):
+                entry = self._entries.get((session_id, ('result', sequence)))
+                if entry is not None:
+                    self._entries.move_to_end((session_id, ('result', sequence)))
+                    found.append(entry[0])
+            return found
+
+    def clear(self, session_id: str):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == session_id]:
+                self._remove(entry_key)
+            self._results.pop(session_id, None)
+
+    def _remove(self, entry_key: Tuple[str, Hashable]):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+            key = entry_key[1]
+            if isinstance(key, tuple) and key[0] == 'result':
+                numbers = self._results.get(entry_key[0])
+                if numbers is not None and key[1] in numbers:
+                    numbers.remove(key[1])
+                    if not numbers:
+                        del self._results[entry_key[0]]
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'sessions': len({session_id for session_id, _ in self._entries}),
+                'bytes': self.current_bytes,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,235 @@
+"""
+Sharded storage: the fact table split across several SQLite files.
+A shard directory holds manifest.json, catalog.db (every other table, plus
+an empty copy of the fact table for its schema) and one file per shard.
+
+    python -m src.memory.shard_store --source company_data.db --out shards --by month --shards 8
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Tuple
+from urllib.parse import quote
+
+from src.memory.connection_pool import SQLiteConnectionPool
+from src.memory.synthetic_warehouse import LOAD_PRAGMAS
+
+MANIFEST = "manifest.json"
+CATALOG = "catalog.db"
+# SQLite's default SQLITE_MAX_ATTACHED; the catalog plus every shard must fit in one connection
+MAX_SHARDS = 10
+
+# Partitioning scheme -> expression over the fact table giving each row's key
+PARTITION_KEYS = {
+    'month': "strftime('%Y-%m', sale_date)",
+    'region': "region",
+}
+
+
+@dataclass
+class ShardLayout:
+    """What manifest.json records: the scheme and, per shard, its file, keys and row count"""
+    directory: str
+    by: str
+    fact_table: str = "sales"
+    columns: List[str] = field(default_factory=list)
+    shards: List[Dict[str, object]] = field(default_factory=list)
+
+    @property
+    def catalog_path(self) -> str:
+        return os.path.join(self.directory, CATALOG)
+
+    @property
+    def shard_paths(self) -> List[str]:
+        return [os.path.join(self.directory, shard['file']) for shard in self.shards]
+
+    @classmethod
+    def load(cls, directory: str) -> "ShardLayout":
+        with open(os.path.join(directory, MANIFEST)) as f:
+            data = json.load(f)
+        data['directory'] = directory
+        return cls(**data)
+
+    def save(self):
+        data = asdict(self)
+        del data['directory']  # The directory can move; paths are relative to it
+        with open(os.path.join(self.directory, MANIFEST), 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+def _assign(counts: List[Tuple[object, int]], by: str, shards: int) -> List[List[object]]:
+    """
+    Group partition keys into shards of similar size: months stay contiguous
+    (cut at the running total), other keys are packed largest first.
+    """
+    shards = max(1, min(shards, len(counts)))
+    groups: List[List[object]] = [[] for _ in range(shards)]
+    if by == 'month':
+        total = sum(n for _, n in counts) or 1
+        running = 0
+        for key, n in counts:
+            index = min(shards - 1, int(running * shards / total))
+            groups[index].append(key)
+            running += n
+    else:
+        sizes = [0] * shards
+        for key, n in sorted(counts, key=lambda item: -item[1]):
+            index = sizes.index(min(sizes))
+            groups[index].append(key)
+            sizes[index] += n
+    return [group for group in groups if group] or [[]]
+
+
+def _key_filter(expression: str, keys: List[object]) -> Tuple[str, List[object]]:
+    values = [key for key in keys if key is not None]
+    clauses = []
+    if values:
+        clauses.append(f"{expression} IN ({', '.join('?' * len(values))})")
+    if len(values) < len(keys):
+        clauses.append(f"{expression} IS NULL")
+    return " OR ".join(clauses) or "0", values
+
+
+def partition_database(source_db: str, directory: str, by: str = "month", shards: int = 4,
+                       fact_table: str = "sales") -> ShardLayout:
+    """Split fact_table of source_db into up to `shards` files under directory (replacing them)"""
+    if by not in PARTITION_KEYS:
+        raise ValueError(f"Unknown partitioning '{by}', expected one of {sorted(PARTITION_KEYS)}")
+    if not 1 <= shards <= MAX_SHARDS:
+        raise ValueError(f"shards must be between 1 and {MAX_SHARDS}")
+    os.makedirs(directory, exist_ok=True)
+    expression = PARTITION_KEYS[by]
+
+    source = sqlite3.connect(source_db)
+    try:
+        tables = source.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "AND name NOT LIKE 'rollup\\_%' ESCAPE '\\' ORDER BY rowid"
+        ).fetchall()
+        fact_sql = dict(tables).get(fact_table)
+        if fact_sql is None:
+            raise ValueError(f"{source_db} has no '{fact_table}' table")
+        indexes = source.execute(
+            "SELECT tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall()
+        columns = [row[1] for row in source.execute(f'PRAGMA table_info("{fact_table}")')]
+        counts = source.execute(
+            f'SELECT {expression} AS key, COUNT(*) FROM "{fact_table}" GROUP BY key ORDER BY key'
+        ).fetchall()
+    finally:
+        source.close()
+
+    for name in os.listdir(directory):
+        if name == CATALOG or (name.startswith("shard_") and name.endswith(".db")):
+            os.remove(os.path.join(directory, name))
+
+    source_uri = f"file:{quote(os.path.abspath(source_db))}?mode=ro"
+    catalog = sqlite3.connect(os.path.join(directory, CATALOG))
+    try:
+        catalog.execute("ATTACH DATABASE ? AS source", (source_uri,))
+        with catalog:
+            for name, sql in tables:
+                catalog.execute(sql)
+                if name != fact_table:
+                    catalog.execute(f'INSERT INTO main."{name}" SELECT * FROM source."{name}"')
+            for table, sql in indexes:
+                if table != fact_table and table in dict(tables):
+                    catalog.execute(sql)
+        catalog.execute("DETACH DATABASE source")
+    finally:
+        catalog.close()
+
+    layout = ShardLayout(directory, by, fact_table, columns)
+    for number, keys in enumerate(_assign(counts, by, shards)):
+        file_name = f"shard_{number:02d}.db"
+        where, params = _key_filter(expression, keys)
+        conn = sqlite3.connect(os.path.join(directory, file_name))
+        try:
+            for pragma in LOAD_PRAGMAS:
+                conn.execute(pragma)
+            conn.execute("ATTACH DATABASE ? AS source", (source_uri,))
+            with conn:
+                conn.execute(fact_sql)
+                conn.execute(f'INSERT INTO main."{fact_table}" SELECT * FROM source."{fact_table}" '
+                             f'WHERE {where} ORDER BY rowid', params)
+            conn.execute("DETACH DATABASE source")
+            for table, sql in indexes:
+                if table == fact_table:
+                    conn.execute(sql)
+            conn.execute("ANALYZE")
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{fact_table}"').fetchone()[0]
+        finally:
+            conn.close()
+        layout.shards.append({'file': file_name, 'keys': keys, 'rows': rows})
+
+    layout.save()
+    return layout
+
+
+class ShardedConnectionPool(SQLiteConnectionPool):
+    """
+    Read-only connections to the catalog with every shard attached and a TEMP
+    view named after the fact table (UNION ALL over the shards) shadowing the
+    catalog's empty copy, so any query runs unchanged against the full data.
+    """
+
+    def __init__(self, directory: str, size: int = 4, **options):
+        self.layout = ShardLayout.load(directory)
+        super().__init__(self.layout.catalog_path, size=size, **options)
+
+    def _enable_wal(self):
+        for path in [self.db_path] + self.layout.shard_paths:
+            conn = sqlite3.connect(path, timeout=self.timeout)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            finally:
+                conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = super()._connect()
+        if len(self.layout.shards) > conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED):
+            conn.close()
+            raise ValueError(f"{len(self.layout.shards)} shards exceed SQLite's attached-database limit")
+        arms = []
+        for number, path in enumerate(self.layout.shard_paths):
+            conn.execute("ATTACH DATABASE ? AS ?",
+                         (f"file:{quote(os.path.abspath(path))}?mode=ro", self.schema_name(number)))
+            arms.append(f'SELECT * FROM {self.schema_name(number)}."{self.layout.fact_table}"')
+        conn.execute(f'CREATE TEMP VIEW "{self.layout.fact_table}" AS {" UNION ALL ".join(arms)}')
+        return conn
+
+    @staticmethod
+    def schema_name(number: int) -> str:
+        return f"shard_{number}"
+
+    def data_version(self) -> Tuple[int, ...]:
+        """Change token over the catalog and every shard file"""
+        token: Tuple[int, ...] = ()
+        for path in [self.db_path] + self.layout.shard_paths:
+            token += self._file_version(path)
+        return token
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition the sales table across SQLite files")
+    parser.add_argument("--source", default="company_data.db")
+    parser.add_argument("--out", default="shards", help="shard directory")
+    parser.add_argument("--by", choices=sorted(PARTITION_KEYS), default="month")
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"🧩 Partitioning {args.source} by {args.by} into {args.out}/ ...")
+    started = time.perf_counter()
+    layout = partition_database(args.source, args.out, by=args.by, shards=args.shards)
+    for shard in layout.shards:
+        keys = shard['keys']
+        span = f"{keys[0]} .. {keys[-1]}" if args.by == 'month' else ", ".join(map(str, keys))
+        print(f"   {shard['file']}: {shard['rows']:,} rows ({span})")
+    print(f"✅ {len(layout.shards)} shards in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+class SQLCache:
+    """Persistent NL-to-SQL cache so repeat questions skip the Architect LLM call"""
+
+    def __init__(self, db_path: str = "sql_cache.db", max_entries: int = 1000,
+                 ttl_seconds: float = 7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_table()
+
+    def _create_table(self):
+        """Create the cache table and its LRU index if missing"""
+        with self._lock:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS sql_cache (
+                    question_key TEXT NOT NULL,
+                    schema_fingerprint TEXT NOT NULL,
+                    question TEXT,
+                    sql TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hit_count INTEGER DEFAULT 0,
+                    PRIMARY KEY (question_key, schema_fingerprint)
+                )
+            """)
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sql_cache_last_used ON sql_cache(last_used)"
+            )
+            self.connection.commit()
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Lower-case the question and collapse punctuation and whitespace"""
+        question = re.sub(r"[^\w\s'%.-]", " ", question.lower())
+        question = re.sub(r"\s+", " ", question).strip()
+        return question.rstrip(" .")
+
+    def get(self, question: str, schema_fingerprint: str) -> Optional[str]:
+        """Return cached SQL for the question, or None on a miss or expired entry"""
+        key = self.normalize_question(question)
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT sql, created_at FROM sql_cache WHERE question_key = ? AND schema_fingerprint = ?",
+                (key, schema_fingerprint)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            sql, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self.connection.execute(
+                    "DELETE FROM sql_cache WHERE question_key = ? AND schema_fingerprint = ?",
+                    (key, schema_fingerprint)
+                )
+                self.connection.commit()
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self.connection.execute(
+                "UPDATE sql_cache SET last_used = ?, hit_count = hit_count + 1 "
+                "WHERE question_key = ? AND schema_fingerprint = ?",
+                (now, key, schema_fingerprint)
+            )
+            self.connection.commit()
+            self.hits += 1
+            return sql
+
+    def put(self, question: str, schema_fingerprint: str, sql: str):
+        """Store SQL that has passed validation and executed successfully"""
+        key = self.normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sql_cache "
+                "(question_key, schema_fingerprint, question, sql, created_at, last_used, hit_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, schema_fingerprint, question, sql, now, now)
+            )
+            self._evict(now)
+            self.connection.commit()
+
+    def invalidate(self, question: str, schema_fingerprint: str):
+        """Drop a cached entry (e.g. when the cached SQL stops working)"""
+        key = self.normalize_question(question)
+        with self._lock:
+            self.connection.execute(
+                "DELETE FROM sql_cache WHERE question_key = ? AND schema_fingerprint = ?",
+                (key, schema_fingerprint)
+            )
+            self.connection.commit()
+
+    def _evict(self, now: float):
+        """Apply TTL expiry, then trim least-recently-used entries to max_entries"""
+        cursor = self.connection.cursor()
+        if self.ttl_seconds:
+            cursor.execute("DELETE FROM sql_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.evictions += cursor.rowcount
+
+        cursor.execute("SELECT COUNT(*) FROM sql_cache")
+        overflow = cursor.fetchone()[0] - self.max_entries
+        if overflow > 0:
+            cursor.execute(
+                "DELETE FROM sql_cache WHERE rowid IN "
+                "(SELECT rowid FROM sql_cache ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current size"""
+        with self._lock:
+            size = self.connection.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': size,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
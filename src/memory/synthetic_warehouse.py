@@ -0,0 +1,284 @@
+"""
+Synthetic warehouse generator for load testing.
+Bulk-loads sales/products/customers (same schema as setup_demo_database)
+at any scale with popularity skew, seasonality and consistent foreign keys.
+
+    python -m src.memory.synthetic_warehouse --sales 10000000 --db company_data.db
+"""
+import argparse
+import math
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+
+CATEGORIES = {
+    # category: (share of products, price range, seasonal peak month)
+    'Electronics': (0.25, (50, 2500), 11),
+    'Clothing': (0.25, (10, 300), 12),
+    'Home & Garden': (0.20, (15, 900), 5),
+    'Sports': (0.15, (10, 700), 6),
+    'Toys': (0.10, (5, 150), 12),
+    'Books': (0.05, (5, 60), 9),
+}
+PRODUCT_NOUNS = {
+    'Electronics': ['Laptop', 'Phone', 'Headphones', 'Monitor', 'Camera', 'Tablet'],
+    'Clothing': ['Jacket', 'Shirt', 'Jeans', 'Sneakers', 'Dress', 'Sweater'],
+    'Home & Garden': ['Lamp', 'Chair', 'Planter', 'Rug', 'Grill', 'Blender'],
+    'Sports': ['Racket', 'Bike', 'Yoga Mat', 'Dumbbells', 'Tent', 'Helmet'],
+    'Toys': ['Puzzle', 'Robot', 'Doll', 'Board Game', 'Blocks', 'Kite'],
+    'Books': ['Novel', 'Cookbook', 'Atlas', 'Biography', 'Guide', 'Comic'],
+}
+# Regions with their share of customers and typical basket multiplier
+REGIONS = {'North': (0.35, 1.10), 'South': (0.25, 0.90), 'East': (0.25, 1.00), 'West': (0.15, 1.20)}
+FIRST_NAMES = ['Alex', 'Sam', 'Priya', 'Chen', 'Maria', 'Omar', 'Lena', 'Kofi', 'Yuki', 'Noah',
+               'Ava', 'Ravi', 'Sofia', 'Liam', 'Zara', 'Mateo']
+LAST_NAMES = ['Smith', 'Patel', 'Garcia', 'Kim', 'Nguyen', 'Okafor', 'Rossi', 'Silva', 'Khan',
+              'Müller', 'Brown', 'Ito', 'Cohen', 'Haddad']
+
+SCHEMA = """
+    DROP TABLE IF EXISTS sales;
+    DROP TABLE IF EXISTS products;
+    DROP TABLE IF EXISTS customers;
+    CREATE TABLE sales (
+        id INTEGER PRIMARY KEY,
+        product_category TEXT,
+        amount REAL,
+        sale_date TEXT,
+        region TEXT,
+        customer_id INTEGER
+    );
+    CREATE TABLE products (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        category TEXT,
+        price REAL,
+        inventory INTEGER
+    );
+    CREATE TABLE customers (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        email TEXT,
+        region TEXT,
+        signup_date TEXT
+    );
+"""
+
+INDEXES = [
+    "CREATE INDEX idx_sales_sale_date ON sales(sale_date)",
+    "CREATE INDEX idx_sales_product_category ON sales(product_category)",
+    "CREATE INDEX idx_sales_region ON sales(region)",
+    "CREATE INDEX idx_sales_customer_id ON sales(customer_id)",
+    "CREATE INDEX idx_customers_region ON customers(region)",
+    "CREATE INDEX idx_products_category ON products(category)",
+]
+
+# Bulk-load settings: no journal or fsync; the file is rebuilt from scratch anyway
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA locking_mode=EXCLUSIVE",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",  # 256 MiB
+]
+
+
+class WarehouseGenerator:
+    """
+    Seeded generator: product popularity and customer activity follow Zipf-like
+    skew, sales follow yearly/weekly seasonality with growth, every sale's
+    customer exists and had signed up by the sale date, and a sale's category
+    and amount come from the product bought.
+    """
+
+    def __init__(self, sales_rows: int = 1_000_000, customers: Optional[int] = None,
+                 products: Optional[int] = None, start: date = date(2022, 1, 1), days: int = 3 * 365,
+                 seed: int = 42, batch_size: int = 250_000, skew: float = 1.1):
+        self.sales_rows = sales_rows
+        self.customers = customers or max(100, sales_rows // 20)
+        self.products = products or max(50, min(50_000, sales_rows // 1000))
+        self.start = start
+        self.days = days
+        self.seed = seed
+        self.batch_size = batch_size
+        self.skew = skew
+        self.rng = np.random.default_rng(seed)
+        self._customer_regions = None
+        self._dates = [(start + timedelta(days=d)).isoformat() for d in range(days)]
+
+    def generate(self, db_path: str, create_indexes: bool = True, analyze: bool = True) -> Dict[str, float]:
+        """Build the database at db_path; returns seconds spent per phase"""
+        timings = {}
+        conn = sqlite3.connect(db_path)
+        try:
+            for pragma in LOAD_PRAGMAS:
+                conn.execute(pragma)
+            conn.executescript(SCHEMA)
+
+            started = time.perf_counter()
+            categories, prices = self._load_products(conn)
+            signup_days = self._load_customers(conn)
+            timings['dimensions'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            self._load_sales(conn, categories, prices, signup_days)
+            timings['sales'] = time.perf_counter() - started
+
+            if create_indexes:
+                started = time.perf_counter()
+                with conn:
+                    for statement in INDEXES:
+                        conn.execute(statement)
+                timings['indexes'] = time.perf_counter() - started
+            if analyze:
+                # sqlite_stat1 row counts feed the planner and QueryCostGate
+                started = time.perf_counter()
+                conn.execute("ANALYZE")
+                conn.commit()
+                timings['analyze'] = time.perf_counter() - started
+        finally:
+            conn.execute("PRAGMA locking_mode=NORMAL")
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.close()
+        return {phase: round(seconds, 3) for phase, seconds in timings.items()}
+
+    def _load_products(self, conn: sqlite3.Connection):
+        names = list(CATEGORIES)
+        shares = np.array([CATEGORIES[c][0] for c in names])
+        category_idx = self.rng.choice(len(names), size=self.products, p=shares / shares.sum())
+        low = np.array([CATEGORIES[c][1][0] for c in names])[category_idx]
+        high = np.array([CATEGORIES[c][1][1] for c in names])[category_idx]
+        # Log-uniform prices: many cheap items, a few expensive ones
+        prices = np.round(np.exp(self.rng.uniform(np.log(low), np.log(high))), 2)
+        inventory = self.rng.negative_binomial(2, 0.02, size=self.products)
+        nouns = self.rng.integers(len(PRODUCT_NOUNS[names[0]]), size=self.products)
+
+        rows = ((i + 1, f"{PRODUCT_NOUNS[names[c]][n]} {i + 1}", names[c], p, inv)
+                for i, (c, n, p, inv) in enumerate(zip(category_idx.tolist(), nouns.tolist(),
+                                                       prices.tolist(), inventory.tolist())))
+        with conn:
+            conn.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?)", rows)
+        return [names[c] for c in category_idx.tolist()], prices
+
+    def _load_customers(self, conn: sqlite3.Connection) -> np.ndarray:
+        """Customers sign up over time (ids ascend with signup date); returns each one's signup day"""
+        # A tenth exist before the window opens, so every sale date has eligible customers
+        early = max(1, self.customers // 10)
+        signup_days = np.concatenate([
+            self.rng.integers(-365, 0, size=early),
+            # Sign-ups accelerate over the window (quadratic growth)
+            (np.sqrt(self.rng.uniform(0, 1, size=self.customers - early)) * self.days).astype(np.int64),
+        ])
+        signup_days.sort()
+
+        region_names = list(REGIONS)
+        shares = np.array([REGIONS[r][0] for r in region_names])
+        regions = self.rng.choice(len(region_names), size=self.customers, p=shares / shares.sum())
+        first = self.rng.integers(len(FIRST_NAMES), size=self.customers)
+        last = self.rng.integers(len(LAST_NAMES), size=self.customers)
+
+        def rows():
+            for i, (day, r, f, l) in enumerate(zip(signup_days.tolist(), regions.tolist(),
+                                                  first.tolist(), last.tolist())):
+                name = f"{FIRST_NAMES[f]} {LAST_NAMES[l]}"
+                yield (i + 1, name, f"{FIRST_NAMES[f].lower()}.{LAST_NAMES[l].lower()}{i + 1}@example.com",
+                       region_names[r], (self.start + timedelta(days=day)).isoformat())
+
+        with conn:
+            conn.executemany("INSERT INTO customers VALUES (?, ?, ?, ?, ?)", rows())
+        self._customer_regions = regions
+        return signup_days
+
+    def _day_weights(self) -> np.ndarray:
+        """Relative sales volume per day: growth trend x yearly season x weekly cycle"""
+        day = np.arange(self.days)
+        dates = [self.start + timedelta(days=int(d)) for d in day]
+        growth = 1.0 + 0.5 * day / self.days
+        day_of_year = np.array([d.timetuple().tm_yday for d in dates])
+        yearly = 1.0 + 0.35 * np.cos(2 * math.pi * (day_of_year - 340) / 365.25)  # Holiday peak
+        weekday = np.array([d.weekday() for d in dates])
+        weekly = np.where(weekday >= 5, 1.3, 1.0)
+        weights = growth * yearly * weekly
+        return weights / weights.sum()
+
+    def _zipf_ranks(self, n: int, size: int) -> np.ndarray:
+        """0-based ranks in [0, n) with P(rank k) ~ 1/(k+1)^skew"""
+        weights = 1.0 / np.arange(1, n + 1) ** self.skew
+        cdf = np.cumsum(weights)
+        return np.searchsorted(cdf, self.rng.uniform(0, cdf[-1], size=size))
+
+    def _load_sales(self, conn: sqlite3.Connection, product_categories, prices: np.ndarray,
+                    signup_days: np.ndarray):
+        day_weights = self._day_weights()
+        # Popular products are spread across the catalogue, not just the lowest ids
+        product_order = self.rng.permutation(self.products)
+        # Seasonal peak month per product boosts its category around that month
+        peak_month = np.array([CATEGORIES[c][2] for c in product_categories])
+        day_months = np.array([int(d[5:7]) for d in self._dates])
+        region_names = list(REGIONS)
+        region_multiplier = np.array([REGIONS[r][1] for r in region_names])
+        # Customers signed up by each day (signup_days is sorted; ids follow the same order)
+        eligible = np.searchsorted(signup_days, np.arange(self.days), side='right')
+
+        next_id = 1
+        remaining = self.sales_rows
+        while remaining > 0:
+            n = min(self.batch_size, remaining)
+            days = self.rng.choice(self.days, size=n, p=day_weights)
+            products = product_order[self._zipf_ranks(self.products, n)]
+
+            # Off-season purchases of a seasonal product are thinned and redrawn once
+            gap = np.abs(day_months[days] - peak_month[products])
+            redraw = self.rng.uniform(size=n) < np.minimum(gap, 12 - gap) / 12
+            products[redraw] = product_order[self._zipf_ranks(self.products, int(redraw.sum()))]
+
+            # Loyal (older) customers buy more often: skew towards low ids among those signed up
+            customers = 1 + (eligible[days] * self.rng.uniform(size=n) ** 2).astype(np.int64)
+            regions = self._customer_regions[customers - 1]
+            quantity = self.rng.geometric(0.6, size=n)
+            noise = self.rng.lognormal(0.0, 0.15, size=n)
+            amounts = np.round(prices[products] * quantity * noise * region_multiplier[regions], 2)
+
+            rows = zip(range(next_id, next_id + n),
+                       [product_categories[p] for p in products.tolist()],
+                       amounts.tolist(),
+                       [self._dates[d] for d in days.tolist()],
+                       [region_names[r] for r in regions.tolist()],
+                       customers.tolist())
+            with conn:
+                conn.executemany("INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?)", rows)
+            next_id += n
+            remaining -= n
+
+
+def generate_warehouse(db_path: str = "company_data.db", sales_rows: int = 1_000_000,
+                       create_indexes: bool = True, **options) -> Dict[str, float]:
+    """Build a synthetic warehouse at db_path (see WarehouseGenerator for options)"""
+    return WarehouseGenerator(sales_rows, **options).generate(db_path, create_indexes=create_indexes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load a synthetic sales warehouse")
+    parser.add_argument("--db", default="company_data.db")
+    parser.add_argument("--sales", type=int, default=1_000_000, help="sales rows")
+    parser.add_argument("--customers", type=int, help="default: sales / 20")
+    parser.add_argument("--products", type=int, help="default: sales / 1000 (50..50,000)")
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=250_000, help="rows per transaction")
+    parser.add_argument("--no-indexes", action="store_true")
+    args = parser.parse_args()
+
+    print(f"🏭 Generating {args.sales:,} sales rows into {args.db} (seed {args.seed})...")
+    started = time.perf_counter()
+    timings = generate_warehouse(args.db, args.sales, create_indexes=not args.no_indexes,
+                                 customers=args.customers, products=args.products, days=args.days,
+                                 seed=args.seed, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Warehouse ready in {elapsed:.1f}s ({args.sales / elapsed:,.0f} sales rows/s): {timings}")
+
+
+if __name__ == "__main__":
+    main()
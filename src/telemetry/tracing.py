@@ -0,0 +1,231 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the stage-duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_METRIC_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+# Numeric span attributes that are identifiers or point-in-time values, not quantities worth summing
+_NON_COUNTER_ATTRIBUTES = frozenset(["attempt", "candidate", "winner", "estimated_cost", "cached_results"])
+
+
+class Span:
+    """One timed unit of work (a stage or retry attempt) with numeric/text attributes"""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id",
+                 "start_time", "end_time", "_start", "attributes", "status")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str,
+                 parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self._start = time.perf_counter()
+
+    @property
+    def duration_seconds(self) -> float:
+        end = self.end_time if self.end_time is not None else time.time()
+        return end - self.start_time
+
+    def set(self, key: str, value: Any) -> "Span":
+        self.attributes[key] = value
+        return self
+
+    def child(self, name: str, **attributes) -> "Span":
+        return self.tracer.span(name, parent=self, **attributes)
+
+    def end(self):
+        if self.end_time is None:
+            self.end_time = self.start_time + (time.perf_counter() - self._start)
+            self.tracer._finish(self)
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.end()
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time,
+            "duration_ms": round(self.duration_seconds * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned by a disabled tracer: every call is a no-op, nothing is allocated"""
+
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> "_NoopSpan":
+        return self
+
+    def child(self, name: str, **attributes) -> "_NoopSpan":
+        return self
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonlSpanExporter:
+    """Appends every finished span to a JSON-lines file"""
+
+    def __init__(self, path: str = "traces.jsonl"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class MetricsRegistry:
+    """
+    Aggregates finished spans into Prometheus-style metrics:
+    a duration histogram and error counter per stage, plus a counter per
+    numeric span attribute (prompt chars, rows, chart bytes, cache hits...).
+    """
+
+    def __init__(self, namespace: str = "autoinsights", buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.namespace = namespace
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._durations: Dict[str, List[float]] = {}  # stage -> [bucket counts..., sum, count]
+        self._counters: Dict[Tuple[str, str], float] = defaultdict(float)  # (metric, stage) -> value
+
+    def record(self, span: Span):
+        duration = span.duration_seconds
+        with self._lock:
+            hist = self._durations.get(span.name)
+            if hist is None:
+                hist = self._durations[span.name] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    hist[i] += 1
+            hist[-2] += duration
+            hist[-1] += 1
+
+            self._counters[("spans_total", span.name)] += 1
+            if span.status != "ok":
+                self._counters[("errors_total", span.name)] += 1
+            for key, value in span.attributes.items():
+                if isinstance(value, (bool, int, float)) and key not in _NON_COUNTER_ATTRIBUTES:
+                    self._counters[(f"{_METRIC_NAME_RE.sub('_', key)}_total", span.name)] += value
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        ns = self.namespace
+        lines = [f"# HELP {ns}_stage_duration_seconds Wall time per pipeline stage",
+                 f"# TYPE {ns}_stage_duration_seconds histogram"]
+        with self._lock:
+            for stage, hist in sorted(self._durations.items()):
+                for bound, count in zip(self.buckets, hist):
+                    lines.append(f'{ns}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{ns}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist[-1]}')
+                lines.append(f'{ns}_stage_duration_seconds_sum{{stage="{stage}"}} {hist[-2]:.6f}')
+                lines.append(f'{ns}_stage_duration_seconds_count{{stage="{stage}"}} {hist[-1]}')
+
+            by_metric = defaultdict(list)
+            for (metric, stage), value in self._counters.items():
+                by_metric[metric].append((stage, value))
+        for metric, values in sorted(by_metric.items()):
+            lines.append(f"# TYPE {ns}_{metric} counter")
+            for stage, value in sorted(values):
+                lines.append(f'{ns}_{metric}{{stage="{stage}"}} {value:.15g}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str = "metrics.prom"):
+        """Write the text format atomically (e.g. for node_exporter's textfile collector)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Expose GET /metrics from a daemon thread; returns the server (call shutdown() to stop)"""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+        return server
+
+
+class Tracer:
+    """
+    Creates spans for the agent pipeline. Disabled by default: span() then
+    returns a shared no-op span, so instrumented code costs one branch.
+    Pass the parent span explicitly (child()) to keep traces intact across
+    worker threads.
+    """
+
+    def __init__(self, enabled: bool = False, exporters: Optional[List[Any]] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.enabled = enabled
+        self.exporters = list(exporters or [])
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+
+    def span(self, name: str, parent: Optional[Span] = None, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        if isinstance(parent, Span):
+            return Span(self, name, parent.trace_id, parent.span_id, attributes)
+        return Span(self, name, os.urandom(8).hex(), None, attributes)
+
+    def _finish(self, span: Span):
+        self.metrics.record(span)
+        for exporter in self.exporters:
+            exporter.export(span)
@@ -0,0 +1,184 @@
+import warnings
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class DataSummarizer:
+    """
+    Compact, token-budgeted description of a result set for the Storyteller.
+    Numeric stats come from one vectorized pass over the numeric block;
+    categorical columns get top-k values; date columns get period-over-period
+    deltas. Sections are added in priority order until the budget is spent,
+    so prompt size stays flat however large the result is.
+    """
+
+    CHARS_PER_TOKEN = 4
+    CHARS_PER_LINE = 80  # Rough size of one per-column line, to skip columns that cannot fit
+    DATE_PARSE_SAMPLE = 20
+    MEDIAN_SAMPLE_ROWS = 100_000  # Median is estimated from an evenly strided row sample
+
+    def __init__(self, token_budget: int = 800, top_k: int = 5, sample_rows: int = 5):
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.sample_rows = sample_rows
+
+    def summarize(self, df: pd.DataFrame, chart_context: str = "",
+                  row_count: Optional[int] = None,
+                  column_stats: Optional[pd.DataFrame] = None) -> str:
+        """Build the summary; row_count/column_stats override df for streamed samples"""
+        date_cols = self._date_columns(df)
+        numeric_cols = [c for c in df.select_dtypes(include='number').columns if c not in date_cols]
+        categorical_cols = [c for c in df.columns if c not in numeric_cols and c not in date_cols]
+
+        # Builders run lazily in priority order and only for columns that can still fit
+        builders = [
+            lambda cols: self._overview(df, chart_context, row_count),
+            lambda cols: self._numeric_section(df, numeric_cols[:cols], column_stats),
+            lambda cols: self._trend_section(df, date_cols, numeric_cols[:cols]),
+            lambda cols: self._categorical_section(df, categorical_cols[:cols]),
+            lambda cols: self._sample_section(df),
+        ]
+        return self._fit_to_budget(builders)
+
+    def _overview(self, df: pd.DataFrame, chart_context: str, row_count: Optional[int]) -> List[str]:
+        total = row_count if row_count is not None else len(df)
+        lines = ["Data Overview:", f"- Total Records: {total:,}"]
+        if row_count is not None and row_count > len(df):
+            lines.append(f"- Sample Shown: {len(df):,} rows")
+        lines.append("- Columns: " + ", ".join(f"{c} ({df[c].dtype})" for c in df.columns))
+        if chart_context:
+            lines.append(f"- Chart Type: {chart_context}")
+        return lines
+
+    def _numeric_section(self, df: pd.DataFrame, numeric_cols: List[str],
+                         column_stats: Optional[pd.DataFrame]) -> List[str]:
+        if not numeric_cols:
+            return []
+        lines = ["", "Numeric Columns (count | sum | mean | std | min | median | max):"]
+
+        if column_stats is not None:
+            for col in numeric_cols:
+                if col in column_stats.index:
+                    s = column_stats.loc[col]
+                    lines.append(f"- {col}: {self._fmt(s.get('count'))} | {self._fmt(s.get('sum'))} | "
+                                 f"{self._fmt(s.get('mean'))} | {self._fmt(s.get('std'))} | "
+                                 f"{self._fmt(s.get('min'))} | n/a | {self._fmt(s.get('max'))}")
+            return lines
+
+        values = df[numeric_cols].to_numpy(dtype=np.float64)
+        if values.shape[0] == 0:
+            return lines + [f"- {col}: 0 | n/a | n/a | n/a | n/a | n/a | n/a" for col in numeric_cols]
+
+        stride = max(1, values.shape[0] // self.MEDIAN_SAMPLE_ROWS)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)  # All-NaN columns
+            counts = np.count_nonzero(~np.isnan(values), axis=0)
+            sums = np.nansum(values, axis=0)
+            means = sums / np.where(counts, counts, np.nan)
+            stds = np.nanstd(values, axis=0)
+            mins = np.nanmin(values, axis=0)
+            medians = np.nanmedian(values[::stride], axis=0)
+            maxs = np.nanmax(values, axis=0)
+
+        for i, col in enumerate(numeric_cols):
+            lines.append(f"- {col}: {counts[i]:,} | {self._fmt(sums[i])} | {self._fmt(means[i])} | "
+                         f"{self._fmt(stds[i])} | {self._fmt(mins[i])} | {self._fmt(medians[i])} | "
+                         f"{self._fmt(maxs[i])}")
+        return lines
+
+    def _trend_section(self, df: pd.DataFrame, date_cols: List[str], numeric_cols: List[str]) -> List[str]:
+        if not date_cols or not numeric_cols or len(df) < 2:
+            return []
+        lines = ["", "Trends (period-over-period):"]
+        for date_col in date_cols:
+            dates = self._to_datetime(df[date_col])
+            span_days = (dates.max() - dates.min()).days if dates.notna().any() else 0
+            freq, label = ("M", "month") if span_days > 62 else ("D", "day")
+            periods = dates.dt.to_period(freq)
+
+            grouped = df[numeric_cols].groupby(periods).sum(numeric_only=True).sort_index()
+            if len(grouped) < 2:
+                continue
+            last, prev, first = grouped.iloc[-1], grouped.iloc[-2], grouped.iloc[0]
+            for col in numeric_cols:
+                lines.append(
+                    f"- {col} by {label} of {date_col}: last {grouped.index[-1]} = {self._fmt(last[col])} "
+                    f"({self._pct(last[col], prev[col])} vs {grouped.index[-2]}); "
+                    f"{self._pct(last[col], first[col])} since {grouped.index[0]}; "
+                    f"peak {grouped[col].idxmax()} = {self._fmt(grouped[col].max())}"
+                )
+        return lines if len(lines) > 2 else []
+
+    def _categorical_section(self, df: pd.DataFrame, categorical_cols: List[str]) -> List[str]:
+        if not categorical_cols:
+            return []
+        lines = ["", f"Categorical Columns (top {self.top_k} by frequency):"]
+        total = max(len(df), 1)
+        for col in categorical_cols:
+            counts = df[col].value_counts(dropna=True)
+            top = ", ".join(f"{value} ({n / total:.0%})" for value, n in counts.head(self.top_k).items())
+            lines.append(f"- {col}: {len(counts):,} distinct; {top}")
+        return lines
+
+    def _sample_section(self, df: pd.DataFrame) -> List[str]:
+        if df.empty:
+            return ["", "No rows returned."]
+        sample = df.head(self.sample_rows).to_string(max_colwidth=30, index=False)
+        return ["", f"Sample Data (first {min(self.sample_rows, len(df))} rows):"] + sample.splitlines()
+
+    def _fit_to_budget(self, builders) -> str:
+        """Add lines in priority order until the token budget is used up"""
+        budget = self.token_budget * self.CHARS_PER_TOKEN
+        out, used = [], 0
+        for build in builders:
+            max_columns = max(1, (budget - used) // self.CHARS_PER_LINE)
+            for line in build(max_columns):
+                if used + len(line) + 1 > budget:
+                    out.append("... (summary truncated to fit the token budget)")
+                    return "\n".join(out)
+                out.append(line)
+                used += len(line) + 1
+        return "\n".join(out)
+
+    def _date_columns(self, df: pd.DataFrame) -> List[str]:
+        """Datetime columns plus text columns whose sampled values parse as dates"""
+        date_cols = []
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_datetime64_any_dtype(series):
+                date_cols.append(col)
+            elif series.dtype == object or pd.api.types.is_string_dtype(series):
+                sample = series.dropna().head(self.DATE_PARSE_SAMPLE).astype(str)
+                if sample.empty or not sample.str.contains(r"\d{4}-\d{2}").all():
+                    continue
+                if self._to_datetime(sample).notna().mean() >= 0.9:
+                    date_cols.append(col)
+        return date_cols
+
+    @staticmethod
+    def _to_datetime(series: pd.Series) -> pd.Series:
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=UserWarning)  # Mixed-format inference
+            return pd.to_datetime(series, errors='coerce')
+
+    @staticmethod
+    def _fmt(value) -> str:
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return "n/a"
+        if isinstance(value, (int, np.integer)):
+            return f"{value:,}"
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return str(value)
+        return f"{value:,.2f}" if abs(value) < 1e6 else f"{value:,.0f}"
+
+    @staticmethod
+    def _pct(current: float, previous: float) -> str:
+        if not previous:
+            return "n/a"
+        return f"{(current - previous) / abs(previous):+.1%}"
@@ -0,0 +1,328 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.memory.session_cache import SessionResult
+
+# At least one of these must appear for a question to be read as a follow-up
+CUES = frozenset("""
+now only just that those these them it this instead same also then again sort sorted order ordered
+rank ranked filter exclude excluding without except top bottom first last group grouped regroup about
+""".split())
+# Words carrying no operation of their own
+FILLER = frozenset("""
+now only just show me the that those these them it this please and then instead also same again
+result results row rows data for in of to with what about how is are keep filter limit restrict
+list give display see a an but where value values one ones table chart view can you i want ok okay so
+""".split())
+_AGGREGATES = {'total': 'sum', 'totals': 'sum', 'sum': 'sum', 'average': 'mean', 'avg': 'mean',
+               'mean': 'mean', 'count': 'count', 'number': 'count', 'max': 'max', 'maximum': 'max',
+               'min': 'min', 'minimum': 'min'}
+_SORT_WORDS = frozenset(["sort", "sorted", "order", "ordered", "rank", "ranked", "arrange"])
+_GROUP_WORDS = frozenset(["by", "per", "group", "grouped", "regroup", "break", "broken"])
+_HEAD_WORDS = {'top': 'largest', 'highest': 'largest', 'bottom': 'smallest', 'lowest': 'smallest',
+               'first': 'head', 'last': 'tail'}
+_DESCENDING = frozenset(["desc", "descending", "highest", "largest", "biggest", "most", "decreasing"])
+_ASCENDING = frozenset(["asc", "ascending", "lowest", "smallest", "least", "increasing"])
+_EXCLUDE = frozenset(["exclude", "excluding", "without", "except", "not", "remove", "drop", "minus"])
+_COMPARATORS = [
+    (("greater", "than"), '>'), (("more", "than"), '>'), (("at", "least"), '>='),
+    (("less", "than"), '<'), (("fewer", "than"), '<'), (("at", "most"), '<='),
+    (("over",), '>'), (("above",), '>'), (("under",), '<'), (("below",), '<'),
+    ((">=",), '>='), (("<=",), '<='), ((">",), '>'), (("<",), '<'), (("=",), '=='), (("equals",), '=='),
+]
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.'-][a-z0-9]+)*|[<>]=?|=|&")
+_NUMBER_RE = re.compile(r"^\d+(?:\.\d+)?$")
+_KEYWORDS = CUES | FILLER | set(_AGGREGATES) | _SORT_WORDS | _GROUP_WORDS | set(_HEAD_WORDS) | \
+    _DESCENDING | _ASCENDING | _EXCLUDE
+# String columns with more distinct values than this are not searched for filter values
+MAX_DISTINCT_VALUES = 10_000
+
+
+def _words(text: str) -> List[str]:
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text.lower())  # 1,000 -> 1000
+    return _TOKEN_RE.findall(text)
+
+
+def _stem(word: str) -> str:
+    """Plural-insensitive form used to match column names and values ("regions" -> "region")"""
+    return word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') and word.isalpha() else word
+
+
+@dataclass
+class FollowUpPlan:
+    """Operations on a previous result, applied as filters -> re-aggregation -> sort -> top-k -> columns"""
+    filters: List[Tuple[str, str, object]] = field(default_factory=list)  # (column, op, value or values)
+    group_by: List[str] = field(default_factory=list)
+    aggregate: Optional[str] = None
+    measures: List[str] = field(default_factory=list)
+    sort: List[Tuple[str, bool]] = field(default_factory=list)  # (column, ascending)
+    head: Optional[Tuple[str, int, Optional[str]]] = None        # (kind, k, column)
+    columns: List[str] = field(default_factory=list)
+
+    def steps(self) -> List[str]:
+        steps = []
+        for column, op, value in self.filters:
+            steps.append(f"{column} {op} {sorted(value) if isinstance(value, set) else repr(value)}")
+        if self.group_by:
+            steps.append(f"groupby({', '.join(self.group_by)}).{self.aggregate or 'sum'}()")
+        elif self.aggregate:
+            steps.append(f"{self.aggregate}()")
+        for column, ascending in self.sort:
+            steps.append(f"sort {column} {'asc' if ascending else 'desc'}")
+        if self.head:
+            kind, k, column = self.head
+            steps.append(f"{kind} {k}" + (f" by {column}" if column else ""))
+        if self.columns:
+            steps.append(f"columns [{', '.join(self.columns)}]")
+        return steps
+
+
+@dataclass
+class FollowUpAnswer:
+    frame: pd.DataFrame
+    base: SessionResult
+    steps: List[str]
+
+
+class FollowUpResolver:
+    """
+    Answers follow-ups ("now only the North region", "sort that by amount",
+    "top 3", "total by region") from a session's cached result frames with
+    pandas, instead of generating and running new SQL. Parsing is strict:
+    any word it cannot place means the question is not treated as a follow-up.
+    """
+
+    def __init__(self):
+        self.agent_name = "FollowUpResolver"
+
+    def resolve(self, question: str, results: List[SessionResult]) -> Optional[FollowUpAnswer]:
+        """Answer from the newest result that the question applies to with a non-empty outcome"""
+        words = _words(question)
+        if not CUES.intersection(words):
+            return None
+        for result in results:
+            plan = self.parse(words, result.frame)
+            if plan is None:
+                continue
+            frame = self.apply(plan, result.frame)
+            if len(frame):
+                return FollowUpAnswer(frame, result, result.steps + plan.steps())
+        return None
+
+    def parse(self, words: List[str], frame: pd.DataFrame) -> Optional[FollowUpPlan]:
+        """The operations the words ask for on this frame, or None"""
+        stems = [_stem(w) for w in words]
+        columns = {column: tuple(_stem(w) for w in _words(str(column).replace('_', ' ')))
+                   for column in frame.columns}
+        numeric = {c for c in frame.columns if pd.api.types.is_numeric_dtype(frame[c])}
+        values = self._value_phrases(frame, numeric)
+
+        def column_at(i: int) -> Optional[Tuple[str, int]]:
+            """Longest column name (or unique word of one) starting at words[i]"""
+            best = None
+            for column, phrase in columns.items():
+                if phrase and tuple(stems[i:i + len(phrase)]) == phrase and (best is None or len(phrase) > best[1]):
+                    best = (column, len(phrase))
+            if best is None and words[i] not in _KEYWORDS:
+                owners = [c for c, phrase in columns.items() if stems[i] in phrase]
+                if len(owners) == 1:
+                    best = (owners[0], 1)
+            return best
+
+        def value_at(i: int) -> Optional[Tuple[List[Tuple[str, object]], int]]:
+            for length in range(min(6, len(words) - i), 0, -1):
+                found = values.get(tuple(stems[i:i + length]))
+                if found:
+                    return found, length
+            return None
+
+        plan = FollowUpPlan()
+        equal: Dict[str, set] = {}
+        excluded: Dict[str, set] = {}
+        mentioned: List[str] = []
+        negate = False
+        i = 0
+        while i < len(words):
+            word = words[i]
+            value, column = value_at(i), column_at(i)
+            if value is not None and (column is None or value[1] >= column[1]):
+                candidates, length = value
+                i += length
+                owner, original = candidates[0]
+                # "North region": a column name right after the value picks (and is part of) the filter
+                following = column_at(i) if i < len(words) else None
+                if following is not None and any(c == following[0] for c, _ in candidates):
+                    owner = following[0]
+                    original = next(v for c, v in candidates if c == owner)
+                    i += following[1]
+                (excluded if negate else equal).setdefault(owner, set()).add(original)
+                continue
+            negate = negate and word in FILLER
+
+            if column is not None:
+                name, length = column
+                i += length
+                comparison = self._comparison(words, i)
+                if comparison is not None:
+                    op, number, length = comparison
+                    if name not in numeric:
+                        return None
+                    plan.filters.append((name, op, number))
+                    i += length
+                else:
+                    mentioned.append(name)
+                continue
+
+            if word in _EXCLUDE:
+                negate = True
+                i += 1
+            elif word in _HEAD_WORDS and i + 1 < len(words) and words[i + 1].isdigit():
+                k, i = int(words[i + 1]), i + 2
+                target = None
+                if i + 1 < len(words) and words[i] in ("by", "in", "on"):
+                    target = column_at(i + 1)
+                    if target is not None:
+                        i += 1 + target[1]
+                plan.head = (_HEAD_WORDS[word], k, target[0] if target else None)
+            elif word in _SORT_WORDS:
+                i += 1
+                while i < len(words) and words[i] in FILLER | {"by"}:
+                    i += 1
+                target = column_at(i) if i < len(words) else None
+                if target is None:
+                    return None
+                i += target[1]
+                ascending = target[0] not in numeric  # Numbers rank highest first unless told otherwise
+                while i < len(words) and words[i] in _ASCENDING | _DESCENDING | {"first", "order"}:
+                    if words[i] in _ASCENDING | _DESCENDING:
+                        ascending = words[i] in _ASCENDING
+                    i += 1
+                plan.sort.append((target[0], ascending))
+            elif word in _GROUP_WORDS:
+                i += 1
+                while i < len(words) and (words[i] in ("by", "down", "up") or words[i] in FILLER):
+                    i += 1
+                keys = []
+                while i < len(words):
+                    target = column_at(i)
+                    if target is None or target[0] in numeric:
+                        break
+                    keys.append(target[0])
+                    i += target[1]
+                    if i + 1 < len(words) and words[i] == "and" and column_at(i + 1):
+                        i += 1
+                if not keys:
+                    return None
+                plan.group_by.extend(k for k in keys if k not in plan.group_by)
+            elif word in _AGGREGATES:
+                plan.aggregate = _AGGREGATES[word]
+                i += 1
+            elif word in FILLER:
+                i += 1
+            else:
+                return None
+
+        for column, chosen in equal.items():
+            plan.filters.append((column, 'in', chosen))
+        for column, chosen in excluded.items():
+            plan.filters.append((column, 'not in', chosen))
+
+        if plan.group_by or plan.aggregate:
+            plan.measures = [c for c in mentioned if c in numeric and c not in plan.group_by] or \
+                [c for c in frame.columns if c in numeric and c not in plan.group_by]
+            if plan.aggregate != 'count' and not plan.measures:
+                return None
+        elif not (plan.filters or plan.sort or plan.head) and any(c in numeric for c in mentioned):
+            # A projection only when it is the whole request: in "top 3 regions" the column
+            # names the rows being ranked, and dropping the measure would leave nothing to chart
+            plan.columns = list(dict.fromkeys(mentioned))
+        if not (plan.filters or plan.group_by or plan.aggregate or plan.sort or plan.head or plan.columns):
+            return None
+        return plan
+
+    @staticmethod
+    def _comparison(words: List[str], i: int) -> Optional[Tuple[str, float, int]]:
+        """(operator, number, words used) for e.g. 'over 1000' / 'at least 5' at words[i]"""
+        if i < len(words) and words[i] in ("is", "are"):
+            found = FollowUpResolver._comparison(words, i + 1)
+            return (found[0], found[1], found[2] + 1) if found else None
+        for phrase, op in _COMPARATORS:
+            end = i + len(phrase)
+            if tuple(words[i:end]) == phrase and end < len(words) and _NUMBER_RE.match(words[end]):
+                number = float(words[end])
+                return op, int(number) if number.is_integer() else number, len(phrase) + 1
+        return None
+
+    @staticmethod
+    def _value_phrases(frame: pd.DataFrame, numeric: set) -> Dict[Tuple[str, ...], List[Tuple[str, object]]]:
+        """Word tuple of every distinct text value -> [(column, value)]"""
+        phrases: Dict[Tuple[str, ...], List[Tuple[str, object]]] = {}
+        for column in frame.columns:
+            if column in numeric:
+                continue
+            distinct = frame[column].dropna().unique()
+            if len(distinct) > MAX_DISTINCT_VALUES:
+                continue
+            for value in distinct:
+                if not isinstance(value, str):
+                    continue
+                words = _words(value)
+                phrase = tuple(_stem(w) for w in words)
+                if phrase and len(phrase) <= 6 and not all(w in _KEYWORDS for w in words):
+                    phrases.setdefault(phrase, []).append((column, value))
+        return phrases
+
+    @staticmethod
+    def apply(plan: FollowUpPlan, frame: pd.DataFrame) -> pd.DataFrame:
+        """Run the plan with vectorized pandas operations; the input frame is not modified"""
+        df = frame
+        if plan.filters:
+            mask = pd.Series(True, index=df.index)
+            for column, op, value in plan.filters:
+                series = df[column]
+                if op == 'in':
+                    mask &= series.isin(value)
+                elif op == 'not in':
+                    mask &= ~series.isin(value)
+                else:
+                    mask &= {'>': series.gt, '>=': series.ge, '<': series.lt,
+                             '<=': series.le, '==': series.eq}[op](value)
+            df = df[mask]
+
+        if plan.group_by or plan.aggregate:
+            if plan.aggregate == 'count':
+                df = (df.groupby(plan.group_by, sort=True).size().reset_index(name='count')
+                      if plan.group_by else pd.DataFrame({'count': [len(df)]}))
+            elif plan.group_by:
+                df = df.groupby(plan.group_by, sort=True)[plan.measures].agg(plan.aggregate or 'sum').reset_index()
+            else:
+                df = df[plan.measures].agg(plan.aggregate).to_frame().T
+
+        if plan.sort:
+            df = df.sort_values([c for c, _ in plan.sort], ascending=[a for _, a in plan.sort], kind='stable')
+
+        if plan.head:
+            kind, k, column = plan.head
+            if kind in ('largest', 'smallest'):
+                column = column or (plan.sort[0][0] if plan.sort else None) or next(
+                    (c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])), None)
+                if column is None:
+                    df = df.head(k)
+                else:
+                    df = df.nlargest(k, column) if kind == 'largest' else df.nsmallest(k, column)
+            else:
+                df = df.head(k) if kind == 'head' else df.tail(k)
+
+        if plan.columns:
+            keep = [c for c in df.columns if c in plan.columns]
+            # A lone numeric column is rarely useful; keep the text columns that label it
+            if all(pd.api.types.is_numeric_dtype(df[c]) for c in keep):
+                keep = [c for c in df.columns if c in plan.columns or not pd.api.types.is_numeric_dtype(df[c])]
+            # Likewise labels alone have nothing to plot; keep the measures next to them
+            elif not any(pd.api.types.is_numeric_dtype(df[c]) for c in keep):
+                keep = [c for c in df.columns if c in plan.columns or pd.api.types.is_numeric_dtype(df[c])]
+            df = df[keep]
+        return df.reset_index(drop=True)
@@ -0,0 +1,212 @@
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.tools.sql_parser import analyze_query, tokenize
+
+AGGREGATE_FUNCTIONS = frozenset(["count", "sum", "avg", "min", "max", "total", "group_concat"])
+
+_LOOP_RE = re.compile(r"^(SCAN|SEARCH) (?:TABLE |SUBQUERY )?(\S+)(?: AS (\S+))?(?: USING (.*))?$")
+
+# Clauses whose columns decide whether an index would help a full scan
+_PREDICATE_CLAUSES = frozenset(["WHERE", "ON", "GROUP"])
+_CLAUSE_KEYWORDS = frozenset(["SELECT", "FROM", "JOIN", "WHERE", "ON", "GROUP", "HAVING",
+                              "ORDER", "LIMIT", "UNION", "EXCEPT", "INTERSECT", "WINDOW"])
+
+
+@dataclass
+class PlanVerdict:
+    allowed: bool
+    sql: str
+    estimated_cost: float
+    plan: List[str]
+    reason: str = ""
+    logs: List[str] = field(default_factory=list)
+
+    def plan_text(self) -> str:
+        return "\n".join(self.plan)
+
+
+class QueryCostGate:
+    """
+    Pre-flight check between validation and execution: runs EXPLAIN QUERY PLAN,
+    estimates row visits from table sizes, auto-LIMITs or rejects runaway
+    plans and suggests indexes for columns that keep showing up in full scans.
+    The budget grows with the largest table, so a handful of full scans always
+    fits while nested-loop (cross join, correlated subquery) plans do not.
+    """
+
+    def __init__(self, sql_tool, max_cost: float = 5e7, auto_limit: int = 10_000,
+                 index_advice_threshold: int = 3, default_rows: int = 1000,
+                 scan_budget_factor: float = 4.0):
+        self.sql_tool = sql_tool
+        self.max_cost = max_cost
+        self.scan_budget_factor = scan_budget_factor
+        self.auto_limit = auto_limit
+        self.index_advice_threshold = index_advice_threshold
+        self.default_rows = default_rows  # For CTEs / subqueries with no row count
+        self.scan_counts: Counter = Counter()
+        self.index_suggestions: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self.agent_name = "QueryCostGate"
+
+    def check(self, sql: str) -> PlanVerdict:
+        """Explain the query and decide whether (and how) it may run"""
+        logs = [f"[{self.agent_name}] 🧮 Checking query plan"]
+        plan_rows = self.sql_tool.explain(sql)
+        plan = [f"{'  ' * self._depth(plan_rows, row)}{row[3]}" for row in plan_rows]
+
+        shape = analyze_query(tokenize(sql))
+        row_counts = self.sql_tool.table_row_estimates()
+        cost = self.estimate_cost(plan_rows, shape.aliases, row_counts)
+        budget = self.budget(row_counts)
+
+        for table, column in self._full_scan_predicates(sql, plan_rows, shape.aliases, row_counts):
+            suggestion = self._record_scan(table, column)
+            if suggestion:
+                logs.append(f"[{self.agent_name}] 💡 Index suggestion: {suggestion}")
+
+        if cost <= budget:
+            logs.append(f"[{self.agent_name}] ✅ Estimated cost {cost:,.0f} row visits")
+            return PlanVerdict(True, sql, cost, plan, logs=logs)
+
+        if self._can_auto_limit(sql):
+            limited = f"SELECT * FROM ({sql.strip().rstrip(';')}) LIMIT {self.auto_limit}"
+            logs.append(f"[{self.agent_name}] ✂️ Estimated cost {cost:,.0f} over budget, "
+                        f"auto-applied LIMIT {self.auto_limit}")
+            return PlanVerdict(True, limited, cost, plan,
+                               reason=f"Auto-limited to {self.auto_limit} rows", logs=logs)
+
+        reason = (f"Estimated cost {cost:,.0f} row visits exceeds the budget of {budget:,.0f}. "
+                  f"Avoid cross joins and full scans; filter on indexed columns or aggregate earlier.")
+        logs.append(f"[{self.agent_name}] ❌ Plan rejected: {reason}")
+        return PlanVerdict(False, sql, cost, plan, reason=reason, logs=logs)
+
+    def estimate_cost(self, plan_rows: List[tuple], aliases: Dict[str, Optional[str]],
+                      row_counts: Dict[str, int]) -> float:
+        """
+        Loops that share a parent in the plan are nested, so their costs multiply;
+        separate subtrees (subqueries, materialized CTEs) add up, except correlated
+        subqueries, which re-run once per row of the loops around them.
+        """
+        children = defaultdict(list)
+        for node_id, parent, _, detail in plan_rows:
+            children[parent].append((node_id, detail))
+
+        def subtree_cost(parent: int) -> float:
+            loops = [self._loop_cost(detail, aliases, row_counts) for _, detail in children[parent]]
+            loops = [loop_cost for loop_cost in loops if loop_cost is not None]
+            product = 1.0
+            for loop_cost in loops:
+                product *= max(loop_cost, 1.0)
+
+            total = product if loops else 0.0
+            for node_id, detail in children[parent]:
+                if node_id in children:
+                    sub = subtree_cost(node_id)
+                    total += sub * product if detail.startswith("CORRELATED") else sub
+            return total
+
+        return subtree_cost(0)
+
+    def budget(self, row_counts: Dict[str, int]) -> float:
+        """Row-visit budget: max_cost, raised to a few scans of the largest table"""
+        largest = max(row_counts.values(), default=0)
+        return max(self.max_cost, self.scan_budget_factor * largest)
+
+    def _loop_cost(self, detail: str, aliases: Dict[str, Optional[str]],
+                   row_counts: Dict[str, int]) -> Optional[float]:
+        """Rough row visits for one SCAN/SEARCH loop; None for non-loop plan nodes"""
+        if detail.startswith("SCAN CONSTANT ROW"):
+            return 1.0
+        match = _LOOP_RE.match(detail)
+        if not match:
+            return None
+        kind, name, _, using = match.groups()
+        table = self._resolve(name, aliases)
+        rows = float(row_counts.get(table, self.default_rows))
+
+        if kind == "SCAN":
+            return rows
+        using = using or ""
+        if "PRIMARY KEY" in using and "=?" in using and ">" not in using and "<" not in using:
+            return 1.0
+        if ">" in using or "<" in using:
+            return max(1.0, rows * 0.25)  # Range search
+        return max(1.0, rows * 0.01)  # Equality search on an index
+
+    @staticmethod
+    def _resolve(name: str, aliases: Dict[str, Optional[str]]) -> str:
+        name = name.lower()
+        return aliases.get(name) or name
+
+    @staticmethod
+    def _depth(plan_rows: List[tuple], row: tuple) -> int:
+        parents = {r[0]: r[1] for r in plan_rows}
+        depth, parent = 0, row[1]
+        while parent in parents:
+            depth += 1
+            parent = parents[parent]
+        return depth
+
+    @staticmethod
+    def _can_auto_limit(sql: str) -> bool:
+        """A LIMIT only cuts the work for plain row-returning queries"""
+        tokens = tokenize(sql)
+        for i, tok in enumerate(tokens):
+            if tok.norm in ("GROUP", "ORDER", "DISTINCT", "LIMIT", "UNION", "EXCEPT", "INTERSECT"):
+                return False
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            if tok.norm in AGGREGATE_FUNCTIONS and following is not None and following.value == '(':
+                return False
+        return True
+
+    def _full_scan_predicates(self, sql: str, plan_rows: List[tuple],
+                              aliases: Dict[str, Optional[str]],
+                              row_counts: Dict[str, int]) -> List[Tuple[str, str]]:
+        """(table, column) pairs filtered/grouped on while the table is fully scanned"""
+        scanned = set()
+        for _, _, _, detail in plan_rows:
+            match = _LOOP_RE.match(detail)
+            if match and match.group(1) == "SCAN" and "INDEX" not in (match.group(4) or ""):
+                table = self._resolve(match.group(2), aliases)
+                if table in row_counts:
+                    scanned.add(table)
+        if not scanned:
+            return []
+
+        schema = self.sql_tool.table_columns()
+        tokens = tokenize(sql)
+        clause = None
+        found = []
+        for i, tok in enumerate(tokens):
+            if tok.kind == "keyword" and tok.norm in _CLAUSE_KEYWORDS:
+                clause = tok.norm
+                continue
+            if clause not in _PREDICATE_CLAUSES or tok.kind not in ("ident", "qident"):
+                continue
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            if following is not None and following.value in ('(', '.'):
+                continue
+
+            if i >= 2 and tokens[i - 1].value == '.':
+                tables = [self._resolve(tokens[i - 2].norm, aliases)]
+            else:
+                tables = [t for t in scanned if tok.norm in schema.get(t, ())]
+            for table in tables:
+                if table in scanned and tok.norm in schema.get(table, ()):
+                    found.append((table, tok.norm))
+        return list(dict.fromkeys(found))
+
+    def _record_scan(self, table: str, column: str) -> Optional[str]:
+        """Count a full-scan predicate; return a CREATE INDEX hint once it is frequent"""
+        with self._lock:
+            self.scan_counts[(table, column)] += 1
+            if (self.scan_counts[(table, column)] >= self.index_advice_threshold
+                    and (table, column) not in self.index_suggestions):
+                suggestion = f"CREATE INDEX idx_{table}_{column} ON {table}({column})"
+                self.index_suggestions[(table, column)] = suggestion
+                return suggestion
+        return None
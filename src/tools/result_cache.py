@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+from src.tools.sql_parser import tokenize
+
+
+class QueryResultCache:
+    """Bounded LRU cache of query results, keyed on canonical SQL + data version"""
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data_version: Optional[Hashable] = None
+        self._entries: "OrderedDict[str, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def canonicalize(sql: str) -> str:
+        """
+        Re-join the SQL's tokens so whitespace, comments, keyword case and trailing
+        semicolons don't split keys; literals and identifiers are kept verbatim.
+        """
+        tokens = list(tokenize(sql))
+        while tokens and tokens[-1].value == ';':
+            tokens.pop()
+        return " ".join(tok.norm if tok.kind == "keyword" else tok.value for tok in tokens)
+
+    def get(self, sql: str, data_version: Hashable) -> Optional[pd.DataFrame]:
+        """Return a copy of the cached result, or None on a miss"""
+        key = self.canonicalize(sql)
+        with self._lock:
+            self._check_version(data_version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0].copy()
+
+    def put(self, sql: str, data_version: Hashable, df: pd.DataFrame):
+        """Cache a result if it fits within the byte budget"""
+        key = self.canonicalize(sql)
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_version(data_version)
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df.copy(), size)
+            self.current_bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self.current_bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _check_version(self, data_version: Hashable):
+        """Invalidate everything as soon as the underlying data changes"""
+        if data_version != self._data_version:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+            self.current_bytes = 0
+            self._data_version = data_version
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
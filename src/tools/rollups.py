@@ -0,0 +1,471 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.tools.sql_parser import Token, token_spans, tokenize
+
+ROLLUP_PREFIX = "rollup_"
+STATE_TABLE = "rollup_state"
+
+_QUARTER_SQL = ("strftime('%Y', sale_date) || '-Q' || "
+                "((CAST(strftime('%m', sale_date) AS INTEGER) + 2) / 3)")
+
+# Rollup dimension -> expression over the fact table that builds it
+DIMENSIONS = {
+    'product_category': "product_category",
+    'region': "region",
+    'day': "sale_date",
+    'month': "strftime('%Y-%m', sale_date)",
+    'quarter': _QUARTER_SQL,
+    'year': "strftime('%Y', sale_date)",
+}
+
+# Expressions recognised in generated SQL, each with the rollup dimensions that
+# can answer it (preferred first) and the replacement over that rollup's columns.
+# A rollup with 'day' answers any of them by renaming sale_date -> day.
+_PATTERNS = [
+    ("strftime('%Y-%m', sale_date)", {'month': "month"}),
+    ("substr(sale_date, 1, 7)", {'month': "month"}),
+    (_QUARTER_SQL, {'quarter': "quarter",
+                    'month': "substr(month, 1, 4) || '-Q' || ((CAST(substr(month, 6, 2) AS INTEGER) + 2) / 3)"}),
+    ("strftime('%Y', sale_date)", {'year': "year", 'quarter': "substr(quarter, 1, 4)",
+                                   'month': "substr(month, 1, 4)"}),
+    ("substr(sale_date, 1, 4)", {'year': "year", 'quarter': "substr(quarter, 1, 4)",
+                                 'month': "substr(month, 1, 4)"}),
+    ("sale_date", {}),
+    ("product_category", {'product_category': "product_category"}),
+    ("region", {'region': "region"}),
+]
+
+_AGGREGATES = frozenset(["sum", "total", "avg", "min", "max", "count"])
+# Anything beyond one flat SELECT over the fact table is left alone
+_UNSUPPORTED = frozenset(["WITH", "JOIN", "UNION", "EXCEPT", "INTERSECT", "OVER", "WINDOW", "DISTINCT",
+                          "FILTER"])
+_CLAUSES_AFTER_FROM = frozenset(["WHERE", "GROUP", "ORDER", "LIMIT", "HAVING"])
+
+
+@dataclass
+class RollupSpec:
+    """A summary table: measures aggregated over the fact table by these dimensions"""
+    name: str
+    dimensions: List[str]
+    measures: List[str] = field(default_factory=lambda: ['amount'])
+
+    @property
+    def table(self) -> str:
+        return f"{ROLLUP_PREFIX}{self.name}"
+
+    def columns(self) -> List[str]:
+        measures = [f"{kind}_{m}" for m in self.measures for kind in ("sum", "count", "min", "max")]
+        return self.dimensions + measures + ["count_rows"]
+
+    def definition(self) -> str:
+        return json.dumps({'dimensions': self.dimensions, 'measures': self.measures})
+
+
+# Month-level for dashboards (a few hundred rows), day-level for date-range filters
+DEFAULT_ROLLUPS = [
+    RollupSpec("category_region_month", ['product_category', 'region', 'month']),
+    RollupSpec("category_region_day", ['product_category', 'region', 'day']),
+]
+
+
+@dataclass
+class RollupRewrite:
+    sql: str
+    rollup: str
+    table: str
+    rows: int
+
+
+class RollupManager:
+    """
+    Pre-aggregated summary tables over 'sales', kept current incrementally:
+    each refresh only aggregates rows above the rollup's high-water mark on
+    'id' and merges them in with an upsert. Facts are assumed append-only;
+    call rebuild() after updating existing rows (deletes of the newest rows
+    are detected and trigger a rebuild). rewrite() sends eligible aggregate
+    SELECTs to the smallest rollup that can answer them.
+    """
+
+    def __init__(self, db_path: str, rollups: Optional[List[RollupSpec]] = None,
+                 fact_table: str = "sales", key_column: str = "id", date_column: str = "sale_date"):
+        self.db_path = db_path
+        self.rollups = list(rollups) if rollups is not None else list(DEFAULT_ROLLUPS)
+        self.fact_table = fact_table
+        self.key_column = key_column
+        self.date_column = date_column
+        self.agent_name = "RollupManager"
+        self.rewrites = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._state: Dict[str, dict] = {}
+        self._fact_columns: Dict[str, str] = {}
+        self._patterns = [(tuple(t.norm for t in tokenize(text)), options) for text, options in _PATTERNS]
+        self._patterns.sort(key=lambda item: -len(item[0]))  # Longest match first
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._ready = False
+
+    def _setup(self):
+        """Create the state table and rollup tables (rebuilding any whose definition changed)"""
+        self._fact_columns = {
+            row[1].lower(): row[1] for row in self.connection.execute(f'PRAGMA table_info("{self.fact_table}")')
+        }
+        with self.connection:
+            self.connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+                    name TEXT PRIMARY KEY,
+                    definition TEXT NOT NULL,
+                    high_water_id INTEGER NOT NULL,
+                    high_water_date TEXT,
+                    row_count INTEGER NOT NULL,
+                    refreshed_at REAL NOT NULL
+                )
+            """)
+            stored = {row[0]: row for row in self.connection.execute(
+                f"SELECT name, definition, high_water_id, high_water_date, row_count FROM {STATE_TABLE}")}
+            for spec in self.rollups:
+                row = stored.get(spec.name)
+                if row is None or row[1] != spec.definition():
+                    self._create_table(spec)
+                    row = (spec.name, spec.definition(), 0, None, 0)
+                self._state[spec.name] = {'high_water_id': row[2], 'high_water_date': row[3],
+                                          'row_count': row[4]}
+        self._ready = True
+
+    def _create_table(self, spec: RollupSpec):
+        columns = [f"{d} TEXT" for d in spec.dimensions]
+        for m in spec.measures:
+            columns += [f"sum_{m} REAL", f"count_{m} INTEGER", f"min_{m} REAL", f"max_{m} REAL"]
+        columns.append("count_rows INTEGER NOT NULL")
+        self.connection.execute(f"DROP TABLE IF EXISTS {spec.table}")
+        self.connection.execute(
+            f"CREATE TABLE {spec.table} ({', '.join(columns)}, PRIMARY KEY ({', '.join(spec.dimensions)}))"
+        )
+        self.connection.execute(f"DELETE FROM {STATE_TABLE} WHERE name = ?", (spec.name,))
+
+    def refresh(self) -> Dict[str, int]:
+        """Fold fact rows added since the last refresh into every rollup; returns rows folded in"""
+        with self._lock:
+            if not self._ready:
+                self._setup()
+            high_water = self.connection.execute(
+                f"SELECT MAX({self.key_column}) FROM {self.fact_table}").fetchone()[0] or 0
+            folded = {}
+            for spec in self.rollups:
+                if high_water < self._state[spec.name]['high_water_id']:
+                    self._rebuild(spec)  # Newest rows were deleted
+                low = self._state[spec.name]['high_water_id']
+                if high_water > low:
+                    folded[spec.name] = self._fold(spec, low, high_water)
+            return folded
+
+    def rebuild(self):
+        """Recompute every rollup from scratch (after updates to existing fact rows)"""
+        with self._lock:
+            if not self._ready:
+                self._setup()
+            for spec in self.rollups:
+                self._rebuild(spec)
+        self.refresh()
+
+    def _rebuild(self, spec: RollupSpec):
+        with self.connection:
+            self.connection.execute(f"DELETE FROM {spec.table}")
+        self._state[spec.name] = {'high_water_id': 0, 'high_water_date': None, 'row_count': 0}
+
+    def _fold(self, spec: RollupSpec, low: int, high: int) -> int:
+        """Aggregate fact rows with low < key <= high and upsert them into the rollup"""
+        dims = spec.dimensions
+        select = [f"{DIMENSIONS[d]} AS {d}" for d in dims]
+        update = ["count_rows = count_rows + excluded.count_rows"]
+        for m in spec.measures:
+            select += [f"SUM({m})", f"COUNT({m})", f"MIN({m})", f"MAX({m})"]
+            update += [
+                f"sum_{m} = COALESCE(sum_{m} + excluded.sum_{m}, sum_{m}, excluded.sum_{m})",
+                f"count_{m} = count_{m} + excluded.count_{m}",
+                f"min_{m} = MIN(COALESCE(min_{m}, excluded.min_{m}), COALESCE(excluded.min_{m}, min_{m}))",
+                f"max_{m} = MAX(COALESCE(max_{m}, excluded.max_{m}), COALESCE(excluded.max_{m}, max_{m}))",
+            ]
+        select.append("COUNT(*)")
+
+        with self.connection:
+            cursor = self.connection.execute(
+                f"INSERT INTO {spec.table} "
+                f"SELECT {', '.join(select)} FROM {self.fact_table} "
+                f"WHERE {self.key_column} > ? AND {self.key_column} <= ? "
+                f"GROUP BY {', '.join(dims)} "
+                f"ON CONFLICT ({', '.join(dims)}) DO UPDATE SET {', '.join(update)}",
+                (low, high)
+            )
+            folded = cursor.rowcount
+            max_date = self.connection.execute(
+                f"SELECT MAX({self.date_column}) FROM {self.fact_table} "
+                f"WHERE {self.key_column} > ? AND {self.key_column} <= ?", (low, high)
+            ).fetchone()[0]
+            state = self._state[spec.name]
+            state['high_water_id'] = high
+            state['high_water_date'] = max(filter(None, [state['high_water_date'], max_date]), default=None)
+            state['row_count'] = self.connection.execute(f"SELECT COUNT(*) FROM {spec.table}").fetchone()[0]
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {STATE_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
+                (spec.name, spec.definition(), high, state['high_water_date'], state['row_count'], time.time())
+            )
+        return folded
+
+    def rewrite(self, sql: str) -> Optional[RollupRewrite]:
+        """The query rewritten onto the smallest fresh rollup that answers it exactly, or None"""
+        plan = self._analyze(sql)
+        if plan is not None:
+            self.refresh()
+            edits, requirements, aliases = plan
+            with self._lock:
+                candidates = sorted(self.rollups, key=lambda s: self._state[s.name]['row_count'])
+            for spec in candidates:
+                replacements = [self._resolve(options, spec) for options in requirements]
+                if None in replacements:
+                    continue
+                # WHERE/GROUP BY prefer a table column over a result alias of the same name,
+                # so an alias may only shadow a rollup column holding the same value
+                columns = spec.columns()
+                if any(name in columns and (req is None or replacements[req] != name) for name, req in aliases):
+                    continue
+                rewritten = sql
+                for start, end, text in sorted(edits, key=lambda e: -e[0]):
+                    if isinstance(text, int):
+                        text = replacements[text]
+                    elif text is None:
+                        text = spec.table
+                    rewritten = rewritten[:start] + text + rewritten[end:]
+                with self._lock:
+                    self.rewrites += 1
+                    rows = self._state[spec.name]['row_count']
+                return RollupRewrite(rewritten, spec.name, spec.table, rows)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    @staticmethod
+    def _resolve(options: Dict[str, str], spec: RollupSpec) -> Optional[str]:
+        """Replacement text for one recognised expression on this rollup, if it has a dimension for it"""
+        for dim, expression in options.items():
+            if dim in spec.dimensions:
+                return expression
+        return None
+
+    def _analyze(self, sql: str) -> Optional[tuple]:
+        """
+        Token-level eligibility check. Returns (edits, requirements, aliases):
+        edits are (start, end, text) splices where text is a string, an index
+        into requirements (a recognised dimension expression) or None (the
+        FROM target); each requirement maps rollup dimensions to replacements;
+        aliases are (name, requirement or None) for aliased select items.
+        """
+        if not self._ready:
+            self.refresh()
+        spans = token_spans(sql)
+        while spans and spans[-1][0].value == ';':
+            spans.pop()
+        tokens = [t for t, _, _ in spans]
+        if not tokens or tokens[0].norm != "SELECT" or any(t.norm in _UNSUPPORTED for t in tokens):
+            return None
+        if sum(1 for t in tokens if t.norm == "SELECT") != 1:
+            return None
+
+        # FROM <fact> [[AS] alias], followed by a clause keyword or the end
+        froms = [i for i, t in enumerate(tokens) if t.norm == "FROM"]
+        if len(froms) != 1 or froms[0] + 1 >= len(tokens) or tokens[froms[0] + 1].norm != self.fact_table:
+            return None
+        f = froms[0]
+        names = {self.fact_table}
+        end = f + 2
+        if end < len(tokens) and tokens[end].norm == "AS":
+            end += 1
+        if end < len(tokens) and tokens[end].kind in ("ident", "qident"):
+            names.add(tokens[end].norm)
+            end += 1
+        if end < len(tokens) and tokens[end].norm not in _CLAUSES_AFTER_FROM:
+            return None
+        edits: list = [(spans[f + 1][1], spans[end - 1][2], None)]
+
+        # Drop table qualifiers (s.amount -> amount) so patterns match bare columns;
+        # body entries are (token, start, end, source start including any qualifier)
+        body = []
+        qualifier_start = None
+        for i, (tok, start, stop) in enumerate(spans):
+            if i == 0 or f < i < end:
+                continue
+            if i + 2 < len(tokens) and tokens[i + 1].value == '.' and tok.kind in ("ident", "qident"):
+                if tok.norm not in names:
+                    return None
+                edits.append((start, spans[i + 2][1], ""))
+                qualifier_start = start
+                continue
+            if tok.value == '.' and qualifier_start is not None:
+                continue
+            body.append((tok, start, stop, qualifier_start if qualifier_start is not None else start))
+            qualifier_start = None
+
+        requirements: List[Dict[str, str]] = []
+        aggregates = 0
+        edited = set()  # Body positions inside a rewritten expression
+        pattern_at: Dict[int, Tuple[int, int]] = {}  # Body position -> (requirement, length)
+        i = 0
+        while i < len(body):
+            tok, start = body[i][0], body[i][1]
+            previous = body[i - 1][0] if i > 0 else None
+            following = body[i + 1][0] if i + 1 < len(body) else None
+            if previous is not None and previous.norm == "AS":
+                i += 1  # Output alias
+                continue
+            if tok.value == '*' and (previous is None or previous.value == ','):
+                return None  # SELECT *
+
+            if tok.kind == "ident" and tok.norm in _AGGREGATES and following is not None and following.value == '(':
+                close = i + 1
+                while close < len(body) and body[close][0].value != ')':
+                    close += 1
+                if close >= len(body):
+                    return None
+                replacement = self._aggregate(tok.norm, [entry[0] for entry in body[i + 2:close]])
+                if replacement is None:
+                    return None
+                edits.append((start, body[close][2], replacement))
+                edited.update(range(i, close + 1))
+                aggregates += 1
+                i = close + 1
+                continue
+
+            matched = self._match(body, i)
+            if matched is not None:
+                length, options = matched
+                options = dict(options)
+                if any(entry[0].norm == self.date_column for entry in body[i:i + length]):
+                    options['day'] = self._on_day(sql, body[i:i + length])
+                edits.append((start, body[i + length - 1][2], len(requirements)))
+                pattern_at[i] = (len(requirements), length)
+                requirements.append(options)
+                edited.update(range(i, i + length))
+                i += length
+                continue
+
+            if tok.kind in ("ident", "qident") and tok.norm in self._fact_columns \
+                    and not (following is not None and following.value == '('):
+                return None  # A fact column no rollup keeps (e.g. a filter on amount)
+            i += 1
+
+        if not aggregates:
+            return None
+
+        # Result aliases, with the requirement when the aliased expression is one dimension
+        aliases = []
+        items = self._select_items(body, spans[f][1])
+        for item in items:
+            alias_at = self._alias_position(body, item)
+            if alias_at is None:
+                continue
+            expression = item[:item.index(alias_at) - (body[alias_at - 1][0].norm == "AS")]
+            req, length = pattern_at.get(expression[0], (None, 0)) if expression else (None, 0)
+            aliases.append((body[alias_at][0].norm, req if length == len(expression) else None))
+
+        edits.extend(self._select_aliases(sql, body, items, edited))
+        # Qualifier deletions inside a replaced expression are already covered by it
+        edits = [e for e in edits if e[2] != "" or not any(
+            o is not e and o[0] <= e[0] and e[1] <= o[1] for o in edits)]
+        return edits, requirements, aliases
+
+    @staticmethod
+    def _select_items(body, from_start: int) -> List[List[int]]:
+        """Body positions of each select-list item"""
+        items, current, depth = [], [], 0
+        for pos, (tok, start, _, _) in enumerate(body):
+            if start >= from_start:
+                break
+            if tok.value == '(':
+                depth += 1
+            elif tok.value == ')':
+                depth -= 1
+            if tok.value == ',' and depth == 0:
+                items.append(current)
+                current = []
+            else:
+                current.append(pos)
+        items.append(current)
+        return items
+
+    @staticmethod
+    def _alias_position(body, item: List[int]) -> Optional[int]:
+        """Position of the item's 'AS name' / implicit alias, if it has one"""
+        if len(item) < 2:
+            return None
+        last, before = body[item[-1]][0], body[item[-2]][0]
+        if last.kind in ("ident", "qident") and (
+                before.norm == "AS" or before.value == ')' or before.kind in ("ident", "qident", "string", "number")):
+            return item[-1]
+        return None
+
+    def _match(self, body, i: int) -> Optional[Tuple[int, Dict[str, str]]]:
+        """Longest recognised dimension expression starting at body[i]"""
+        for pattern, options in self._patterns:
+            if tuple(entry[0].norm for entry in body[i:i + len(pattern)]) == pattern:
+                return len(pattern), options
+        return None
+
+    def _on_day(self, sql: str, matched) -> str:
+        """Source text of a matched expression with the date column renamed to the day dimension"""
+        start = matched[0][1]
+        text, cursor = "", start
+        for tok, _, tok_end, source_start in matched:
+            if tok.norm == self.date_column:
+                text += sql[cursor:source_start] + "day"
+                cursor = tok_end
+        return text + sql[cursor:matched[-1][2]]
+
+    def _aggregate(self, function: str, args: List[Token]) -> Optional[str]:
+        """Aggregate over fact rows -> equivalent aggregate over rollup rows"""
+        if function == "count" and len(args) == 1 and (
+                args[0].value == '*' or args[0].kind == "number" or args[0].norm == self.key_column):
+            return "COALESCE(SUM(count_rows), 0)"
+        if len(args) != 1 or args[0].kind not in ("ident", "qident"):
+            return None
+        measure = args[0].norm
+        if not any(measure in spec.measures for spec in self.rollups):
+            return None
+        return {
+            'sum': f"SUM(sum_{measure})",
+            'total': f"TOTAL(sum_{measure})",
+            'avg': f"(TOTAL(sum_{measure}) / SUM(count_{measure}))",
+            'min': f"MIN(min_{measure})",
+            'max': f"MAX(max_{measure})",
+            'count': f"COALESCE(SUM(count_{measure}), 0)",
+        }[function]
+
+    def _select_aliases(self, sql: str, body, items: List[List[int]], edited) -> List[tuple]:
+        """
+        Keep result column names: a rewritten select item without an alias
+        gets 'AS' the name SQLite would have given the original expression.
+        """
+        edits = []
+        for item in items:
+            if not item or not edited.intersection(item) or self._alias_position(body, item) is not None:
+                continue
+            last = body[item[-1]][0]
+            if len(item) == 1 and last.kind in ("ident", "qident"):
+                name = self._fact_columns.get(last.norm, last.norm)  # Column refs keep the column name
+            else:
+                name = sql[body[item[0]][3]:body[item[-1]][2]]
+            end = body[item[-1]][2]
+            edits.append((end, end, ' AS "' + name.replace('"', '""') + '"'))
+        return edits
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'rewrites': self.rewrites,
+                'misses': self.misses,
+                'rollups': {name: dict(state) for name, state in self._state.items()},
+            }
@@ -0,0 +1,493 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import pandas as pd
+
+from src.memory.shard_store import ShardedConnectionPool
+from src.tools.result_cache import QueryResultCache
+from src.tools.sql_parser import Token, token_spans
+from src.tools.sql_tool import QueryCancelledError, QueryTimeoutError, SQLExecutorTool
+from src.tools.streaming import StreamingResult
+
+_AGGREGATES = frozenset(["sum", "total", "count", "min", "max", "avg"])
+# Anything beyond one flat, optionally grouped SELECT over the fact table runs on the view
+_UNSUPPORTED = frozenset(["WITH", "JOIN", "UNION", "EXCEPT", "INTERSECT", "OVER", "WINDOW", "DISTINCT",
+                          "FILTER", "HAVING", "COLLATE", "NULLS"])
+_CLAUSES = ("FROM", "WHERE", "GROUP", "ORDER", "LIMIT")
+# Aggregate -> partial aggregates computed on each shard, as (function, merge)
+_PARTIALS = {
+    'sum': [("SUM", 'sum')],
+    'total': [("TOTAL", 'total')],
+    'count': [("COUNT", 'count')],
+    'min': [("MIN", 'min')],
+    'max': [("MAX", 'max')],
+    'avg': [("SUM", 'sum'), ("COUNT", 'count')],
+}
+# Seconds between checks for cancellation / the time budget while shards run
+_POLL_SECONDS = 0.05
+
+
+@dataclass
+class ShardPlan:
+    """How to run one aggregate query as per-shard partials and merge them back"""
+    partial_sql: str
+    keys: List[str]                                  # Partial columns holding GROUP BY keys
+    merges: List[Tuple[str, str]]                    # (partial column, merge) per aggregate partial
+    outputs: List[Tuple[str, str, Tuple[str, ...]]]  # (result name, 'column' or 'avg', partial columns)
+    order: List[Tuple[int, bool]]                    # (output position, ascending)
+    limit: Optional[int] = None
+    offset: int = 0
+
+
+def _depth_split(indices: List[int], tokens: List[Token]) -> List[List[int]]:
+    """Split token positions at top-level commas"""
+    parts, current, depth = [], [], 0
+    for i in indices:
+        value = tokens[i].value
+        depth += (value == '(') - (value == ')')
+        if value == ',' and depth == 0:
+            parts.append(current)
+            current = []
+        else:
+            current.append(i)
+    parts.append(current)
+    return parts
+
+
+def _name(tok: Token) -> str:
+    if tok.kind == "qident":
+        return tok.value[1:-1] if tok.value[0] == '[' else tok.value[1:-1].replace(tok.value[0] * 2, tok.value[0])
+    return tok.value
+
+
+def decompose(sql: str, fact_table: str = "sales",
+              columns: Optional[Dict[str, str]] = None) -> Optional[ShardPlan]:
+    """
+    Plan for a SELECT of grouping keys and SUM/TOTAL/COUNT/MIN/MAX/AVG over
+    the fact table alone (WHERE, GROUP BY, ORDER BY on result columns and
+    LIMIT allowed), or None when the query does not decompose that way.
+    columns maps the fact table's lower-cased column names to declared ones.
+    """
+    columns = columns or {}
+    spans = token_spans(sql)
+    while spans and spans[-1][0].value == ';':
+        spans.pop()
+    tokens = [t for t, _, _ in spans]
+    if not tokens or tokens[0].norm != "SELECT" or any(t.norm in _UNSUPPORTED for t in tokens):
+        return None
+    if sum(1 for t in tokens if t.norm == "SELECT") != 1:
+        return None
+
+    def text(indices: List[int]) -> str:
+        return sql[spans[indices[0]][1]:spans[indices[-1]][2]]
+
+    def norm(indices: List[int]) -> Tuple[str, ...]:
+        return tuple(tokens[i].norm for i in indices)
+
+    def is_aggregate_call(i: int) -> bool:
+        return tokens[i].kind == "ident" and tokens[i].norm in _AGGREGATES \
+            and i + 1 < len(tokens) and tokens[i + 1].value == '('
+
+    def closing(open_at: int) -> int:
+        depth = 0
+        for i in range(open_at, len(tokens)):
+            depth += (tokens[i].value == '(') - (tokens[i].value == ')')
+            if depth == 0:
+                return i
+        return -1
+
+    # Top-level clause keywords, each at most once and in order
+    clauses: Dict[str, int] = {}
+    depth = 0
+    for i, tok in enumerate(tokens):
+        depth += (tok.value == '(') - (tok.value == ')')
+        if depth == 0 and tok.norm in _CLAUSES:
+            if tok.norm in clauses or (tok.norm in ("GROUP", "ORDER") and (
+                    i + 1 >= len(tokens) or tokens[i + 1].norm != "BY")):
+                return None
+            clauses[tok.norm] = i
+    positions = [clauses[c] for c in _CLAUSES if c in clauses]
+    if "FROM" not in clauses or positions != sorted(positions):
+        return None
+
+    def clause_end(start: int) -> int:
+        return min([p for p in positions if p > start], default=len(tokens))
+
+    # FROM <fact> [[AS] alias]
+    f = clauses["FROM"]
+    source = list(range(f + 1, clause_end(f)))
+    if not source or tokens[source[0]].norm != fact_table:
+        return None
+    rest = [tokens[i] for i in source[1:]]
+    if rest and rest[0].norm == "AS":
+        rest = rest[1:]
+    if len(rest) > 1 or (rest and rest[0].kind not in ("ident", "qident")):
+        return None
+
+    # Select items: (expression positions, result name, aggregate function or None)
+    items = []
+    for item in _depth_split(list(range(1, f)), tokens):
+        if not item or tokens[item[-1]].value == '*' and not is_aggregate_call(item[0]):
+            return None
+        expression, name = item, None
+        last = tokens[item[-1]]
+        before = tokens[item[-2]] if len(item) > 1 else None
+        if before is not None and last.kind in ("ident", "qident") and (
+                before.norm == "AS" or before.value == ')' or before.kind in ("ident", "qident", "string", "number")):
+            name = _name(last)
+            expression = item[:-2] if before.norm == "AS" else item[:-1]
+        if not expression:
+            return None
+
+        function = None
+        if is_aggregate_call(expression[0]) and closing(expression[1]) == expression[-1]:
+            function = tokens[expression[0]].norm
+            inner = expression[2:-1]
+            if not inner or any(is_aggregate_call(i) for i in inner):
+                return None
+        elif any(is_aggregate_call(i) for i in expression):
+            return None  # Aggregates inside a larger expression (e.g. ROUND(SUM(x), 2))
+        if name is None:
+            bare = [tokens[i] for i in expression]
+            if bare[-1].kind in ("ident", "qident") and (len(bare) == 1 or (len(bare) == 3 and bare[1].value == '.')):
+                name = columns.get(bare[-1].norm, _name(bare[-1]))  # Column refs keep the column name
+            else:
+                name = text(expression)
+        items.append((expression, name, function))
+
+    # GROUP BY terms: positions and (non-column) result aliases refer to select items
+    keys: List[Tuple[Tuple[str, ...], str]] = []
+    if "GROUP" in clauses:
+        g = clauses["GROUP"]
+        for term in _depth_split(list(range(g + 2, clause_end(g))), tokens):
+            if not term:
+                return None
+            head = tokens[term[0]]
+            if len(term) == 1 and head.kind == "number":
+                position = int(head.value) - 1 if head.value.isdigit() else -1
+                if not 0 <= position < len(items) or items[position][2] is not None:
+                    return None
+                term = items[position][0]
+            elif len(term) == 1 and head.kind in ("ident", "qident") and head.norm not in columns:
+                aliased = [item for item in items if item[1].lower() == head.norm]
+                if aliased:
+                    if aliased[0][2] is not None:
+                        return None
+                    term = aliased[0][0]
+            if any(is_aggregate_call(i) for i in term):
+                return None
+            if norm(term) not in [k for k, _ in keys]:
+                keys.append((norm(term), text(term)))
+
+    select = [f"{expression} AS k{n}" for n, (_, expression) in enumerate(keys)]
+    key_columns = [f"k{n}" for n in range(len(keys))]
+    merges: List[Tuple[str, str]] = []
+    partial_columns: Dict[Tuple[str, Tuple[str, ...]], str] = {}
+    outputs = []
+    for expression, name, function in items:
+        if function is None:
+            key_norms = [k for k, _ in keys]
+            if norm(expression) not in key_norms:
+                return None  # Bare column outside GROUP BY: its value is not well defined per group
+            outputs.append((name, 'column', (key_columns[key_norms.index(norm(expression))],)))
+            continue
+        inner = expression[2:-1]
+        arguments = "*" if [tokens[i].value for i in inner] == ['*'] else text(inner)
+        sources = []
+        for partial, merge in _PARTIALS[function]:
+            signature = (partial, norm(inner))
+            if signature not in partial_columns:
+                partial_columns[signature] = f"p{len(merges)}"
+                merges.append((partial_columns[signature], merge))
+                select.append(f"{partial}({arguments}) AS {partial_columns[signature]}")
+            sources.append(partial_columns[signature])
+        outputs.append((name, 'avg' if function == 'avg' else 'column', tuple(sources)))
+    if not merges and not keys:
+        return None
+
+    body_end = min([clauses[c] for c in ("GROUP", "ORDER", "LIMIT") if c in clauses], default=len(tokens))
+    partial_sql = f"SELECT {', '.join(select)} {text(list(range(f, body_end)))}"
+    if keys:
+        partial_sql += f" GROUP BY {', '.join(str(n + 1) for n in range(len(keys)))}"
+
+    # ORDER BY result columns: a position, a result name, or a select item's expression
+    order = []
+    if "ORDER" in clauses:
+        o = clauses["ORDER"]
+        for term in _depth_split(list(range(o + 2, clause_end(o))), tokens):
+            ascending = True
+            if term and tokens[term[-1]].norm in ("ASC", "DESC"):
+                ascending = tokens[term[-1]].norm == "ASC"
+                term = term[:-1]
+            if not term:
+                return None
+            head = tokens[term[0]]
+            names = [name.lower() for _, name, _ in items]
+            expressions = [norm(expression) for expression, _, _ in items]
+            if len(term) == 1 and head.kind == "number" and head.value.isdigit() \
+                    and 1 <= int(head.value) <= len(items):
+                position = int(head.value) - 1
+            elif len(term) == 1 and head.kind in ("ident", "qident") and head.norm in names:
+                position = names.index(head.norm)
+            elif norm(term) in expressions:
+                position = expressions.index(norm(term))
+            else:
+                return None
+            order.append((position, ascending))
+
+    limit, offset = None, 0
+    if "LIMIT" in clauses:
+        values = [t for t in tokens[clauses["LIMIT"] + 1:]]
+        if len(values) == 1 and values[0].value.isdigit():
+            limit = int(values[0].value)
+        elif len(values) == 3 and values[1].norm == "OFFSET" and values[0].value.isdigit() \
+                and values[2].value.isdigit():
+            limit, offset = int(values[0].value), int(values[2].value)
+        else:
+            return None
+
+    return ShardPlan(partial_sql, key_columns, merges, outputs, order, limit, offset)
+
+
+def merge_partials(frames: List[pd.DataFrame], plan: ShardPlan) -> pd.DataFrame:
+    """Combine per-shard partials into the query's result (vectorized groupby reductions)"""
+    # Empty shards carry no rows, only all-NULL dtypes that would skew the concat
+    partials = pd.concat([f for f in frames if len(f)] or frames[:1], ignore_index=True)
+    by_merge: Dict[str, List[str]] = {}
+    for column, merge in plan.merges:
+        by_merge.setdefault(merge, []).append(column)
+
+    if plan.keys:
+        grouped = partials.groupby(plan.keys, dropna=False, sort=False)
+        groups = grouped.size()
+        parts = []
+        for merge, cols in by_merge.items():
+            if merge == 'sum':
+                parts.append(grouped[cols].sum(min_count=1))  # SUM over no values is NULL
+            elif merge in ('count', 'total'):
+                parts.append(grouped[cols].sum())
+            else:
+                # MIN/MAX skip NULLs; object columns cannot compare None with values
+                for column in cols:
+                    present = partials[partials[column].notna()]
+                    reduced = getattr(present.groupby(plan.keys, dropna=False, sort=False)[column], merge)()
+                    parts.append(reduced.reindex(groups.index).to_frame())
+        merged = pd.concat([groups.rename('_rows')] + parts, axis=1).reset_index()
+        # SQLite emits groups in key order with NULLs first when there is no ORDER BY
+        merged = merged.sort_values(plan.keys, kind='stable', na_position='first', ignore_index=True)
+    else:
+        row = {}
+        for merge, cols in by_merge.items():
+            for column in cols:
+                values = partials[column]
+                if merge == 'sum':
+                    row[column] = values.sum(min_count=1)
+                elif merge in ('count', 'total'):
+                    row[column] = values.sum()
+                else:
+                    row[column] = getattr(values.dropna(), merge)()
+        merged = pd.DataFrame([row])
+
+    series = []
+    for _, kind, sources in plan.outputs:
+        if kind == 'avg':
+            counts = merged[sources[1]]
+            series.append(merged[sources[0]].astype(float) / counts.where(counts > 0))
+        else:
+            series.append(merged[sources[0]])
+    result = pd.concat(series, axis=1, ignore_index=True)
+
+    # One stable sort per key, last key first; SQLite sorts NULLs as the smallest value
+    for position, ascending in reversed(plan.order):
+        result = result.sort_values(position, ascending=ascending, kind='stable',
+                                    na_position='first' if ascending else 'last')
+    if plan.limit is not None or plan.offset:
+        stop = plan.offset + plan.limit if plan.limit is not None else None
+        result = result.iloc[plan.offset:stop]
+    result = result.reset_index(drop=True)
+    result.columns = [name for name, _, _ in plan.outputs]
+    # SQLite NULLs in text columns are None; pandas >= 3 'str' columns would hold NaN
+    for position in range(result.shape[1]):
+        values = result.iloc[:, position]
+        if not pd.api.types.is_numeric_dtype(values):
+            result.isetitem(position, values.astype(object).where(values.notna(), None))
+    return result
+
+
+# Per worker process: one read-only connection per shard file, reused across queries
+_WORKER_CONNECTIONS: Dict[str, sqlite3.Connection] = {}
+
+
+def _run_partial(path: str, sql: str, timeout_seconds: Optional[float],
+                 max_vm_steps: Optional[int]) -> pd.DataFrame:
+    """Run one partial query on one shard (in a worker process), within the budgets"""
+    conn = _WORKER_CONNECTIONS.get(path)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+        conn.execute(f"PRAGMA mmap_size={256 * 1024 * 1024}")
+        conn.execute("PRAGMA cache_size=-64000")
+        _WORKER_CONNECTIONS[path] = conn
+
+    deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+    state = {'steps': 0, 'reason': None}
+
+    def on_progress() -> int:
+        state['steps'] += SQLExecutorTool.PROGRESS_INTERVAL
+        if deadline is not None and time.monotonic() > deadline:
+            state['reason'] = f"exceeded {timeout_seconds}s time budget"
+        elif max_vm_steps is not None and state['steps'] > max_vm_steps:
+            state['reason'] = f"exceeded {max_vm_steps:,} VM-step budget on {os.path.basename(path)}"
+        return 1 if state['reason'] else 0
+
+    conn.set_progress_handler(on_progress, SQLExecutorTool.PROGRESS_INTERVAL)
+    try:
+        return pd.read_sql_query(sql, conn)
+    except Exception as e:
+        if state['reason']:
+            raise QueryTimeoutError(f"Query interrupted: {state['reason']}") from None
+        raise Exception(f"{os.path.basename(path)}: {e}") from None
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+class ShardedSQLExecutorTool(SQLExecutorTool):
+    """
+    SQLExecutorTool over a shard directory (see src.memory.shard_store).
+    Decomposable aggregates run on every shard at once in a process pool and
+    the partials are merged with pandas; everything else, plus EXPLAIN and
+    table stats, goes through the pool's UNION ALL view. A cancelled fan-out
+    returns at once; shard queries already running stop at their own budget.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, pool: ShardedConnectionPool,
+                 workers: Optional[int] = None,
+                 result_cache: Optional[QueryResultCache] = None,
+                 timeout_seconds: Optional[float] = 30.0,
+                 max_vm_steps: Optional[int] = None,
+                 max_rows: Optional[int] = 1_000_000):
+        super().__init__(connection, result_cache=result_cache, pool=pool,
+                         timeout_seconds=timeout_seconds, max_vm_steps=max_vm_steps, max_rows=max_rows)
+        self.layout = pool.layout
+        self.workers = workers or max(1, min(len(self.layout.shards), os.cpu_count() or 1))
+        self.agent_name = "ShardedSQLExecutor"
+        self.fanouts = 0
+        self.fallbacks = 0
+        self._fact_columns = {column.lower(): column for column in self.layout.columns}
+        self._shard_rows: Dict[str, int] = {}
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._processes_lock = threading.Lock()
+
+    def execute(self, sql: str, cancel_event: Optional[threading.Event] = None) -> pd.DataFrame:
+        """Fan decomposable aggregates out over the shards; run anything else on the view"""
+        self._check_safety(sql)
+        plan = decompose(sql, self.layout.fact_table, self._fact_columns)
+        with self._processes_lock:
+            if plan is None:
+                self.fallbacks += 1
+            else:
+                self.fanouts += 1
+        if plan is None:
+            return super().execute(sql, cancel_event)
+
+        try:
+            data_version = self.pool.data_version()
+            df = self.result_cache.get(sql, data_version)
+            if df is not None:
+                df.attrs['result_cache_hit'] = True
+                return df
+
+            df = self._fan_out(plan, cancel_event)
+            if self.max_rows is not None and len(df) > self.max_rows:
+                df = df.iloc[:self.max_rows]
+                df.attrs['truncated'] = True
+            df.attrs['shards'] = len(self.layout.shards)
+            self.result_cache.put(sql, data_version, df)
+            return df
+        except (QueryTimeoutError, QueryCancelledError):
+            raise
+        except Exception as e:
+            raise Exception(f"SQL execution failed: {str(e)}")
+
+    def execute_streaming(self, sql: str, chunk_size: int = 50_000, sample_rows: int = 1000,
+                          spill_threshold_rows: int = 200_000,
+                          spill_dir: Optional[str] = None,
+                          cancel_event: Optional[threading.Event] = None) -> StreamingResult:
+        """Merged aggregates are already small; only view queries are streamed"""
+        if decompose(sql, self.layout.fact_table, self._fact_columns) is not None:
+            return StreamingResult.from_dataframe(self.execute(sql, cancel_event), sample_rows)
+        return super().execute_streaming(sql, chunk_size, sample_rows, spill_threshold_rows,
+                                         spill_dir, cancel_event)
+
+    def _fan_out(self, plan: ShardPlan, cancel_event: Optional[threading.Event]) -> pd.DataFrame:
+        deadline = time.monotonic() + self.timeout_seconds if self.timeout_seconds else None
+        processes = self._process_pool()
+        futures = [processes.submit(_run_partial, path, plan.partial_sql, self.timeout_seconds,
+                                    self.max_vm_steps)
+                   for path in self.layout.shard_paths]
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=_POLL_SECONDS, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    future.result()  # Re-raise the first shard failure
+                if cancel_event is not None and cancel_event.is_set():
+                    raise QueryCancelledError("Query was cancelled")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise QueryTimeoutError(f"Query interrupted: exceeded {self.timeout_seconds}s time budget")
+        finally:
+            for future in pending:
+                future.cancel()
+        return merge_partials([future.result() for future in futures], plan)
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        with self._processes_lock:
+            if self._processes is None:
+                # spawn, not fork: by now the process runs threads (pools, schedulers)
+                self._processes = ProcessPoolExecutor(max_workers=self.workers,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+            return self._processes
+
+    def prewarm(self):
+        """Start the worker processes and open shard connections before the first query"""
+        processes = self._process_pool()
+        paths = self.layout.shard_paths * max(1, -(-self.workers // len(self.layout.shards)))
+        for future in [processes.submit(_run_partial, path, "SELECT 1", None, None) for path in paths]:
+            future.result()
+
+    def shutdown(self):
+        with self._processes_lock:
+            if self._processes is not None:
+                self._processes.shutdown(wait=False, cancel_futures=True)
+                self._processes = None
+
+    def table_row_estimates(self) -> Dict[str, int]:
+        """Row estimates, plus one per shard (EXPLAIN names each UNION ALL arm's table as shard_N.<fact>)"""
+        estimates = dict(super().table_row_estimates())
+        estimates.update(self._shard_rows)
+        return estimates
+
+    def _estimate_rows(self, conn: sqlite3.Connection, table: str) -> int:
+        if table != self.layout.fact_table:
+            return super()._estimate_rows(conn, table)
+        total = 0
+        for number, shard in enumerate(self.layout.shards):
+            schema = ShardedConnectionPool.schema_name(number)
+            stat = None
+            if conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+                stat = conn.execute(f"SELECT stat FROM {schema}.sqlite_stat1 WHERE tbl = ?", (table,)).fetchone()
+            rows = int(stat[0].split()[0]) if stat else int(shard['rows'])
+            self._shard_rows[f"{schema}.{table}"] = rows
+            total += rows
+        return total
+
+    def stats(self) -> Dict[str, object]:
+        with self._processes_lock:
+            return {'shards': len(self.layout.shards), 'workers': self.workers,
+                    'fanouts': self.fanouts, 'fallbacks': self.fallbacks}
@@ -0,0 +1,313 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Token = namedtuple("Token", ["kind", "value", "norm"])
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<qident>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<param>[?:@$]\w*)
+  | (?P<ident>[A-Za-z_][\w$]*)
+  | (?P<op>\|\||<<|>>|<=|>=|==|!=|<>|->>|->|[-+*/%<>=~&|])
+  | (?P<punct>[(),;.])
+  | (?P<error>.)
+""", re.S | re.X)
+
+# SQLite keywords (https://sqlite.org/lang_keywords.html) plus boolean literals
+KEYWORDS = frozenset("""
+ABORT ACTION ADD AFTER ALL ALTER ALWAYS ANALYZE AND AS ASC ATTACH AUTOINCREMENT BEFORE
+BEGIN BETWEEN BY CASCADE CASE CAST CHECK COLLATE COLUMN COMMIT CONFLICT CONSTRAINT CREATE
+CROSS CURRENT CURRENT_DATE CURRENT_TIME CURRENT_TIMESTAMP DATABASE DEFAULT DEFERRABLE
+DEFERRED DELETE DESC DETACH DISTINCT DO DROP EACH ELSE END ESCAPE EXCEPT EXCLUDE EXCLUSIVE
+EXISTS EXPLAIN FAIL FILTER FIRST FOLLOWING FOR FOREIGN FROM FULL GENERATED GLOB GROUP
+GROUPS HAVING IF IGNORE IMMEDIATE IN INDEX INDEXED INITIALLY INNER INSERT INSTEAD INTERSECT
+INTO IS ISNULL JOIN KEY LAST LEFT LIKE LIMIT MATCH MATERIALIZED NATURAL NO NOT NOTHING
+NOTNULL NULL NULLS OF OFFSET ON OR ORDER OTHERS OUTER OVER PARTITION PLAN PRAGMA PRECEDING
+PRIMARY QUERY RAISE RANGE RECURSIVE REFERENCES REGEXP REINDEX RELEASE RENAME REPLACE
+RESTRICT RETURNING RIGHT ROLLBACK ROW ROWS SAVEPOINT SELECT SET TABLE TEMP TEMPORARY THEN
+TIES TO TRANSACTION TRIGGER UNBOUNDED UNION UNIQUE UPDATE USING VACUUM VALUES VIEW VIRTUAL
+WHEN WHERE WINDOW WITH WITHOUT TRUE FALSE
+""".split())
+
+# Keywords that make a statement write, change schema or touch other files
+WRITE_KEYWORDS = frozenset("""
+INSERT UPDATE DELETE DROP ALTER CREATE REPLACE ATTACH DETACH PRAGMA VACUUM REINDEX ANALYZE
+BEGIN COMMIT ROLLBACK SAVEPOINT RELEASE
+""".split())
+
+# Functions that read or write the filesystem
+BLOCKED_FUNCTIONS = frozenset(["LOAD_EXTENSION", "READFILE", "WRITEFILE", "EDIT", "FTS3_TOKENIZER"])
+
+IMPLICIT_COLUMNS = frozenset(["rowid", "oid", "_rowid_"])
+
+_JOIN_WORDS = frozenset(["JOIN", "FROM"])
+_ALIAS_END = frozenset([",", ")", ";", "FROM", "WHERE", "GROUP", "ORDER", "HAVING", "LIMIT",
+                        "UNION", "EXCEPT", "INTERSECT", "WINDOW"])
+# Names after these keywords are collations / window names, not columns
+_NON_COLUMN_AFTER = frozenset(["COLLATE", "OVER", "WINDOW"])
+
+
+def _unquote(value: str) -> str:
+    if value[0] == '[':
+        return value[1:-1]
+    quote = value[0]
+    return value[1:-1].replace(quote * 2, quote)
+
+
+@lru_cache(maxsize=1024)
+def tokenize(sql: str) -> Tuple[Token, ...]:
+    """Split SQL into significant tokens (whitespace and comments dropped)"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(sql):
+        kind, value = match.lastgroup, match.group()
+        if kind in ("ws", "comment"):
+            continue
+        if kind == "ident":
+            upper = value.upper()
+            if upper in KEYWORDS:
+                kind, norm = "keyword", upper
+            else:
+                norm = value.lower()
+        elif kind == "qident":
+            norm = _unquote(value).lower()
+        else:
+            norm = value
+        tokens.append(Token(kind, value, norm))
+    return tuple(tokens)
+
+
+def token_spans(sql: str) -> List[Tuple[Token, int, int]]:
+    """Like tokenize(), with each token's (start, end) offsets into sql"""
+    matches = [m for m in _TOKEN_RE.finditer(sql) if m.lastgroup not in ("ws", "comment")]
+    return [(tok, m.start(), m.end()) for tok, m in zip(tokenize(sql), matches)]
+
+
+class QueryShape:
+    """What a SELECT touches: tables (with aliases), CTEs, output aliases and column refs"""
+
+    def __init__(self):
+        self.tables: List[str] = []
+        self.aliases: Dict[str, Optional[str]] = {}  # alias -> real table (None for subqueries)
+        self.ctes: Set[str] = set()
+        self.output_aliases: Set[str] = set()
+        self.columns: List[Tuple[Optional[str], str]] = []  # (qualifier, column)
+        self.quoted: Set[str] = set()  # Bare names written as "double-quoted" identifiers
+
+
+def _is_name(tok: Token) -> bool:
+    return tok.kind in ("ident", "qident")
+
+
+def analyze_query(tokens: Tuple[Token, ...]) -> QueryShape:
+    """Single pass over the tokens of one statement, classifying every identifier"""
+    shape = QueryShape()
+    n = len(tokens)
+    consumed: Set[int] = set()  # Indices already classified (tables, aliases, CTE names)
+
+    def at(j: int) -> Optional[Token]:
+        return tokens[j] if 0 <= j < n else None
+
+    def skip_parens(j: int) -> int:
+        """Index just past the parenthesised group starting at j"""
+        depth = 0
+        while j < n:
+            if tokens[j].value == '(':
+                depth += 1
+            elif tokens[j].value == ')':
+                depth -= 1
+                if depth == 0:
+                    return j + 1
+            j += 1
+        return j
+
+    def read_alias(j: int, target: Optional[str]) -> int:
+        """Consume an optional 'AS alias' / 'alias' after a table reference"""
+        tok = at(j)
+        if tok is not None and tok.norm == "AS":
+            j += 1
+            tok = at(j)
+        if tok is not None and _is_name(tok):
+            shape.aliases[tok.norm] = target
+            consumed.add(j)
+            j += 1
+        return j
+
+    i = 0
+    while i < n:
+        tok = tokens[i]
+
+        # CTE definitions: name [(cols)] AS ( ... )
+        if _is_name(tok) and at(i - 1) is not None and at(i - 1).norm in ("WITH", "RECURSIVE", ","):
+            j = i + 1
+            columns = []
+            if at(j) is not None and at(j).value == '(':
+                end = skip_parens(j)
+                columns = [t.norm for t in tokens[j:end] if _is_name(t)]
+                j = end
+            if at(j) is not None and at(j).norm == "AS" and at(j + 1) is not None and at(j + 1).value == '(':
+                shape.ctes.add(tok.norm)
+                shape.output_aliases.update(columns)
+                consumed.update(range(i, j))
+                i = j + 1
+                continue
+
+        # Table references after FROM / JOIN (and comma-separated FROM lists)
+        if tok.kind == "keyword" and tok.norm in _JOIN_WORDS:
+            j = i + 1
+            while True:
+                nxt = at(j)
+                if nxt is None:
+                    break
+                if nxt.value == '(':
+                    inner = at(j + 1)
+                    if inner is None or inner.norm not in ("SELECT", "WITH", "VALUES"):
+                        break
+                    # Derived table: the subquery body is analysed by the main loop
+                    j = read_alias(skip_parens(j), None)
+                    if tok.norm == "FROM" and at(j) is not None and at(j).value == ',':
+                        j += 1
+                        continue
+                    break
+                if not _is_name(nxt):
+                    break
+                # schema.table
+                if at(j + 1) is not None and at(j + 1).value == '.' and at(j + 2) is not None and _is_name(at(j + 2)):
+                    consumed.update((j, j + 2))
+                    j += 2
+                    nxt = tokens[j]
+                if at(j + 1) is not None and at(j + 1).value == '(':
+                    break  # Table-valued function such as json_each(...)
+                shape.tables.append(nxt.norm)
+                shape.aliases.setdefault(nxt.norm, nxt.norm)
+                consumed.add(j)
+                j = read_alias(j + 1, nxt.norm)
+                if tok.norm == "FROM" and at(j) is not None and at(j).value == ',':
+                    j += 1
+                    continue
+                break
+            i += 1
+            continue
+
+        # Output aliases: expr AS name, or implicit 'expr name'
+        if _is_name(tok) and i not in consumed:
+            prev, nxt = at(i - 1), at(i + 1)
+            if prev is not None and prev.norm == "AS":
+                shape.output_aliases.add(tok.norm)
+                consumed.add(i)
+            elif prev is not None and (prev.norm in _NON_COLUMN_AFTER
+                                       or (prev.norm == "BY" and at(i - 2) is not None
+                                           and at(i - 2).norm == "INDEXED")):
+                consumed.add(i)
+            elif (prev is not None and nxt is not None and nxt.norm in _ALIAS_END
+                  and (prev.value == ')' or prev.kind in ("ident", "qident", "number", "string")
+                       or prev.norm == "END")):
+                shape.output_aliases.add(tok.norm)
+                consumed.add(i)
+        i += 1
+
+    # Column references: every remaining name that is not a function call
+    for i, tok in enumerate(tokens):
+        if not _is_name(tok) or i in consumed:
+            continue
+        prev, nxt = at(i - 1), at(i + 1)
+        if tok.kind == "ident" and nxt is not None and nxt.value == '(':
+            continue
+        if nxt is not None and nxt.value == '.':
+            continue  # Qualifier; the column after the dot is recorded below
+        if prev is not None and prev.value == '.':
+            qualifier = at(i - 2)
+            shape.columns.append((qualifier.norm if qualifier is not None else None, tok.norm))
+        else:
+            shape.columns.append((None, tok.norm))
+            if tok.kind == "qident":
+                shape.quoted.add(tok.norm)
+
+    return shape
+
+
+class SQLValidator:
+    """
+    Tokenizer-based SQL validator: single read-only statement, allow-listed
+    tables, and columns that exist in the schema. Identifiers such as
+    'created_at' or 'last_update' are never mistaken for keywords.
+    """
+
+    def __init__(self, whitelist_tables: Optional[Iterable[str]] = None,
+                 schema: Optional[Dict[str, List[str]]] = None):
+        self.whitelist_tables = {t.lower() for t in whitelist_tables} if whitelist_tables else None
+        self.schema = schema
+
+    def check_read_only(self, sql: str) -> List[str]:
+        """Statement-level checks only: one statement, SELECT/WITH, no writes"""
+        tokens = tokenize(sql)
+        issues = []
+
+        errors = [t.value for t in tokens if t.kind == "error"]
+        if errors:
+            issues.append(f"🚫 Could not parse SQL near: {errors[0]!r}")
+
+        body = list(tokens)
+        while body and body[-1].value == ';':
+            body.pop()
+        if not body:
+            return issues + ["🚫 Empty SQL statement"]
+        if any(t.value == ';' for t in body):
+            issues.append("🚫 Multiple statements are not allowed")
+        if body[0].norm not in ("SELECT", "WITH"):
+            issues.append(f"🚫 Only SELECT queries are allowed (found {body[0].value.upper()})")
+
+        for i, t in enumerate(body):
+            following = body[i + 1] if i + 1 < len(body) else None
+            is_call = following is not None and following.value == '('
+            if t.kind == "keyword" and t.norm in WRITE_KEYWORDS and not (t.norm == "REPLACE" and is_call):
+                issues.append(f"🚫 Dangerous operation detected: {t.norm}")
+            elif t.kind == "ident" and is_call and t.value.upper() in BLOCKED_FUNCTIONS:
+                issues.append(f"🚫 Function not allowed: {t.value}")
+        return issues
+
+    def validate(self, sql: str, schema: Optional[Dict[str, List[str]]] = None) -> List[str]:
+        """Full validation; returns a list of issues (empty means valid)"""
+        issues = self.check_read_only(sql)
+        if issues:
+            return issues
+
+        schema = schema if schema is not None else self.schema
+        shape = analyze_query(tokenize(sql))
+
+        for table in shape.tables:
+            if table in shape.ctes:
+                continue
+            if self.whitelist_tables is not None and table not in self.whitelist_tables:
+                issues.append(f"🚫 Table not allowed: {table}")
+
+        if schema:
+            issues.extend(self._check_columns(shape, schema))
+        return issues
+
+    @staticmethod
+    def _check_columns(shape: QueryShape, schema: Dict[str, List[str]]) -> List[str]:
+        """
+        Unknown qualified columns are errors. Unknown bare "double-quoted" names
+        are let through: SQLite reads them as string literals.
+        """
+        columns_by_table = {t.lower(): {c.lower() for c in cols} for t, cols in schema.items()}
+        referenced = [t for t in shape.tables if t in columns_by_table]
+        in_scope = set().union(*(columns_by_table[t] for t in referenced)) if referenced else set()
+        known_names = (in_scope | shape.output_aliases | shape.ctes | set(shape.aliases)
+                       | IMPLICIT_COLUMNS)
+
+        issues = []
+        for qualifier, column in shape.columns:
+            if qualifier is not None:
+                table = shape.aliases.get(qualifier, qualifier if qualifier in columns_by_table else None)
+                if table in columns_by_table and column not in columns_by_table[table] \
+                        and column not in IMPLICIT_COLUMNS:
+                    issues.append(f"❓ Unknown column: {qualifier}.{column}")
+            elif column not in known_names and column not in shape.quoted:
+                issues.append(f"❓ Unknown column: {column}")
+        return list(dict.fromkeys(issues))
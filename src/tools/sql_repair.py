@@ -0,0 +1,363 @@
+import difflib
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.tools.plan_tool import AGGREGATE_FUNCTIONS
+from src.tools.sql_parser import IMPLICIT_COLUMNS, KEYWORDS, Token, analyze_query, token_spans, tokenize
+
+# Error text (SQLite or SQLValidator issues) -> kind of repair; the group is the offending name
+_ERROR_KINDS = [
+    ('column', re.compile(r"no such column: (\S+)|Unknown column: (\S+)", re.I)),
+    ('table', re.compile(r"no such table: (\S+)|Table not allowed: (\S+)", re.I)),
+    ('ambiguous', re.compile(r"ambiguous column name: (\S+)", re.I)),
+    ('function', re.compile(r"no such function: (\w+)", re.I)),
+    ('group_by', re.compile(r"GROUP BY clause is required|not allowed in the GROUP BY", re.I)),
+    ('syntax', re.compile(r"syntax error|incomplete input|unrecognized token|Could not parse SQL|"
+                          r"Multiple statements|Only SELECT queries|Empty SQL", re.I)),
+]
+
+_FENCE_RE = re.compile(r"```[A-Za-z]*")
+_SMART_QUOTES = str.maketrans({'‘': "'", '’': "'", '“': '"', '”': '"'})
+# A line opening a statement: SELECT, or WITH followed by a CTE definition (not the English word)
+_STATEMENT_START = re.compile(r"^\s*(?:SELECT\b|WITH\s+(?:RECURSIVE\s+)?\S+\s*(?:\([^)]*\)\s*)?AS\s*\()",
+                              re.I | re.M)
+_MARKDOWN_LINE = re.compile(r"^\s*(?:[*#>]|-\s|\d+\.\s)")
+_BARE_NAME = re.compile(r"^[A-Za-z_][\w$]*$")
+
+# MySQL / SQL Server functions the Architect reaches for -> SQLite equivalents
+_DATE_PARTS = {'year': '%Y', 'month': '%m', 'day': '%d', 'hour': '%H'}
+_FUNCTION_RENAMES = {'nvl': 'IFNULL', 'len': 'LENGTH', 'char_length': 'LENGTH'}
+_NO_ARG_FUNCTIONS = {'now': "CURRENT_TIMESTAMP", 'getdate': "CURRENT_TIMESTAMP", 'curdate': "DATE('now')"}
+
+_CLAUSE_END = frozenset(["HAVING", "ORDER", "LIMIT", "WINDOW"])
+_COMPARISONS = frozenset(["=", "==", "!=", "<>", "<", ">", "<=", ">=", "LIKE", "GLOB", "IN", "(", ","])
+
+
+@dataclass
+class SQLRepair:
+    """A locally repaired query and what was changed"""
+    sql: str
+    kind: str
+    fixes: List[str] = field(default_factory=list)
+
+
+def classify_error(error: str) -> Tuple[Optional[str], Optional[str]]:
+    """(kind, offending name) of a database or validation error; (None, None) if not repairable"""
+    for kind, pattern in _ERROR_KINDS:
+        match = pattern.search(error)
+        if match:
+            return kind, next((g.strip('"`[]') for g in match.groups() if g), None)
+    return None, None
+
+
+def _is_prose(line: str) -> bool:
+    """Explanation or markdown after the query ("This query returns ...", "- note", "**Output:**")"""
+    if _MARKDOWN_LINE.match(line):
+        return True
+    words = line.split()
+    return (len(words) >= 4 and words[0].upper().strip(':') not in KEYWORDS
+            and line.rstrip().endswith(('.', ':', '!', '?')))
+
+
+def strip_prose(sql: str) -> str:
+    """The statement alone: markdown fences, text before it and prose or text after its ';' removed"""
+    text = _FENCE_RE.sub("", sql)
+    start = _STATEMENT_START.search(text)
+    if start is not None:
+        text = text[start.start():]
+    kept = []
+    for line in text.splitlines():
+        if kept and _is_prose(line):
+            break
+        kept.append(line)
+    text = "\n".join(kept)
+    for tok, begin, end in token_spans(text):
+        if tok.value == ';':
+            rest = text[end:].strip()
+            if rest and not _STATEMENT_START.match(rest):
+                text = text[:begin]
+            break
+    return text.strip()
+
+
+def _similarity(name: str, candidate: str) -> float:
+    """Closeness to the whole candidate or to a trailing part of it ("categroy" ~ "product_category")"""
+    parts = candidate.split('_')
+    return max(difflib.SequenceMatcher(None, name, '_'.join(parts[k:])).ratio() for k in range(len(parts)))
+
+
+def _quote_like(tok: Token, name: str) -> str:
+    """name spelled the way tok was (bare, "double", `back` or [bracket] quoted), quoting when needed"""
+    if tok.kind == "qident":
+        if tok.value[0] == '[':
+            return f"[{name}]"
+        return f"{tok.value[0]}{name}{tok.value[0]}"
+    if _BARE_NAME.match(name) and name.upper() not in KEYWORDS:
+        return name
+    return f'"{name}"'
+
+
+def _replace_tokens(sql: str, replacements: Dict[Tuple[int, int], str]) -> str:
+    """Replace (first, last) token-index ranges of sql with new text"""
+    spans = token_spans(sql)
+    for first, last in sorted(replacements, reverse=True):
+        sql = sql[:spans[first][1]] + replacements[(first, last)] + sql[spans[last][2]:]
+    return sql
+
+
+def _closing(tokens: List[Token], open_at: int) -> int:
+    """Index of the ')' matching the '(' at open_at (or the last token)"""
+    depth = 0
+    for i in range(open_at, len(tokens)):
+        if tokens[i].value == '(':
+            depth += 1
+        elif tokens[i].value == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(tokens) - 1
+
+
+class SQLRepairTool:
+    """
+    Deterministic fixes for the errors the Architect most often makes, tried
+    before asking it again: surrounding prose/markdown, misspelled tables and
+    columns (fuzzy-matched against the schema), identifier quoting, ambiguous
+    join columns, MySQL-style functions and HAVING / GROUP BY mistakes.
+    """
+
+    def __init__(self, memory, cutoff: float = 0.75, max_rounds: int = 3):
+        self.memory = memory
+        self.cutoff = cutoff
+        self.max_rounds = max_rounds  # Local repairs per question before the Architect takes over
+        self.attempts = 0
+        self.repairs = 0
+        self.round_trips_saved = 0
+        self.repairs_by_kind: Counter = Counter()
+        self._lock = threading.Lock()
+        self.agent_name = "SQLRepair"
+
+    def repair(self, sql: str, error: str) -> Optional[SQLRepair]:
+        """A repaired query for this error, or None when only the Architect can fix it"""
+        kind, name = classify_error(error)
+        with self._lock:
+            self.attempts += 1
+        if kind is None:
+            return None
+
+        tables = self.memory.schema
+        schema = {t.lower(): list(cols) for t, cols in tables.items()}
+        fixes: List[str] = []
+        text = sql.translate(_SMART_QUOTES)
+        if text != sql:
+            fixes.append("replaced typographic quotes")
+        stripped = strip_prose(text)
+        if stripped != text.strip():
+            fixes.append("removed text around the statement")
+        text = stripped
+        if kind == 'function' and name:
+            text = self._fix_function(text, name, fixes)
+        text = self._fix_tables(text, list(tables), fixes)
+        text = self._fix_columns(text, schema, fixes)
+        if kind == 'ambiguous' and name:
+            text = self._fix_ambiguous(text, name.split('.')[-1].lower(), schema, fixes)
+        if kind == 'group_by':
+            text = self._fix_group_by(text, fixes)
+
+        if not fixes or text == sql:
+            return None
+        with self._lock:
+            self.repairs += 1
+            self.repairs_by_kind[kind] += 1
+        return SQLRepair(text, kind, fixes)
+
+    def confirm(self, repair: SQLRepair):
+        """The repaired query ran: one Architect round-trip saved"""
+        with self._lock:
+            self.round_trips_saved += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'attempts': self.attempts,
+                'repairs': self.repairs,
+                'round_trips_saved': self.round_trips_saved,
+                'by_kind': dict(self.repairs_by_kind),
+            }
+
+    def _closest(self, name: str, candidates: List[str]) -> Optional[str]:
+        """Best candidate for a misspelled name; None when nothing (or more than one thing) is close"""
+        squashed = {c.replace('_', '').lower(): c for c in candidates}
+        exact = squashed.get(name.replace('_', '').replace(' ', '').lower())
+        if exact is not None:
+            return exact
+        scored = sorted(((_similarity(name.lower(), c.lower()), c)
+                         for c in {c.lower(): c for c in candidates}.values()), reverse=True)
+        if not scored or scored[0][0] < self.cutoff:
+            return None
+        if len(scored) > 1 and scored[0][0] - scored[1][0] < 0.05:
+            return None  # e.g. "amnt" between "amount" and "amounts": leave it to the Architect
+        return scored[0][1]
+
+    def _fix_tables(self, sql: str, tables: List[str], fixes: List[str]) -> str:
+        shape = analyze_query(tokenize(sql))
+        known = {t.lower() for t in tables}
+        renames = {}
+        for table in shape.tables:
+            if table not in known and table not in shape.ctes:
+                match = self._closest(table, tables)
+                if match is not None:
+                    renames[table] = match
+        if not renames:
+            return sql
+        spans = token_spans(sql)
+        replacements = {(i, i): _quote_like(tok, renames[tok.norm]) for i, (tok, _, _) in enumerate(spans)
+                        if tok.kind in ("ident", "qident") and tok.norm in renames}
+        fixes.extend(f"table {old} -> {new}" for old, new in renames.items())
+        return _replace_tokens(sql, replacements)
+
+    def _fix_columns(self, sql: str, schema: Dict[str, List[str]], fixes: List[str]) -> str:
+        tokens = tokenize(sql)
+        shape = analyze_query(tokens)
+        referenced = [t for t in shape.tables if t in schema]
+        in_scope = [c for t in referenced for c in schema[t]]
+        known = ({c.lower() for c in in_scope} | shape.output_aliases | shape.ctes | set(shape.aliases)
+                 | IMPLICIT_COLUMNS)
+        unknown = {column for qualifier, column in shape.columns if qualifier is None and column not in known}
+
+        replacements = {}
+        for i, tok in enumerate(tokens):
+            if tok.kind not in ("ident", "qident"):
+                continue
+            prev = tokens[i - 1] if i > 0 else None
+            nxt = tokens[i + 1] if i + 1 < len(tokens) else None
+            if (prev is not None and prev.value == '.') and i >= 2:
+                table = shape.aliases.get(tokens[i - 2].norm, tokens[i - 2].norm)
+                if table not in schema or tok.norm in {c.lower() for c in schema[table]} \
+                        or tok.norm in IMPLICIT_COLUMNS:
+                    continue
+                match = self._closest(tok.norm, schema[table])
+                if match is not None:
+                    replacements[(i, i)] = _quote_like(tok, match)
+                    fixes.append(f"column {tokens[i - 2].value}.{tok.norm} -> {match}")
+                continue
+            if tok.norm not in unknown or (nxt is not None and nxt.value in ('.', '(')):
+                continue
+            if tok.value[0] == '"' and prev is not None and prev.norm in _COMPARISONS:
+                # region = "North": a string literal written with identifier quotes
+                replacements[(i, i)] = "'" + tok.value[1:-1].replace('""', '"').replace("'", "''") + "'"
+                fixes.append(f"quoted {tok.value} as a string")
+                continue
+            match = self._closest(tok.norm, in_scope + sorted(shape.output_aliases))
+            if match is not None:
+                replacements[(i, i)] = _quote_like(tok, match)
+                fixes.append(f"column {tok.norm} -> {match}")
+        if not replacements:
+            return sql
+        fixes[:] = list(dict.fromkeys(fixes))
+        return _replace_tokens(sql, replacements)
+
+    def _fix_ambiguous(self, sql: str, column: str, schema: Dict[str, List[str]], fixes: List[str]) -> str:
+        """Qualify a bare column found in several joined tables with the first of them (FROM order)"""
+        tokens = tokenize(sql)
+        shape = analyze_query(tokens)
+        owner = next((t for t in shape.tables if t in schema and column in {c.lower() for c in schema[t]}), None)
+        if owner is None:
+            return sql
+        qualifier = next((a for a, t in shape.aliases.items() if t == owner and a != owner), owner)
+        replacements = {}
+        for i, tok in enumerate(tokens):
+            prev = tokens[i - 1] if i > 0 else None
+            nxt = tokens[i + 1] if i + 1 < len(tokens) else None
+            if (tok.kind in ("ident", "qident") and tok.norm == column
+                    and (prev is None or (prev.value != '.' and prev.norm != "AS"))
+                    and (nxt is None or nxt.value not in ('.', '('))):
+                replacements[(i, i)] = f"{qualifier}.{tok.value}"
+        if not replacements:
+            return sql
+        fixes.append(f"qualified {column} as {qualifier}.{column}")
+        return _replace_tokens(sql, replacements)
+
+    def _fix_function(self, sql: str, name: str, fixes: List[str]) -> str:
+        """Rewrite calls of an unknown MySQL-style function into SQLite"""
+        function = name.lower()
+        if function not in _DATE_PARTS and function not in _FUNCTION_RENAMES and function not in _NO_ARG_FUNCTIONS:
+            return sql
+        spans = token_spans(sql)
+        tokens = [tok for tok, _, _ in spans]
+        replacements = {}
+        for i, tok in enumerate(tokens):
+            if tok.kind != "ident" or tok.norm != function or i + 1 >= len(tokens) or tokens[i + 1].value != '(':
+                continue
+            close = _closing(tokens, i + 1)
+            if function in _FUNCTION_RENAMES:
+                replacements[(i, i)] = _FUNCTION_RENAMES[function]
+            elif function in _NO_ARG_FUNCTIONS:
+                replacements[(i, close)] = _NO_ARG_FUNCTIONS[function]
+            else:
+                argument = sql[spans[i + 1][2]:spans[close][1]].strip()
+                replacements[(i, close)] = f"CAST(strftime('{_DATE_PARTS[function]}', {argument}) AS INTEGER)"
+        if not replacements:
+            return sql
+        fixes.append(f"{name}() -> SQLite equivalent")
+        return _replace_tokens(sql, _outermost(replacements))
+
+    def _fix_group_by(self, sql: str, fixes: List[str]) -> str:
+        """GROUP BY the select list's non-aggregate items (added before HAVING or replacing a bad one)"""
+        tokens = tokenize(sql)
+        depth = 0
+        marks: Dict[str, List[int]] = {}
+        commas: List[int] = []
+        for i, tok in enumerate(tokens):
+            if tok.value == '(':
+                depth += 1
+            elif tok.value == ')':
+                depth -= 1
+            elif depth == 0:
+                if tok.kind == "keyword":
+                    marks.setdefault(tok.norm, []).append(i)
+                elif tok.value == ',':
+                    commas.append(i)
+        if len(marks.get("SELECT", [])) != 1 or "FROM" not in marks \
+                or any(k in marks for k in ("UNION", "EXCEPT", "INTERSECT", "WITH")):
+            return sql
+        select, source = marks["SELECT"][0], marks["FROM"][0]
+        first = select + 1 + (tokens[select + 1].norm in ("DISTINCT", "ALL"))
+        bounds = [first] + [c + 1 for c in commas if select < c < source] + [source + 1]
+        plain = []
+        for n, (start, stop) in enumerate(zip(bounds, bounds[1:]), 1):
+            item = tokens[start:stop - 1]
+            aggregated = any(t.kind == "ident" and t.norm in AGGREGATE_FUNCTIONS and j + 1 < len(item)
+                             and item[j + 1].value == '(' for j, t in enumerate(item))
+            if not aggregated and not any(t.value == '*' for t in item):
+                plain.append(str(n))
+        if not plain:
+            return sql
+        clause = f"GROUP BY {', '.join(plain)}"
+        if "GROUP" in marks:
+            start = marks["GROUP"][0]
+            stop = min([i for k in _CLAUSE_END for i in marks.get(k, []) if i > start]
+                       + [len(tokens) - (tokens[-1].value == ';')]) - 1
+            replacements = {(start, stop): clause}
+        elif "HAVING" in marks:
+            having = marks["HAVING"][0]
+            replacements = {(having, having): f"{clause} HAVING"}
+        else:
+            return sql
+        fixes.append(clause)
+        return _replace_tokens(sql, replacements)
+
+
+def _outermost(replacements: Dict[Tuple[int, int], str]) -> Dict[Tuple[int, int], str]:
+    """Drop ranges nested inside another (YEAR(YEAR(x)) is rewritten from the outer call)"""
+    ranges = sorted(replacements, key=lambda r: (r[0], -r[1]))
+    kept: Dict[Tuple[int, int], str] = {}
+    last_end = -1
+    for first, last in ranges:
+        if first > last_end:
+            kept[(first, last)] = replacements[(first, last)]
+            last_end = last
+    return kept
@@ -1,23 +1,242 @@
 import sqlite3
+import threading
+import time
 import pandas as pd
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator, List, Optional, Set
+
+from src.memory.connection_pool import SQLiteConnectionPool
+from src.tools.result_cache import QueryResultCache
+from src.tools.sql_parser import SQLValidator
+from src.tools.streaming import StreamingResult, stream_query
+
+class QueryTimeoutError(Exception):
+    """A query ran past its wall-clock or VM-step budget and was interrupted"""
+
+class QueryCancelledError(Exception):
+    """A running query was cancelled by the caller"""
 
 class SQLExecutorTool:
     """Tool for executing SQL queries safely"""
-    
-    def __init__(self, connection: sqlite3.Connection):
+
+    # VM instructions between progress-handler callbacks (budget check granularity)
+    PROGRESS_INTERVAL = 1000
+
+    def __init__(self, connection: sqlite3.Connection,
+                 result_cache: Optional[QueryResultCache] = None,
+                 pool: Optional[SQLiteConnectionPool] = None,
+                 timeout_seconds: Optional[float] = 30.0,
+                 max_vm_steps: Optional[int] = None,
+                 max_rows: Optional[int] = 1_000_000):
         self.connection = connection
+        self.pool = pool
+        self.timeout_seconds = timeout_seconds
+        self.max_vm_steps = max_vm_steps
+        self.max_rows = max_rows
+        self._active: Dict[int, dict] = {}
+        self._active_lock = threading.Lock()
         self.whitelist_tables = ['sales', 'products', 'customers']
-        
-    def execute(self, sql: str) -> pd.DataFrame:
-        """Execute SQL with safety checks"""
-        sql_lower = sql.lower()
-        
-        # Check for dangerous operations
-        if any(keyword in sql_lower for keyword in ['drop', 'delete', 'update', 'insert', 'alter']):
-            raise ValueError("Only SELECT queries are allowed")
-        
+        self.validator = SQLValidator(self.whitelist_tables)
+        self.result_cache = result_cache if result_cache is not None else QueryResultCache()
+        # Without a pool the single connection must not be used by two threads at once
+        self._lock = threading.Lock()
+        self._table_stats_version: Optional[Hashable] = None
+        self._row_estimates: Dict[str, int] = {}
+        self._table_columns: Dict[str, Set[str]] = {}
+
+    def execute(self, sql: str, cancel_event: Optional[threading.Event] = None) -> pd.DataFrame:
+        """
+        Execute SQL with safety checks, within the time/step/row budgets.
+        Raises QueryTimeoutError when a budget runs out and QueryCancelledError
+        when cancel_event is set (or cancel_all() is called) mid-query.
+        """
+        self._check_safety(sql)
+
         try:
-            df = pd.read_sql_query(sql, self.connection)
-            return df
+            with self._checkout() as conn:
+                data_version = self._data_version(conn)
+                df = self.result_cache.get(sql, data_version)
+                if df is not None:
+                    df.attrs['result_cache_hit'] = True
+                    return df
+
+                with self._budget(conn, cancel_event):
+                    df = self._fetch(conn, sql)
+                self.result_cache.put(sql, data_version, df)
+                return df
+        except (QueryTimeoutError, QueryCancelledError):
+            raise
         except Exception as e:
-            raise Exception(f"SQL execution failed: {str(e)}")
\ No newline at end of file
+            raise Exception(f"SQL execution failed: {str(e)}")
+
+    def execute_streaming(self, sql: str, chunk_size: int = 50_000, sample_rows: int = 1000,
+                          spill_threshold_rows: int = 200_000,
+                          spill_dir: Optional[str] = None,
+                          cancel_event: Optional[threading.Event] = None) -> StreamingResult:
+        """
+        Execute SQL reading the cursor in chunks. Row count, column stats and
+        a sample are built incrementally; results over spill_threshold_rows
+        go to a memory-mapped Arrow file instead of one big DataFrame.
+        """
+        self._check_safety(sql)
+
+        try:
+            with self._checkout() as conn:
+                data_version = self._data_version(conn)
+                df = self.result_cache.get(sql, data_version)
+                if df is not None:
+                    return StreamingResult.from_dataframe(df, sample_rows)
+
+                capped = {'truncated': False}
+                with self._budget(conn, cancel_event):
+                    chunks = self._capped(pd.read_sql_query(sql, conn, chunksize=chunk_size), capped)
+                    result = stream_query(chunks, sample_rows, spill_threshold_rows, spill_dir)
+                if capped['truncated']:
+                    result.dataframe.attrs['truncated'] = True
+                if not result.spilled:
+                    self.result_cache.put(sql, data_version, result.frame)
+                return result
+        except (QueryTimeoutError, QueryCancelledError):
+            raise
+        except Exception as e:
+            raise Exception(f"SQL execution failed: {str(e)}")
+
+    def cancel_all(self):
+        """Interrupt every query currently running through this tool"""
+        with self._active_lock:
+            for state in self._active.values():
+                state['cancelled'] = True
+                state['connection'].interrupt()
+
+    def _fetch(self, conn: sqlite3.Connection, sql: str) -> pd.DataFrame:
+        """Read the result, stopping after max_rows rows"""
+        if self.max_rows is None:
+            return pd.read_sql_query(sql, conn)
+
+        capped = {'truncated': False}
+        # One row past the cap tells a cut-off result from one that is exactly max_rows long
+        chunksize = min(self.max_rows + 1, 50_000)
+        chunks = list(self._capped(pd.read_sql_query(sql, conn, chunksize=chunksize), capped))
+        df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+        if capped['truncated']:
+            df.attrs['truncated'] = True
+        return df
+
+    def _capped(self, chunks: Iterator[pd.DataFrame], capped: dict) -> Iterator[pd.DataFrame]:
+        """Pass chunks through up to max_rows rows; sets capped['truncated'] if more rows existed"""
+        fetched = 0
+        for chunk in chunks:
+            if self.max_rows is not None and fetched + len(chunk) > self.max_rows:
+                yield chunk.iloc[:self.max_rows - fetched]
+                capped['truncated'] = True
+                chunks.close()
+                return
+            fetched += len(chunk)
+            yield chunk
+
+    @contextmanager
+    def _budget(self, conn: sqlite3.Connection, cancel_event: Optional[threading.Event]):
+        """Enforce the wall-clock and VM-step budgets through SQLite's progress handler"""
+        deadline = time.monotonic() + self.timeout_seconds if self.timeout_seconds else None
+        state = {'connection': conn, 'steps': 0, 'reason': None, 'cancelled': False}
+
+        def on_progress() -> int:
+            state['steps'] += self.PROGRESS_INTERVAL
+            if state['cancelled'] or (cancel_event is not None and cancel_event.is_set()):
+                state['reason'] = 'cancelled'
+            elif deadline is not None and time.monotonic() > deadline:
+                state['reason'] = f"exceeded {self.timeout_seconds}s time budget"
+            elif self.max_vm_steps is not None and state['steps'] > self.max_vm_steps:
+                state['reason'] = f"exceeded {self.max_vm_steps:,} VM-step budget"
+            return 1 if state['reason'] else 0
+
+        with self._active_lock:
+            self._active[id(state)] = state
+        conn.set_progress_handler(on_progress, self.PROGRESS_INTERVAL)
+        try:
+            yield state
+        except Exception as e:
+            if state['cancelled'] or state['reason'] == 'cancelled':
+                raise QueryCancelledError("Query was cancelled") from e
+            if state['reason']:
+                raise QueryTimeoutError(f"Query interrupted: {state['reason']}") from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+            with self._active_lock:
+                self._active.pop(id(state), None)
+
+    def explain(self, sql: str) -> List[tuple]:
+        """EXPLAIN QUERY PLAN rows: (id, parent, notused, detail)"""
+        self._check_safety(sql)
+        with self._checkout() as conn:
+            return conn.execute(f"EXPLAIN QUERY PLAN {sql.strip().rstrip(';')}").fetchall()
+
+    def table_row_estimates(self) -> Dict[str, int]:
+        """Approximate rows per allow-listed table, refreshed when the data changes"""
+        self._refresh_table_stats()
+        return self._row_estimates
+
+    def table_columns(self) -> Dict[str, Set[str]]:
+        """Lower-cased column names per allow-listed table"""
+        self._refresh_table_stats()
+        return self._table_columns
+
+    def _refresh_table_stats(self):
+        with self._checkout() as conn:
+            data_version = self._data_version(conn)
+            if data_version == self._table_stats_version:
+                return
+
+            stat1 = {}
+            has_stat1 = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ).fetchone()
+            if has_stat1:
+                for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+                    stat1.setdefault(table.lower(), int(stat.split()[0]))
+
+            estimates, columns = {}, {}
+            for table in self.whitelist_tables:
+                try:
+                    columns[table] = {row[1].lower() for row in conn.execute(f'PRAGMA table_info("{table}")')}
+                    estimates[table] = stat1.get(table) or self._estimate_rows(conn, table)
+                except sqlite3.Error:
+                    continue
+
+            self._row_estimates, self._table_columns = estimates, columns
+            self._table_stats_version = data_version
+
+    def _estimate_rows(self, conn: sqlite3.Connection, table: str) -> int:
+        """Row estimate for a table ANALYZE has no statistics for"""
+        # MAX(rowid) is an O(log n) stand-in for COUNT(*) on append-mostly tables
+        return conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+
+    def _check_safety(self, sql: str):
+        """Reject anything that is not a read-only query"""
+        issues = self.validator.check_read_only(sql)
+        if issues:
+            raise ValueError(f"Only SELECT queries are allowed: {'; '.join(issues)}")
+
+    @contextmanager
+    def _checkout(self) -> Iterator[sqlite3.Connection]:
+        """A pooled read-only connection, or the shared one under a lock"""
+        if self.pool is not None:
+            with self.pool.connection() as conn:
+                yield conn
+        else:
+            with self._lock:
+                yield self.connection
+
+    def _data_version(self, conn: sqlite3.Connection) -> Hashable:
+        """
+        Token that changes whenever the database content changes.
+        With a pool, per-connection pragmas are not comparable, so the pool
+        reads the file change counter instead. On a single connection,
+        PRAGMA data_version catches commits from other connections and
+        total_changes catches writes made through this one.
+        """
+        if self.pool is not None:
+            return self.pool.data_version()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        return (data_version, conn.total_changes)
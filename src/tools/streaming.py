@@ -0,0 +1,275 @@
+import os
+import tempfile
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnStats:
+    """Running statistics for one result column, updated chunk by chunk"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.numeric = None
+        self.min = None
+        self.max = None
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, series: pd.Series):
+        """Fold one chunk of values into the running stats"""
+        non_null = series.dropna()
+        self.nulls += len(series) - len(non_null)
+        if non_null.empty:
+            return
+
+        if self.numeric is None:
+            self.numeric = pd.api.types.is_numeric_dtype(non_null)
+        self.count += len(non_null)
+
+        if self.numeric and pd.api.types.is_numeric_dtype(non_null):
+            values = non_null.to_numpy(dtype=np.float64)
+            self.total += float(values.sum())
+            self.total_sq += float(np.square(values).sum())
+            chunk_min, chunk_max = values.min(), values.max()
+        else:
+            if self.numeric and self.min is not None:
+                # The column turned out to hold text: compare as text from here on
+                self.min, self.max = str(self.min), str(self.max)
+            self.numeric = False
+            values = non_null.astype(str)
+            chunk_min, chunk_max = values.min(), values.max()
+
+        self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+        self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+
+    def as_dict(self) -> Dict:
+        stats = {'count': self.count, 'nulls': self.nulls, 'min': self.min, 'max': self.max}
+        if self.numeric and self.count:
+            mean = self.total / self.count
+            variance = max(self.total_sq / self.count - mean * mean, 0.0)
+            stats.update({'sum': self.total, 'mean': mean, 'std': variance ** 0.5})
+        return stats
+
+
+class StreamingResult:
+    """
+    Result of a streamed query: row count, column stats and a uniform sample
+    are always in memory; the full rows are either in memory (small results)
+    or spilled to a memory-mapped Arrow IPC file (large results).
+    """
+
+    def __init__(self, columns: List[str], row_count: int, column_stats: Dict[str, ColumnStats],
+                 sample: pd.DataFrame, frame: Optional[pd.DataFrame] = None,
+                 spill_path: Optional[str] = None):
+        self.columns = columns
+        self.row_count = row_count
+        self.column_stats = column_stats
+        self.sample = sample
+        self.frame = frame
+        self.spill_path = spill_path
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, sample_rows: int = 1000) -> "StreamingResult":
+        """Wrap an already materialised DataFrame"""
+        stats = {col: ColumnStats(col) for col in df.columns}
+        for col in df.columns:
+            stats[col].update(df[col])
+        sample = df if len(df) <= sample_rows else df.sample(n=sample_rows, random_state=0).sort_index()
+        return cls(list(df.columns), len(df), stats, sample, frame=df)
+
+    @property
+    def spilled(self) -> bool:
+        return self.spill_path is not None
+
+    @property
+    def dataframe(self) -> pd.DataFrame:
+        """The full result when it is in memory, otherwise the bounded sample"""
+        return self.frame if self.frame is not None else self.sample
+
+    def stats(self) -> pd.DataFrame:
+        """Column statistics as a small DataFrame (one row per column)"""
+        return pd.DataFrame({col: s.as_dict() for col, s in self.column_stats.items()}).T
+
+    def iter_batches(self) -> Iterator[pd.DataFrame]:
+        """Iterate over the full result without materialising it all at once"""
+        if self.frame is not None:
+            yield self.frame
+            return
+
+        import pyarrow as pa
+        with pa.memory_map(self.spill_path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).to_pandas()
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Materialise the full result (use with care on spilled results)"""
+        if self.frame is not None:
+            return self.frame
+        return pd.concat(list(self.iter_batches()), ignore_index=True)
+
+    def cleanup(self):
+        """Delete the spill file, if any"""
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+            self.spill_path = None
+
+
+def _widen(a, b):
+    """Smallest Arrow type holding values of both a and b (SQLite columns are loosely typed)"""
+    import pyarrow as pa
+    if a == b or pa.types.is_null(b):
+        return a
+    if pa.types.is_null(a):
+        return b
+    numeric = (pa.types.is_integer, pa.types.is_floating, pa.types.is_boolean)
+    if any(check(a) for check in numeric) and any(check(b) for check in numeric):
+        if pa.types.is_integer(a) and pa.types.is_integer(b):
+            return pa.int64()
+        return pa.float64()
+    return pa.string()
+
+
+class _ArrowSpillWriter:
+    """
+    Appends DataFrame chunks to an Arrow IPC file that can be memory-mapped later.
+    Column types widen as chunks arrive (null -> any, int -> float, mixed -> string);
+    when a chunk needs a wider schema the batches written so far are rewritten once.
+    """
+
+    def __init__(self, spill_dir: Optional[str]):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("pyarrow is required to spill large results to disk") from e
+
+        self._pa = pa
+        self._spill_dir = spill_dir
+        self.schema = None
+        self.path = None
+        self._sink = None
+        self._writer = None
+
+    def write(self, chunk: pd.DataFrame):
+        table = self._to_table(chunk)
+        if self.schema is None:
+            self._open(table.schema.remove_metadata())
+        elif table.schema.remove_metadata() != self.schema:
+            widened = self._pa.schema([
+                field.with_type(_widen(field.type, table.schema.field(field.name).type))
+                for field in self.schema
+            ])
+            if widened != self.schema:
+                self._rewrite(widened)
+        self._writer.write_table(table.cast(self.schema))
+
+    def _to_table(self, chunk: pd.DataFrame):
+        pa = self._pa
+        try:
+            return pa.Table.from_pandas(chunk, preserve_index=False)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # Object columns mixing text and numbers: keep them as text
+            mixed = chunk.select_dtypes(include='object').columns
+            chunk = chunk.assign(**{col: chunk[col].map(lambda v: v if v is None else str(v)) for col in mixed})
+            return pa.Table.from_pandas(chunk, preserve_index=False)
+
+    def _open(self, schema):
+        fd, self.path = tempfile.mkstemp(prefix="autoinsights_", suffix=".arrow", dir=self._spill_dir)
+        os.close(fd)
+        self.schema = schema
+        self._sink = self._pa.OSFile(self.path, 'wb')
+        self._writer = self._pa.ipc.new_file(self._sink, schema)
+
+    def _rewrite(self, schema):
+        """Copy the batches written so far into a new file with the wider schema"""
+        pa = self._pa
+        self.close()
+        old_path = self.path
+        self._open(schema)
+        with pa.memory_map(old_path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                self._writer.write_table(pa.Table.from_batches([reader.get_batch(i)]).cast(schema))
+        os.remove(old_path)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = self._sink = None
+
+    def discard(self):
+        """Close and delete the spill file (the query failed part-way)"""
+        self.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+def stream_query(chunks: Iterator[pd.DataFrame], sample_rows: int = 1000,
+                 spill_threshold_rows: int = 200_000, spill_dir: Optional[str] = None,
+                 seed: int = 0) -> StreamingResult:
+    """
+    Consume a chunked query result in bounded memory.
+    Keeps a uniform bottom-k sample (random key per row) and spills every
+    chunk to disk once the row count passes spill_threshold_rows.
+    """
+    rng = np.random.default_rng(seed)
+    columns: List[str] = []
+    column_stats: Dict[str, ColumnStats] = {}
+    buffered: List[pd.DataFrame] = []
+    sample = None
+    sample_keys = np.empty(0)
+    row_count = 0
+    writer = None
+
+    try:
+        for chunk in chunks:
+            if not columns:
+                columns = list(chunk.columns)
+                column_stats = {col: ColumnStats(col) for col in columns}
+            chunk.index = pd.RangeIndex(row_count, row_count + len(chunk))
+
+            for col in columns:
+                column_stats[col].update(chunk[col])
+
+            # Bottom-k sampling: keep the rows with the smallest random keys
+            keys = rng.random(len(chunk))
+            merged = chunk if sample is None else pd.concat([sample, chunk])
+            merged_keys = np.concatenate([sample_keys, keys])
+            if len(merged) > sample_rows:
+                keep = np.argpartition(merged_keys, sample_rows)[:sample_rows]
+                merged, merged_keys = merged.iloc[keep], merged_keys[keep]
+            sample, sample_keys = merged, merged_keys
+
+            row_count += len(chunk)
+            if writer is None:
+                buffered.append(chunk)
+                if row_count > spill_threshold_rows:
+                    writer = _ArrowSpillWriter(spill_dir)
+                    for pending in buffered:
+                        writer.write(pending)
+                    buffered = []
+            else:
+                writer.write(chunk)
+    except BaseException:
+        # Timeouts, cancellation and read errors must not leave a spill file behind
+        if writer is not None:
+            writer.discard()
+        raise
+    if writer is not None:
+        writer.close()
+
+    if sample is None:
+        sample = pd.DataFrame(columns=columns)
+    sample = sample.sort_index()
+
+    if writer is not None:
+        return StreamingResult(columns, row_count, column_stats, sample, spill_path=writer.path)
+
+    frame = pd.concat(buffered, ignore_index=True) if buffered else sample
+    return StreamingResult(columns, row_count, column_stats, sample, frame=frame)
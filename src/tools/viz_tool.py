@@ -1,47 +1,400 @@
-import matplotlib.pyplot as plt
-from io import BytesIO
 import base64
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
 import pandas as pd
 
+CHART_STYLE = 'seaborn-v0_8-darkgrid'
+BAR_COLORS = ['#4285F4', '#34A853', '#FBBC04']
+
+# Output format -> MIME type of the encoded image (webp/jpeg go through Pillow)
+IMAGE_FORMATS = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+    'svg': 'image/svg+xml',
+}
+# Bars drawn before the remaining categories are folded into one "Other" bar
+DEFAULT_TOP_N = 10
+# Line points are only marked when there are few enough to tell apart
+MARKER_MAX_POINTS = 50
+# Value columns that are averaged, not summed, when folded into "Other"
+_MEAN_HINTS = ('avg', 'average', 'mean', 'rate', 'ratio', 'pct', 'percent', 'share', 'margin')
+
+_style_lock = threading.Lock()
+_style_applied = False
+
+# Agg text/font caches are shared per process; in-process renders go one at a time
+_render_lock = threading.Lock()
+
+
+def _apply_style_once():
+    """Apply the chart style to rcParams once per process instead of on every chart"""
+    global _style_applied
+    if _style_applied:
+        return
+    with _style_lock:
+        if not _style_applied:
+            import matplotlib.style
+            matplotlib.style.use(CHART_STYLE)
+            _style_applied = True
+
+
+def preload_backend():
+    """Import the Agg backend and apply the style (for warm-up; no-op once loaded)"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: F401
+    from matplotlib.figure import Figure  # noqa: F401
+    _apply_style_once()
+
+
+def _is_ordered(series: pd.Series) -> bool:
+    """Numeric or datetime values, which matplotlib places on a continuous axis"""
+    return ((pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series))
+            or pd.api.types.is_datetime64_any_dtype(series))
+
+
+def _parse_dates(series: pd.Series) -> Optional[pd.Series]:
+    """The column as datetimes when every non-null text value parses as one, else None"""
+    if not pd.api.types.is_string_dtype(series) or not series.notna().any():
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # "could not infer format" for mixed text
+        parsed = pd.to_datetime(series, errors='coerce')
+    return parsed if parsed.notna().sum() == series.notna().sum() else None
+
+
+def _value_columns(df: pd.DataFrame) -> list:
+    return [c for c in df.columns[1:] if _is_ordered(df[c]) and not pd.api.types.is_datetime64_any_dtype(df[c])]
+
+
+def suggest_chart_type(df: pd.DataFrame, default: str = 'bar', row_count: Optional[int] = None) -> str:
+    """
+    Line for more than 10 rows over an ordered first column (numbers, dates or
+    date-like text), bar otherwise: high-cardinality categories become top-N bars.
+    """
+    rows = len(df) if row_count is None else row_count
+    if rows <= 10 or len(df.columns) < 2:
+        return default
+    first = df.iloc[:, 0]
+    if _is_ordered(first) or _parse_dates(first.head(50)) is not None:
+        return 'line'
+    return 'bar'
+
+
+def default_max_points(figsize: Tuple[float, float] = (12, 6), dpi: int = 150) -> int:
+    """Line points per series worth drawing: four (first/min/max/last) per pixel column"""
+    return 4 * int(figsize[0] * dpi)
+
+
+def minmax_indices(values: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Positions of the first, last, minimum and maximum value in each of
+    `buckets` equal runs of rows (M4). A line through them covers the same
+    pixels as the full series when each bucket is one pixel column wide.
+    """
+    n = len(values)
+    if n <= 4 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets)
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = values
+    grid = padded.reshape(buckets, size)
+    missing = np.isnan(grid)
+    starts = np.arange(buckets) * size
+    lows = np.where(missing, np.inf, grid).argmin(axis=1) + starts
+    highs = np.where(missing, -np.inf, grid).argmax(axis=1) + starts
+    ends = np.minimum(starts + size, n) - 1
+    positions = np.unique(np.concatenate([starts, lows, highs, ends]))
+    return positions[positions < n]
+
+
+def downsample_lines(df: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """
+    Rows that keep every numeric series' shape within max_points per series,
+    in row order, keeping their index labels (row positions for a default
+    index). Frames already within budget come back unchanged, so downsampling
+    twice is a no-op.
+    """
+    values = _value_columns(df)
+    if len(df) <= max_points * max(len(values), 1):
+        return df
+    buckets = max(1, max_points // 4)
+    if values:
+        positions = np.unique(np.concatenate([
+            minmax_indices(df[c].to_numpy(dtype=float, na_value=np.nan), buckets) for c in values
+        ]))
+    else:
+        positions = np.unique(np.linspace(0, len(df) - 1, max_points).astype(int))
+    return df.iloc[positions]
+
+
+def downsample_batches(batches: Iterable[pd.DataFrame], max_points: int) -> pd.DataFrame:
+    """
+    downsample_lines over a result read batch by batch (e.g. a spilled one):
+    each batch is reduced on arrival, so memory stays at one batch plus the
+    points kept so far.
+    """
+    kept: List[pd.DataFrame] = []
+    offset = 0
+    for batch in batches:
+        batch.index = pd.RangeIndex(offset, offset + len(batch))
+        offset += len(batch)
+        kept.append(downsample_lines(batch, max_points))
+        if len(kept) > 1 and sum(len(part) for part in kept) > 4 * max_points:
+            kept = [downsample_lines(pd.concat(kept), max_points)]
+    if not kept:
+        return pd.DataFrame()
+    return downsample_lines(pd.concat(kept) if len(kept) > 1 else kept[0], max_points)
+
+
+def top_n_with_other(df: pd.DataFrame, top_n: int = DEFAULT_TOP_N) -> pd.DataFrame:
+    """
+    The top_n - 1 rows by the first numeric column (kept in their original
+    order) plus one "Other" row folding in the rest: summed, or averaged for
+    columns named like rates and averages.
+    """
+    if len(df) <= top_n or len(df.columns) < 2:
+        return df
+    values = _value_columns(df)
+    if not values:
+        return df.head(top_n)
+    ranking = df[values[0]].to_numpy(dtype=float, na_value=np.nan)
+    order = np.argsort(-np.nan_to_num(ranking, nan=-np.inf), kind='stable')
+    rest = np.ones(len(df), dtype=bool)
+    rest[order[:top_n - 1]] = False
+    label = df.columns[0]
+    others = df.loc[rest, values] if df.index.is_unique else df.iloc[np.flatnonzero(rest)][values]
+    other = {label: f"Other ({int(rest.sum()):,})"}
+    for column in values:
+        averaged = any(hint in str(column).lower() for hint in _MEAN_HINTS)
+        other[column] = others[column].mean() if averaged else others[column].sum()
+    kept = df.iloc[np.flatnonzero(~rest)][[label] + values]
+    return pd.concat([kept, pd.DataFrame([other])], ignore_index=True)
+
+
+def reduce_frame(df: pd.DataFrame, chart_type: str, max_points: int,
+                 top_n: int = DEFAULT_TOP_N) -> pd.DataFrame:
+    """The rows a chart actually draws, bounded regardless of the result's size"""
+    if chart_type == 'line':
+        return downsample_lines(df, max_points)
+    if chart_type == 'bar':
+        return top_n_with_other(df, top_n)
+    return df
+
+
+def render_chart(df: pd.DataFrame, chart_type: str = 'bar',
+                 figsize: Tuple[int, int] = (12, 6), dpi: int = 150,
+                 image_format: str = 'png', quality: Optional[int] = None,
+                 max_points: Optional[int] = None, top_n: int = DEFAULT_TOP_N) -> str:
+    """
+    Render a chart with the object-oriented Figure API on the Agg canvas and
+    return it base64-encoded in image_format (png, webp, jpeg or svg). No
+    pyplot global state, so it is safe to call from a worker process. Lines
+    are downsampled to max_points per series (default: from the pixel width)
+    and bars folded to top_n, so cost does not grow with the row count.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    if max_points is None:
+        max_points = default_max_points(figsize, dpi)
+    _apply_style_once()
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    if chart_type == 'line' and len(df) > 2:
+        df_plot = reduce_frame(df, chart_type, max_points, top_n)
+        x = df_plot.iloc[:, 0]
+        labels = None
+        if not _is_ordered(x):
+            dates = _parse_dates(x)
+            if dates is not None:
+                x = dates
+            elif len(df_plot) > 2 * DEFAULT_TOP_N:
+                # Free text: plot by row position and label a handful of ticks
+                labels = x
+                x = (df_plot.index.to_numpy() if pd.api.types.is_integer_dtype(df_plot.index)
+                     else np.arange(len(df_plot)))
+        marked = len(df_plot) <= MARKER_MAX_POINTS
+        series = _value_columns(df_plot) or list(df_plot.columns[1:])
+        for column in series:
+            ax.plot(x, df_plot[column], marker='o' if marked else None,
+                    linewidth=2 if marked else 1, markersize=8, label=column)
+        if labels is not None:
+            ticks = np.unique(np.linspace(0, len(df_plot) - 1, DEFAULT_TOP_N).astype(int))
+            ax.set_xticks(np.asarray(x)[ticks])
+            ax.set_xticklabels(labels.iloc[ticks].astype(str), rotation=45, ha='right')
+        ax.set_xlabel(df.columns[0], fontsize=12)
+        ax.set_ylabel('Values', fontsize=12)
+        ax.legend(fontsize=10)
+        ax.grid(True, alpha=0.3)
+
+    elif chart_type == 'bar':
+        df_plot = reduce_frame(df, chart_type, max_points, top_n).head(top_n)
+        x_pos = list(range(len(df_plot)))
+
+        if len(df_plot.columns) == 2:
+            ax.bar(x_pos, df_plot.iloc[:, 1], color=BAR_COLORS[0], alpha=0.8)
+            ax.set_xlabel(df_plot.columns[0], fontsize=12)
+            ax.set_ylabel(df_plot.columns[1], fontsize=12)
+            ax.set_xticks(x_pos)
+            ax.set_xticklabels(df_plot.iloc[:, 0], rotation=45, ha='right')
+        else:
+            # Grouped bars, one series per numeric column
+            series = df_plot.columns[1:]
+            width = 0.8 / max(len(series), 1)
+            for i, column in enumerate(series):
+                offsets = [x - 0.4 + width * (i + 0.5) for x in x_pos]
+                ax.bar(offsets, df_plot[column], width=width,
+                       color=BAR_COLORS[i % len(BAR_COLORS)], label=column)
+            ax.set_xlabel(df_plot.columns[0], fontsize=12)
+            ax.set_xticks(x_pos)
+            ax.set_xticklabels(df_plot.iloc[:, 0], rotation=90)
+            ax.legend(fontsize=10)
+
+    ax.set_title('Data Analysis Visualization', fontsize=14, fontweight='bold')
+    fig.tight_layout()
+
+    # Encode in the requested format; quality applies to the lossy Pillow formats
+    buffer = BytesIO()
+    options = {'pil_kwargs': {'quality': quality}} if quality is not None and image_format in ('webp', 'jpeg') else {}
+    fig.savefig(buffer, format=image_format, dpi=dpi, bbox_inches='tight', **options)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+class LazyChart:
+    """Chart handle that renders only when the image is actually requested"""
+
+    def __init__(self, tool: "VisualizationTool", df: pd.DataFrame, chart_type: str):
+        self._tool = tool
+        self._df = df
+        self.chart_type = chart_type
+        self._base64: Optional[str] = None
+
+    @property
+    def rendered(self) -> bool:
+        return self._base64 is not None
+
+    def render(self) -> str:
+        if self._base64 is None:
+            self._base64 = self._tool.create_chart(self._df, self.chart_type)
+            self._df = None
+        return self._base64
+
+    def __str__(self) -> str:
+        return self.render()
+
+    def __len__(self) -> int:
+        return len(self.render())
+
+
 class VisualizationTool:
     """Tool for generating visualizations from dataframes"""
-    
-    @staticmethod
-    def create_chart(df: pd.DataFrame, chart_type: str = 'bar') -> str:
-        """Generate chart and return as base64 string"""
-        plt.figure(figsize=(12, 6))
-        plt.style.use('seaborn-v0_8-darkgrid')
-        
-        if chart_type == 'line' and len(df) > 2:
-            for column in df.columns[1:]:
-                plt.plot(df.iloc[:, 0], df[column], marker='o', 
-                        linewidth=2, markersize=8, label=column)
-            plt.xlabel(df.columns[0], fontsize=12)
-            plt.ylabel('Values', fontsize=12)
-            plt.legend(fontsize=10)
-            plt.grid(True, alpha=0.3)
-            
-        elif chart_type == 'bar':
-            df_plot = df.head(10)
-            x_pos = range(len(df_plot))
-            
-            if len(df.columns) == 2:
-                plt.bar(x_pos, df_plot.iloc[:, 1], color='#4285F4', alpha=0.8)
-                plt.xlabel(df.columns[0], fontsize=12)
-                plt.ylabel(df.columns[1], fontsize=12)
-                plt.xticks(x_pos, df_plot.iloc[:, 0], rotation=45, ha='right')
-            else:
-                df_plot.plot(x=df.columns[0], kind='bar', ax=plt.gca(), 
-                           color=['#4285F4', '#34A853', '#FBBC04'])
-        
-        plt.title('Data Analysis Visualization', fontsize=14, fontweight='bold')
-        plt.tight_layout()
-        
-        # Convert to base64
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode()
-        plt.close()
-        
+
+    def __init__(self, render_workers: int = 0, cache_size: int = 256,
+                 figsize: Tuple[int, int] = (12, 6), dpi: int = 150, image_format: str = 'png',
+                 quality: Optional[int] = None, max_points: Optional[int] = None,
+                 top_n: int = DEFAULT_TOP_N):
+        """
+        render_workers > 0 renders in a process pool so charts never block
+        (or contend on) request threads; 0 renders in-process. figsize, dpi,
+        image_format (png, webp, jpeg, svg) and quality bound the payload;
+        max_points (per line series) and top_n (bars) bound what is drawn.
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format '{image_format}', expected one of {sorted(IMAGE_FORMATS)}")
+        self.render_workers = render_workers
+        self.cache_size = cache_size
+        self.render_options = {
+            'figsize': tuple(figsize),
+            'dpi': dpi,
+            'image_format': image_format,
+            'quality': quality,
+            'max_points': max_points or default_max_points(figsize, dpi),
+            'top_n': top_n,
+        }
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()  # Concurrent first charts must not each start a pool
+
+    def line_frame(self, batches: Iterable[pd.DataFrame]) -> pd.DataFrame:
+        """The rows a line chart of this batched result draws, at this tool's point budget"""
+        return downsample_batches(batches, self.render_options['max_points'])
+
+    @property
+    def mime_type(self) -> str:
+        """MIME type of the images create_chart returns (for data: URIs / Content-Type)"""
+        return IMAGE_FORMATS[self.render_options['image_format']]
+
+    def create_chart(self, df: pd.DataFrame, chart_type: str = 'bar',
+                     lazy: bool = False) -> Union[str, LazyChart]:
+        """Generate chart and return as base64 string (or a LazyChart handle)"""
+        if lazy:
+            return LazyChart(self, df, chart_type)
+
+        # Downsample / fold before hashing and shipping to a worker: both then cost O(points drawn)
+        df = reduce_frame(df, chart_type, self.render_options['max_points'], self.render_options['top_n'])
+        key = self.chart_key(df, chart_type, repr(sorted(self.render_options.items())))
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+            self.cache_misses += 1
+
+        if self.render_workers > 0:
+            image_base64 = self._get_executor().submit(render_chart, df, chart_type,
+                                                       **self.render_options).result()
+        else:
+            with _render_lock:
+                image_base64 = render_chart(df, chart_type, **self.render_options)
+
+        with self._cache_lock:
+            self._cache[key] = image_base64
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
         return image_base64
+
+    @staticmethod
+    def chart_key(df: pd.DataFrame, chart_type: str, options: str = "") -> str:
+        """Content address for a chart: hash of the rows drawn, column names/dtypes, chart type and options"""
+        digest = hashlib.sha1(chart_type.encode())
+        digest.update(options.encode())
+        digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+        return digest.hexdigest()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.render_workers,
+                                                     initializer=_apply_style_once)
+            return self._executor
+
+    def warm_up(self):
+        """Load matplotlib here (or start and load every render worker) before the first chart"""
+        if self.render_workers > 0:
+            executor = self._get_executor()
+            for future in [executor.submit(preload_backend) for _ in range(self.render_workers)]:
+                future.result()
+        else:
+            preload_backend()
+
+    def shutdown(self):
+        """Stop the render process pool, if one was started"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,62 @@
+import unittest
+
+from src.agents.architect import CANDIDATE_SEPARATOR, AgentArchitect
+
+
+class _Memory:
+    def get_schema_context(self, user_query):
+        return "Table sales: id, product_category, amount, sale_date, region"
+
+    def get_similar_queries(self, user_query, k=3):
+        return []
+
+
+class _Model:
+    def __init__(self, text):
+        self.text = text
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return self
+
+
+# A response that follows the speculative prompt's output rule
+CANDIDATES_RESPONSE = f"""SELECT region, SUM(amount) FROM sales GROUP BY region ORDER BY 2 DESC
+{CANDIDATE_SEPARATOR}
+SELECT region, TOTAL(amount) AS revenue FROM sales GROUP BY region ORDER BY revenue DESC;
+{CANDIDATE_SEPARATOR}
+```sql
+SELECT region, SUM(amount) FROM sales WHERE amount IS NOT NULL GROUP BY 1 ORDER BY 2 DESC
+```"""
+
+
+class ArchitectPromptTest(unittest.TestCase):
+
+    def test_single_query_prompt(self):
+        model = _Model("SELECT COUNT(*) FROM sales")
+        response = AgentArchitect(model, _Memory()).generate_sql("How many sales?")
+        self.assertEqual(response.data['sql'], "SELECT COUNT(*) FROM sales")
+        self.assertIn("Return ONLY the raw SQL query.", model.prompts[0])
+
+    def test_speculative_prompt_asks_for_separated_queries_only(self):
+        model = _Model(CANDIDATES_RESPONSE)
+        response = AgentArchitect(model, _Memory()).generate_candidates("Revenue by region", n=3)
+        prompt = model.prompts[0]
+        self.assertNotIn("Return ONLY the raw SQL query.", prompt)
+        self.assertIn(f"Return ONLY 3 raw SQL queries, with a line containing only {CANDIDATE_SEPARATOR}", prompt)
+        self.assertEqual(response.data['candidates'], [
+            "SELECT region, SUM(amount) FROM sales GROUP BY region ORDER BY 2 DESC",
+            "SELECT region, TOTAL(amount) AS revenue FROM sales GROUP BY region ORDER BY revenue DESC",
+            "SELECT region, SUM(amount) FROM sales WHERE amount IS NOT NULL GROUP BY 1 ORDER BY 2 DESC",
+        ])
+
+    def test_parse_candidates_without_separators(self):
+        text = "SELECT 1 FROM sales;\nSELECT 2 FROM sales;\nSELECT 1 FROM sales;"
+        self.assertEqual(AgentArchitect.parse_candidates(text, 3), ["SELECT 1 FROM sales", "SELECT 2 FROM sales"])
+        self.assertEqual(AgentArchitect.parse_candidates(CANDIDATES_RESPONSE, 2)[1:],
+                         ["SELECT region, TOTAL(amount) AS revenue FROM sales GROUP BY region ORDER BY revenue DESC"])
+
+
+if __name__ == '__main__':
+    unittest.main()
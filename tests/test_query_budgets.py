@@ -0,0 +1,143 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from src.tools.sql_tool import QueryCancelledError, QueryTimeoutError, SQLExecutorTool
+
+# Runs for minutes unless a budget stops it; the plan is a cheap CTE scan, so the cost gate lets it through
+SLOW_SQL = ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1000000000) "
+            "SELECT COUNT(*) FROM c")
+
+
+def _sales_database(path: str = ":memory:", rows: int = 25) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.executescript("""
+        CREATE TABLE sales (id INTEGER PRIMARY KEY, product_category TEXT, amount REAL,
+                            sale_date TEXT, region TEXT, customer_id INTEGER);
+        CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, category TEXT, price REAL, inventory INTEGER);
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, email TEXT, region TEXT, signup_date TEXT);
+    """)
+    conn.executemany("INSERT INTO sales VALUES (?, 'Books', ?, '2024-01-01', 'North', 1)",
+                     [(i, float(i)) for i in range(1, rows + 1)])
+    conn.commit()
+    return conn
+
+
+class SQLExecutorBudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = _sales_database()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_wall_clock_budget(self):
+        tool = SQLExecutorTool(self.conn, timeout_seconds=0.05)
+        with self.assertRaisesRegex(QueryTimeoutError, "time budget"):
+            tool.execute(SLOW_SQL)
+        self.assertEqual(len(tool.execute("SELECT id FROM sales")), 25)  # Connection still usable
+
+    def test_vm_step_budget(self):
+        tool = SQLExecutorTool(self.conn, timeout_seconds=None, max_vm_steps=50_000)
+        with self.assertRaisesRegex(QueryTimeoutError, "VM-step budget"):
+            tool.execute(SLOW_SQL)
+        with self.assertRaises(QueryTimeoutError):
+            tool.execute_streaming(SLOW_SQL)
+
+    def test_row_cap_flags_only_cut_off_results(self):
+        for limit, rows, truncated in [(9, 9, False), (10, 10, False), (11, 10, True), (25, 10, True)]:
+            with self.subTest(limit=limit):
+                sql = f"SELECT id FROM sales LIMIT {limit}"
+                df = SQLExecutorTool(self.conn, max_rows=10).execute(sql)
+                self.assertEqual((len(df), bool(df.attrs.get('truncated'))), (rows, truncated))
+                result = SQLExecutorTool(self.conn, max_rows=10).execute_streaming(sql, chunk_size=4)
+                self.assertEqual((result.row_count, bool(result.dataframe.attrs.get('truncated'))),
+                                 (rows, truncated))
+
+    def test_cancel_event(self):
+        tool = SQLExecutorTool(self.conn, timeout_seconds=None)
+        cancel = threading.Event()
+        timer = threading.Timer(0.05, cancel.set)
+        timer.start()
+        with self.assertRaises(QueryCancelledError):
+            tool.execute(SLOW_SQL, cancel_event=cancel)
+        timer.join()
+
+    def test_cancel_all(self):
+        tool = SQLExecutorTool(self.conn, timeout_seconds=None)
+        timer = threading.Timer(0.05, tool.cancel_all)
+        timer.start()
+        with self.assertRaises(QueryCancelledError):
+            tool.execute(SLOW_SQL)
+        timer.join()
+        self.assertEqual(tool._active, {})
+
+
+class _ScriptedModel:
+    """Returns the scripted SQL responses in order and records every prompt"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        text = self.responses.pop(0) if self.responses else "No insights."
+
+        class Response:
+            pass
+        response = Response()
+        response.text = text
+        return response
+
+
+class OrchestratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        _sales_database(os.path.join(self.directory, "company_data.db")).close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_timeout_error_context(self):
+        """A timed-out query is sent back to the Architect with a request for a cheaper one"""
+        from autoinsights_adk_python import AutoInsightsOrchestrator
+
+        model_sql = _ScriptedModel([SLOW_SQL, "SELECT region, SUM(amount) FROM sales GROUP BY region"])
+        app = AutoInsightsOrchestrator(
+            model_sql=model_sql, model_insight=_ScriptedModel([]), query_timeout_seconds=0.1,
+            db_path=os.path.join(self.directory, "company_data.db"),
+            sql_cache_path=os.path.join(self.directory, "sql_cache.db"),
+            query_history_path=os.path.join(self.directory, "query_history.db"))
+        self.addCleanup(app.shutdown)
+        result = app.analyze("Total sales by region")
+
+        self.assertTrue(result['success'])
+        self.assertEqual(len(model_sql.prompts), 2)
+        retry_prompt = model_sql.prompts[1]
+        self.assertIn("Query Timeout: Query interrupted: exceeded 0.1s time budget", retry_prompt)
+        self.assertIn("Write a cheaper query", retry_prompt)
+        self.assertIn(SLOW_SQL, retry_prompt)
+
+    def test_shutdown_stops_every_pool(self):
+        from autoinsights_adk_python import AutoInsightsOrchestrator
+
+        app = AutoInsightsOrchestrator(
+            model_sql=_ScriptedModel([]), model_insight=_ScriptedModel([]), render_workers=1,
+            db_path=os.path.join(self.directory, "company_data.db"),
+            sql_cache_path=os.path.join(self.directory, "sql_cache.db"),
+            query_history_path=os.path.join(self.directory, "query_history.db"))
+        app.viz_tool._get_executor()
+        app.shutdown()
+        for pool in (app._executor, app._stage_executor):
+            with self.assertRaises(RuntimeError):
+                pool.submit(print)
+        self.assertIsNone(app.viz_tool._executor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+import pandas as pd
+
+from src.tools.result_cache import QueryResultCache
+
+
+class CanonicalKeyTest(unittest.TestCase):
+
+    def test_formatting_differences_share_a_key(self):
+        key = QueryResultCache.canonicalize
+        self.assertEqual(key("SELECT region, SUM(amount)\n  FROM sales GROUP BY region;"),
+                         key("select region,  SUM(amount) from sales -- by region\ngroup by region"))
+
+    def test_literals_are_kept_verbatim(self):
+        key = QueryResultCache.canonicalize
+        self.assertNotEqual(key("SELECT * FROM sales WHERE product_category = 'a  b'"),
+                            key("SELECT * FROM sales WHERE product_category = 'a b'"))
+        self.assertNotEqual(key("SELECT * FROM sales WHERE region = 'North'"),
+                            key("SELECT * FROM sales WHERE region = 'north'"))
+
+    def test_queries_differing_inside_a_literal_do_not_share_an_entry(self):
+        cache = QueryResultCache()
+        cache.put("SELECT amount FROM sales WHERE product_category = 'a  b'", 1, pd.DataFrame({'amount': [1.0]}))
+        self.assertIsNone(cache.get("SELECT amount FROM sales WHERE product_category = 'a b'", 1))
+        hit = cache.get("SELECT amount FROM sales  WHERE product_category = 'a  b';", 1)
+        self.assertEqual(hit['amount'].tolist(), [1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.tools.rollups import RollupManager, RollupSpec
+from tests.test_shard_merge import SCHEMA, _normalized, _rows
+
+QUERIES = [
+    "SELECT region, SUM(amount) FROM sales GROUP BY region",
+    "SELECT product_category, region, SUM(amount) AS revenue, COUNT(*) AS orders FROM sales GROUP BY 1, 2",
+    "SELECT strftime('%Y-%m', sale_date) AS month, AVG(amount), MIN(amount), MAX(amount) "
+    "FROM sales GROUP BY month ORDER BY month",
+    "SELECT substr(sale_date, 1, 7), TOTAL(amount), COUNT(amount) FROM sales GROUP BY 1 ORDER BY 1",
+    "SELECT strftime('%Y', sale_date) || '-Q' || ((CAST(strftime('%m', sale_date) AS INTEGER) + 2) / 3) "
+    "AS quarter, SUM(amount) FROM sales GROUP BY quarter ORDER BY quarter",
+    "SELECT region, SUM(amount) AS revenue FROM sales WHERE product_category = 'Books' "
+    "GROUP BY region ORDER BY revenue DESC LIMIT 2",
+    "SELECT s.region, COUNT(*) FROM sales s WHERE s.sale_date >= '2024-06-15' GROUP BY s.region",
+    "SELECT SUM(amount), COUNT(*) FROM sales WHERE sale_date BETWEEN '2024-03-01' AND '2024-03-31'",
+]
+
+
+class RollupRewriteTest(unittest.TestCase):
+    """A rewritten query must return exactly what the original returns over the fact table"""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.rows = _rows(count=600, seed=11)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(SCHEMA)
+        self.insert(self.rows[:400])
+        self.manager = RollupManager(self.path)
+
+    def tearDown(self):
+        self.manager.connection.close()
+        self.conn.close()
+        os.remove(self.path)
+
+    def insert(self, rows):
+        with self.conn:
+            self.conn.executemany("INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def assertRewriteEquivalent(self, sql: str):
+        rewrite = self.manager.rewrite(sql)
+        self.assertIsNotNone(rewrite, f"expected {sql!r} to use a rollup")
+        self.assertNotIn("FROM sales", rewrite.sql)
+        expected = pd.read_sql_query(sql, self.conn)
+        actual = pd.read_sql_query(rewrite.sql, self.conn)
+        self.assertEqual(list(actual.columns), list(expected.columns), rewrite.sql)
+        self.assertEqual(_normalized(actual), _normalized(expected), rewrite.sql)
+
+    def test_rewrites_match_fact_table(self):
+        for sql in QUERIES:
+            with self.subTest(sql=sql):
+                self.assertRewriteEquivalent(sql)
+
+    def test_appended_rows_are_folded_in(self):
+        self.assertRewriteEquivalent(QUERIES[1])
+        self.insert(self.rows[400:])
+        for sql in QUERIES:
+            with self.subTest(sql=sql):
+                self.assertRewriteEquivalent(sql)
+
+    def test_deleted_newest_rows_trigger_rebuild(self):
+        self.manager.refresh()
+        with self.conn:
+            self.conn.execute("DELETE FROM sales WHERE id > 350")
+        self.assertRewriteEquivalent(QUERIES[0])
+
+    def test_month_rollup_answers_year_queries(self):
+        manager = RollupManager(self.path, [RollupSpec("month_only", ['region', 'month'])])
+        try:
+            sql = "SELECT strftime('%Y', sale_date) AS year, region, SUM(amount) FROM sales GROUP BY 1, 2"
+            rewrite = manager.rewrite(sql)
+            self.assertEqual(rewrite.rollup, "month_only")
+            self.assertEqual(_normalized(pd.read_sql_query(rewrite.sql, self.conn)),
+                             _normalized(pd.read_sql_query(sql, self.conn)))
+        finally:
+            manager.connection.close()
+
+    def test_ineligible_queries_are_left_alone(self):
+        for sql in ["SELECT customer_id, SUM(amount) FROM sales GROUP BY customer_id",
+                    "SELECT region, SUM(amount) FROM sales WHERE amount > 100 GROUP BY region",
+                    "SELECT region, COUNT(DISTINCT customer_id) FROM sales GROUP BY region",
+                    "SELECT * FROM sales",
+                    "SELECT region FROM sales GROUP BY region"]:
+            with self.subTest(sql=sql):
+                self.assertIsNone(self.manager.rewrite(sql))
+
+
+if __name__ == '__main__':
+    unittest.main()
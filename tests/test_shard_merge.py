@@ -0,0 +1,114 @@
+import math
+import random
+import sqlite3
+import unittest
+
+import pandas as pd
+
+from src.tools.shard_tool import decompose, merge_partials
+
+SCHEMA = "CREATE TABLE sales (id INTEGER PRIMARY KEY, product_category TEXT, amount REAL, " \
+         "sale_date TEXT, region TEXT, customer_id INTEGER)"
+
+
+def _rows(count: int = 400, seed: int = 7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(1, count + 1):
+        region = rng.choice(['North', 'South', 'East', 'West', None])
+        category = rng.choice(['Electronics', 'Clothing', 'Books', None])
+        amount = None if rng.random() < 0.1 else round(rng.uniform(1, 5000), 2)
+        sale_date = None if rng.random() < 0.05 else f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        rows.append((i, category, amount, sale_date, region, rng.randint(1, 50)))
+    return rows
+
+
+def _database(rows) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.execute(SCHEMA)
+    conn.executemany("INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?)", rows)
+    return conn
+
+
+def _normalized(df: pd.DataFrame):
+    """Rows as tuples with NULL/NaN as None and floats to 9 significant digits"""
+    def value(v):
+        if v is None or (isinstance(v, float) and math.isnan(v)):
+            return None
+        if isinstance(v, float):
+            return float(f"{v:.9g}")  # Shard-wise float sums may differ in the last bits
+        return v.item() if hasattr(v, 'item') else v
+    return [tuple(value(v) for v in row) for row in df.itertuples(index=False)]
+
+
+class ShardMergeTest(unittest.TestCase):
+    """decompose + merge_partials over shards must match the same SQL on one database"""
+
+    @classmethod
+    def setUpClass(cls):
+        rows = _rows()
+        cls.whole = _database(rows)
+        # Uneven split plus an empty shard
+        cls.shards = [_database(rows[:50]), _database(rows[50:230]), _database(rows[230:]), _database([])]
+        cls.columns = {row[1].lower(): row[1] for row in cls.whole.execute("PRAGMA table_info(sales)")}
+
+    def assertMatchesSQLite(self, sql: str, shards=None):
+        plan = decompose(sql, "sales", self.columns)
+        self.assertIsNotNone(plan, f"expected {sql!r} to decompose")
+        merged = merge_partials([pd.read_sql_query(plan.partial_sql, s) for s in shards or self.shards], plan)
+        expected = pd.read_sql_query(sql, self.whole)
+        self.assertEqual(list(merged.columns), list(expected.columns), sql)
+        self.assertEqual(_normalized(merged), _normalized(expected), sql)
+
+    def test_avg_merges_from_sum_and_count(self):
+        self.assertMatchesSQLite("SELECT region, AVG(amount) FROM sales GROUP BY region")
+        self.assertMatchesSQLite("SELECT AVG(amount), COUNT(amount), COUNT(*) FROM sales")
+        plan = decompose("SELECT AVG(amount) FROM sales", "sales", self.columns)
+        self.assertEqual(sorted(merge for _, merge in plan.merges), ['count', 'sum'])
+
+    def test_group_by_positions_and_aliases(self):
+        self.assertMatchesSQLite("SELECT product_category, region, SUM(amount) FROM sales GROUP BY 1, 2")
+        self.assertMatchesSQLite("SELECT region AS area, SUM(amount) AS revenue FROM sales GROUP BY area")
+        self.assertMatchesSQLite("SELECT strftime('%Y-%m', sale_date) AS month, COUNT(*) AS orders "
+                                 "FROM sales GROUP BY month")
+
+    def test_order_limit_offset_after_merge(self):
+        self.assertMatchesSQLite("SELECT region, SUM(amount) AS revenue FROM sales GROUP BY region "
+                                 "ORDER BY revenue DESC LIMIT 3")
+        self.assertMatchesSQLite("SELECT product_category, MAX(amount) FROM sales GROUP BY 1 "
+                                 "ORDER BY 2 LIMIT 2 OFFSET 1")
+        self.assertMatchesSQLite("SELECT region, COUNT(*) FROM sales GROUP BY region ORDER BY region DESC")
+        self.assertMatchesSQLite("SELECT region, COUNT(*) FROM sales GROUP BY region ORDER BY region LIMIT 2")
+
+    def test_null_keys_sort_first_without_order_by(self):
+        self.assertMatchesSQLite("SELECT region, SUM(amount) FROM sales GROUP BY region LIMIT 10")
+        self.assertMatchesSQLite("SELECT region, TOTAL(amount) FROM sales GROUP BY region LIMIT 2")
+        self.assertMatchesSQLite("SELECT region, MAX(sale_date) FROM sales GROUP BY region")
+        self.assertMatchesSQLite("SELECT region FROM sales GROUP BY region")
+        self.assertMatchesSQLite("SELECT product_category, region, MIN(sale_date) FROM sales GROUP BY 1, 2")
+
+    def test_null_key_is_none(self):
+        plan = decompose("SELECT region, COUNT(*) FROM sales GROUP BY region", "sales", self.columns)
+        merged = merge_partials([pd.read_sql_query(plan.partial_sql, s) for s in self.shards], plan)
+        self.assertIsNone(merged['region'].iloc[0])
+
+    def test_empty_inputs(self):
+        self.assertMatchesSQLite("SELECT region, SUM(amount) FROM sales WHERE id < 0 GROUP BY region")
+        self.assertMatchesSQLite("SELECT SUM(amount), TOTAL(amount), COUNT(*), AVG(amount), MIN(sale_date) "
+                                 "FROM sales WHERE id < 0")
+        empty = [_database([]), _database([])]
+        plan = decompose("SELECT COUNT(*), MAX(amount) FROM sales", "sales", self.columns)
+        merged = merge_partials([pd.read_sql_query(plan.partial_sql, s) for s in empty], plan)
+        self.assertEqual(_normalized(merged), [(0, None)])
+
+    def test_undecomposable_queries(self):
+        for sql in ["SELECT region, SUM(amount) FROM sales GROUP BY region HAVING SUM(amount) > 10",
+                    "SELECT s.region, COUNT(*) FROM sales s JOIN customers c ON c.id = s.customer_id GROUP BY 1",
+                    "SELECT region, ROUND(SUM(amount), 2) FROM sales GROUP BY region",
+                    "SELECT region, amount FROM sales GROUP BY region",
+                    "SELECT COUNT(DISTINCT region) FROM sales"]:
+            self.assertIsNone(decompose(sql, "sales", self.columns), sql)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from src.tools.sql_parser import SQLValidator, analyze_query, tokenize
+
+SCHEMA = {
+    'sales': ['id', 'product_category', 'amount', 'sale_date', 'region', 'customer_id'],
+    'customers': ['id', 'name', 'email', 'region', 'signup_date'],
+    'products': ['id', 'name', 'category', 'price', 'inventory'],
+}
+
+
+class SQLValidatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.validator = SQLValidator(whitelist_tables=SCHEMA, schema=SCHEMA)
+
+    def assertValid(self, sql: str):
+        self.assertEqual(self.validator.validate(sql), [], sql)
+
+    def assertIssue(self, sql: str, fragment: str):
+        issues = self.validator.validate(sql)
+        self.assertTrue(any(fragment in issue for issue in issues), f"{sql!r}: {issues}")
+
+    def test_valid_queries(self):
+        for sql in [
+            "SELECT region, SUM(amount) AS revenue FROM sales GROUP BY region ORDER BY revenue DESC;",
+            "SELECT c.name, COUNT(*) FROM sales s JOIN customers c ON c.id = s.customer_id GROUP BY c.name",
+            "WITH monthly AS (SELECT strftime('%Y-%m', sale_date) AS month, SUM(amount) AS total "
+            "FROM sales GROUP BY month) SELECT month, total FROM monthly ORDER BY month",
+            "SELECT name FROM products WHERE id IN (SELECT id FROM products WHERE price > 10)",
+            "SELECT replace(region, 'North', 'N') FROM sales",
+            "SELECT rowid, region FROM sales -- trailing comment; DROP TABLE sales",
+            "SELECT signup_date AS created_at FROM customers WHERE signup_date > '2024-01-01'",
+            "SELECT \"region\", 'DELETE' FROM sales",
+        ]:
+            with self.subTest(sql=sql):
+                self.assertValid(sql)
+
+    def test_write_and_multi_statement_rejected(self):
+        self.assertIssue("DELETE FROM sales", "Only SELECT")
+        self.assertIssue("SELECT * FROM sales; DROP TABLE sales", "Multiple statements")
+        self.assertIssue("WITH x AS (SELECT 1) INSERT INTO sales SELECT * FROM x", "Dangerous operation detected: INSERT")
+        self.assertIssue("SELECT load_extension('evil')", "Function not allowed")
+        self.assertIssue("   ;", "Empty SQL statement")
+        self.assertIssue("SELECT region FROM sales WHERE amount > 5 #", "Could not parse")
+
+    def test_tables_must_be_allow_listed(self):
+        self.assertIssue("SELECT * FROM sqlite_master", "Table not allowed: sqlite_master")
+        self.assertIssue("SELECT s.id FROM sales s JOIN secrets x ON x.id = s.id", "Table not allowed: secrets")
+
+    def test_unknown_columns(self):
+        self.assertIssue("SELECT revenue FROM sales", "Unknown column: revenue")
+        self.assertIssue("SELECT s.price FROM sales s", "Unknown column: s.price")
+        self.assertValid("SELECT p.price FROM sales s JOIN products p ON p.id = s.id")
+
+
+class AnalyzeQueryTest(unittest.TestCase):
+
+    def test_tables_aliases_and_ctes(self):
+        shape = analyze_query(tokenize(
+            "WITH top AS (SELECT customer_id FROM sales) "
+            "SELECT c.name AS customer FROM customers AS c JOIN top t ON t.customer_id = c.id"))
+        self.assertEqual(set(shape.tables), {'sales', 'customers', 'top'})
+        self.assertEqual(shape.aliases['c'], 'customers')
+        self.assertIn('top', shape.ctes)
+        self.assertIn('customer', shape.output_aliases)
+        self.assertIn(('c', 'name'), shape.columns)
+
+    def test_keyword_lookalike_identifiers(self):
+        tokens = tokenize("SELECT created_at, last_update FROM t")
+        self.assertEqual([t.kind for t in tokens[1:4]], ['ident', 'punct', 'ident'])
+
+
+if __name__ == '__main__':
+    unittest.main()
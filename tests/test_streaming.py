@@ -0,0 +1,75 @@
+import glob
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.tools.streaming import stream_query
+
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+@unittest.skipUnless(HAS_ARROW, "pyarrow is needed to spill")
+class SpillTest(unittest.TestCase):
+    """Chunks whose inferred types differ must still spill into one readable file"""
+
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir)
+
+    def spill(self, chunks):
+        result = stream_query(iter(chunks), sample_rows=5, spill_threshold_rows=2, spill_dir=self.spill_dir)
+        self.assertTrue(result.spilled)
+        self.addCleanup(result.cleanup)
+        return result
+
+    def spill_files(self):
+        return glob.glob(os.path.join(self.spill_dir, "autoinsights_*.arrow"))
+
+    def test_all_null_first_chunk_then_numbers(self):
+        result = self.spill([
+            pd.DataFrame({'id': [1, 2, 3], 'discount': [None, None, None]}),
+            pd.DataFrame({'id': [4, 5], 'discount': [0.5, 1.5]}),
+        ])
+        df = result.to_pandas()
+        self.assertEqual(df['id'].tolist(), [1, 2, 3, 4, 5])
+        self.assertTrue(df['discount'].iloc[:3].isna().all())
+        self.assertEqual(df['discount'].iloc[3:].tolist(), [0.5, 1.5])
+
+    def test_integer_column_widens_to_float(self):
+        result = self.spill([
+            pd.DataFrame({'amount': [1, 2, 3]}),
+            pd.DataFrame({'amount': [4.25, 5.5]}),
+            pd.DataFrame({'amount': [6, 7]}),
+        ])
+        df = result.to_pandas()
+        self.assertEqual(df['amount'].tolist(), [1.0, 2.0, 3.0, 4.25, 5.5, 6.0, 7.0])
+        self.assertEqual(len(self.spill_files()), 1)
+
+    def test_numbers_then_text_become_text(self):
+        result = self.spill([
+            pd.DataFrame({'code': [1, 2, 3]}),
+            pd.DataFrame({'code': ['A7', None]}),
+        ])
+        codes = result.to_pandas()['code']
+        self.assertEqual(codes.iloc[:4].tolist(), ['1', '2', '3', 'A7'])
+        self.assertTrue(pd.isna(codes.iloc[4]))  # None, or NaN in a pandas >= 3 'str' column
+
+    def test_failed_stream_leaves_no_spill_file(self):
+        def chunks():
+            yield pd.DataFrame({'id': [1, 2, 3]})
+            yield pd.DataFrame({'id': [4, 5, 6]})
+            raise TimeoutError("interrupted mid-stream")
+
+        with self.assertRaises(TimeoutError):
+            stream_query(chunks(), spill_threshold_rows=2, spill_dir=self.spill_dir)
+        self.assertEqual(self.spill_files(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
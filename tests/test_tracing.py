@@ -0,0 +1,24 @@
+import unittest
+
+from src.telemetry.tracing import Tracer
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_quantities_become_counters_identifiers_do_not(self):
+        tracer = Tracer(enabled=True)
+        for winner in (2, 3):
+            with tracer.span("speculate", candidates=3) as span:
+                with span.child("execute", candidate=winner) as child:
+                    child.set("rows", 10)
+                span.set("winner", winner)
+                span.set("estimated_cost", 1e6)
+        text = tracer.metrics.to_prometheus()
+        self.assertIn('autoinsights_candidates_total{stage="speculate"} 6', text)
+        self.assertIn('autoinsights_rows_total{stage="execute"} 20', text)
+        for name in ("winner", "candidate", "estimated_cost"):
+            self.assertNotIn(f"autoinsights_{name}_total", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import threading
+import unittest
+
+from src.tools.viz_tool import VisualizationTool
+
+
+class RenderPoolTest(unittest.TestCase):
+
+    def test_concurrent_first_charts_share_one_pool(self):
+        tool = VisualizationTool(render_workers=2)
+        self.addCleanup(tool.shutdown)
+        start = threading.Barrier(8)
+        pools = []
+
+        def first_chart():
+            start.wait()
+            pools.append(tool._get_executor())
+
+        threads = [threading.Thread(target=first_chart) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(pool) for pool in pools}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()